@@ -5,6 +5,7 @@ This is the entry point for the Dash application
 import dash  # type: ignore
 import dash_bootstrap_components as dbc  # type: ignore
 import webbrowser
+import multiprocessing
 
 # This is for caching global variables
 from flask_caching import Cache
@@ -38,13 +39,71 @@ app.config.suppress_callback_exceptions = True
 
 # Initialize cache - needed for global variables
 flask_cache = Cache()
+# the campaign is stored in many slices, so the default limit of 500 items is not enough
 flask_cache.init_app(
-    app.server, config={"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 1e30}
+    app.server,
+    config={
+        "CACHE_TYPE": "SimpleCache",
+        "CACHE_DEFAULT_TIMEOUT": 1e30,
+        "CACHE_THRESHOLD": 1e9,
+    },
 )
 
 # define directory for caching files
 CACHE_DIR = "_cache"
 
+# storage of global variables (see `cache.backends`):
+# "reference" keeps the objects in process memory without copying,
+# "flask-cache" stores them in `flask_cache`, which pickles them on every access
+STATE_BACKEND = "reference"
+
+# if True, raw and processed 2D data of chromatograms are saved into `CACHE_DIR`
+# and memory-mapped, so they are loaded into memory only when accessed
+MEMMAP_ARRAYS = False
+
+# precision of the stored absorbances and concentration profiles: "float64", "float32" or "float16",
+# lower precision saves memory, the processing itself is always done in float64
+STORAGE_PRECISION = "float64"
+
+# every browser has its own campaign (see `cache.sessions`), when the campaigns take more
+# memory than the budget, sessions idle for longer than the timeout [s] are saved to disk
+SESSION_MEMORY_BUDGET_MB = 4096
+SESSION_IDLE_TIMEOUT = 15 * 60
+
+# files are uploaded in chunks into the cache folder, the total size of the files being uploaded at once
+# is limited [MB], and uploads that received no chunk for the timeout [s] are discarded
+UPLOAD_MAX_MB = 4096
+UPLOAD_TIMEOUT = 10 * 60
+
+# number of processes that parse uploaded chromatograms in parallel, None means all CPUs
+PARSING_WORKERS = None
+
+# number of processes that process the chromatograms in parallel (Process all), None means all CPUs,
+# with 1 the chromatograms are processed one by one in the background thread
+PROCESSING_WORKERS = None
+
+# chromatograms can be imported from folders on the server (Data page), only files inside
+# this folder can be imported, relative folders entered on the Data page are inside it
+IMPORT_ROOT = "hplc_data"
+
+# how often the folder watched for new chromatograms is checked [s]
+WATCH_INTERVAL = 10
+
+# compression level of the downloaded .mocca2 files (0 = no compression, fastest, 9 = smallest)
+CAMPAIGN_COMPRESSION_LEVEL = 6
+
+# memory for the previews of single samples on the Process page [MB], shared by all sessions,
+# previews of settings that were already tried are shown without processing the sample again
+PREVIEW_CACHE_MB = 256
+
+# memory for the DAD figures of chromatograms on the Results page [MB], shared by all sessions,
+# the figures of recently viewed chromatograms are shown again without creating them
+FIGURE_CACHE_MB = 256
+
+# memory for the intermediate results of processing [MB], shared by all sessions, e.g. the baseline
+# corrected data are reused when only the peak picking or deconvolution settings change
+STAGE_CACHE_MB = 1024
+
 # Pages must be imported after cache and campaign are initialized
 import cache
 import campaign
@@ -56,6 +115,8 @@ import pages.data
 import pages.process
 import pages.results
 
+import workers
+
 
 # create callback for loading content for different URL paths
 @app.callback(
@@ -81,6 +142,12 @@ def display_page(pathname: str):
 
 # start the server
 if __name__ == "__main__":
+    # needed for process pools in the executable compiled by pyinstaller
+    multiprocessing.freeze_support()
+
+    # the worker processes of the process pools need only the `workers` package
+    workers.detach_main()
+
     # initialize global variables and file caching
     cache.init()
 
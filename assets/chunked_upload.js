@@ -0,0 +1,114 @@
+/*
+Uploading files in chunks, see `cache/streaming_uploads.py`.
+
+Any element with class `chunked-upload` works as an upload area - the user can click on it
+or drop files on it. The element must have these attributes:
+  data-store: ID of `dcc.Store`, which receives `{files: [{file_id, name}], timestamp}` after upload
+  data-progress: ID of element that shows the progress
+  data-multiple: "true" if multiple files can be selected
+*/
+
+(function () {
+    const CHUNK_SIZE = 8 * 1024 * 1024;
+
+    function setProps(id, props) {
+        if (id && window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props(id, props);
+        }
+    }
+
+    async function postJson(url, body) {
+        const response = await fetch(url, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(body),
+        });
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+        return response.json();
+    }
+
+    async function uploadFile(file, onProgress) {
+        const upload = await postJson("/upload/start", { name: file.name, size: file.size });
+        const url = "/upload/" + upload.upload_id;
+
+        let received = 0;
+        while (received < file.size) {
+            const chunk = file.slice(received, received + CHUNK_SIZE);
+            const response = await fetch(url + "?offset=" + received, {
+                method: "PUT",
+                headers: { "Content-Type": "application/octet-stream" },
+                body: chunk,
+            });
+            // 409 means that the server has different offset, continue from there
+            if (!response.ok && response.status !== 409) {
+                throw new Error(await response.text());
+            }
+            received = (await response.json()).received;
+            onProgress(received);
+        }
+
+        return postJson(url + "/finish", {});
+    }
+
+    async function uploadFiles(element, files) {
+        const progressId = element.dataset.progress;
+        const total = files.reduce((sum, file) => sum + file.size, 0);
+        const uploaded = [];
+        let done = 0;
+
+        try {
+            for (const file of files) {
+                const result = await uploadFile(file, (received) => {
+                    const percent = total > 0 ? Math.floor((100 * (done + received)) / total) : 100;
+                    setProps(progressId, { children: `Uploading ${file.name} (${percent} %)` });
+                });
+                done += file.size;
+                uploaded.push(result);
+            }
+            setProps(progressId, { children: "" });
+        } catch (error) {
+            setProps(progressId, { children: "Upload failed! " + error.message });
+        }
+
+        if (uploaded.length > 0) {
+            setProps(element.dataset.store, { data: { files: uploaded, timestamp: Date.now() } });
+        }
+    }
+
+    function uploadArea(event) {
+        return event.target.closest ? event.target.closest(".chunked-upload") : null;
+    }
+
+    document.addEventListener("click", (event) => {
+        const element = uploadArea(event);
+        if (!element) {
+            return;
+        }
+        const input = document.createElement("input");
+        input.type = "file";
+        input.multiple = element.dataset.multiple === "true";
+        input.addEventListener("change", () => uploadFiles(element, Array.from(input.files)));
+        input.click();
+    });
+
+    document.addEventListener("dragover", (event) => {
+        if (uploadArea(event)) {
+            event.preventDefault();
+        }
+    });
+
+    document.addEventListener("drop", (event) => {
+        const element = uploadArea(event);
+        if (!element) {
+            return;
+        }
+        event.preventDefault();
+        let files = Array.from(event.dataTransfer.files);
+        if (element.dataset.multiple !== "true") {
+            files = files.slice(0, 1);
+        }
+        uploadFiles(element, files);
+    });
+})();
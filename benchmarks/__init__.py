@@ -0,0 +1,7 @@
+"""
+Benchmarks of the performance-critical parts of the app, run them from the repository root:
+
+```
+python -m benchmarks.bench_state_backend
+```
+"""
@@ -0,0 +1,52 @@
+"""
+Compares the versions of the .mocca2 file on the example campaigns.
+
+Reports the time of saving and loading the campaign, the memory allocated during saving
+and loading, and the file size for the compressed JSON (version 1) and for the zip of
+`.npy` arrays (version 2) with different compression levels. The memory allocated by loading
+includes the loaded campaign itself, its size is shown in the last column.
+"""
+
+import os
+import tempfile
+
+import app
+import cache
+from campaign.pickling import dump_campaign, dump_campaign_v1, load_campaign
+
+from benchmarks.common import CAMPAIGNS, load_example_campaign, measure
+
+
+FORMATS = {
+    "v1 (json+zlib)": dump_campaign_v1,
+    "v2 level 0": lambda camp, path: dump_campaign(camp, path, level=0),
+    "v2 level 1": lambda camp, path: dump_campaign(camp, path, level=1),
+    "v2 level 6": lambda camp, path: dump_campaign(camp, path, level=6),
+    "v2 level 9": lambda camp, path: dump_campaign(camp, path, level=9),
+}
+
+
+def main(repeat: int = 3):
+    print(
+        f"{'campaign':<24}{'format':<16}{'save [ms]':>12}{'load [ms]':>12}"
+        f"{'save [MB]':>12}{'load [MB]':>12}{'file [MB]':>12}{'data [MB]':>12}"
+    )
+
+    with tempfile.TemporaryDirectory() as folder:
+        for campaign_folder in CAMPAIGNS:
+            camp = load_example_campaign(campaign_folder)
+            data_size = cache.sessions.estimate_campaign_size(camp) / 2**20
+
+            for name, dump in FORMATS.items():
+                path = os.path.join(folder, "campaign.mocca2")
+                save, save_alloc = measure(lambda: dump(camp, path), repeat)
+                load, load_alloc = measure(lambda: load_campaign(path), repeat)
+                size = os.path.getsize(path) / 2**20
+                print(
+                    f"{campaign_folder:<24}{name:<16}{save:>12.1f}{load:>12.1f}"
+                    f"{save_alloc:>12.2f}{load_alloc:>12.2f}{size:>12.2f}{data_size:>12.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
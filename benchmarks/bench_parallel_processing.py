@@ -0,0 +1,67 @@
+"""
+Compares processing of the campaign (Process all) with different numbers of worker processes.
+
+Reports the processing time and the speedup against processing in a single process, and
+checks that the compounds and integrals are identical to the results of the single process.
+The cache of the processing stages is cleared before every run, so every run processes all chromatograms.
+Also checks that the worker processes do not import `app`, see `workers.detach_main`.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+
+import app
+import campaign.processing
+from campaign.processing import process_campaign
+from mocca2.dataset.settings import ProcessingSettings
+from workers import MP_CONTEXT, detach_main
+
+from benchmarks.common import imports_app, load_example_campaign
+
+
+CAMPAIGN = "reaction_ba_ome_nme2"
+
+
+def process(workers: int) -> tuple:
+    """Processes the example campaign, returns the campaign and processing time [ms]"""
+    camp = load_example_campaign(CAMPAIGN)
+    # otherwise the later runs only copy the results of the stages cached by the first run
+    campaign.processing._stages.clear()
+
+    start = time.perf_counter()
+    process_campaign(camp, ProcessingSettings(), workers=workers)
+    return camp, (time.perf_counter() - start) * 1e3
+
+
+def main(workers=None):
+    if workers is None:
+        cpus = os.cpu_count() or 1
+        workers = sorted({1, 2, 4, cpus} - {n for n in (2, 4) if n > cpus})
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=MP_CONTEXT) as pool:
+        worker_imports_app = pool.submit(imports_app).result()
+    print(f"{CAMPAIGN} on {os.cpu_count()} CPUs, workers import app: {worker_imports_app}")
+    print(f"{'workers':<10}{'process [ms]':>14}{'speedup':>10}{'compounds':>12}{'identical':>12}")
+
+    reference, serial = process(1)
+    reference_integrals, _ = reference.get_integrals()
+
+    for n in workers:
+        if n == 1:
+            camp, elapsed = reference, serial
+        else:
+            camp, elapsed = process(n)
+        integrals, _ = camp.get_integrals()
+        identical = camp.compounds.keys() == reference.compounds.keys() and integrals.equals(
+            reference_integrals
+        )
+        print(
+            f"{n:<10}{elapsed:>14.0f}{serial / elapsed:>10.2f}{len(camp.compounds):>12}{str(identical):>12}"
+        )
+
+
+if __name__ == "__main__":
+    detach_main()
+    main([int(n) for n in sys.argv[1:]] or None)
@@ -0,0 +1,41 @@
+"""
+Compares the storages of global variables on the example campaigns.
+
+Reports the latency of `cache.get_campaign()`, `cache.set_campaign()` and of
+reading a single chromatogram, and the memory allocated during one call, for the serializing `flask-cache`
+backend and for the in-process `reference` backend.
+"""
+
+import app
+import cache
+
+from benchmarks.common import CAMPAIGNS, load_example_campaign, measure
+
+
+BACKENDS = {
+    "flask-cache": lambda: cache.FlaskCacheBackend(server=app.server, flask_cache=app.flask_cache),
+    "reference": cache.ReferenceBackend,
+}
+
+
+def main(repeat: int = 20):
+    print(f"{'campaign':<24}{'backend':<14}{'call':<16}{'time [ms]':>12}{'alloc [MB]':>12}")
+
+    for folder in CAMPAIGNS:
+        camp = load_example_campaign(folder)
+
+        for name, backend in BACKENDS.items():
+            cache.set_backend(backend())
+            cache.init_vars()
+
+            for call, func in [
+                ("set_campaign", lambda: cache.set_campaign(camp)),
+                ("get_campaign", cache.get_campaign),
+                ("get_chromatogram", lambda: cache.get_chromatogram(0)),
+            ]:
+                elapsed, alloc = measure(func, repeat)
+                print(f"{folder:<24}{name:<14}{call:<16}{elapsed:>12.3f}{alloc:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
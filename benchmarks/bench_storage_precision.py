@@ -0,0 +1,77 @@
+"""
+Compares the storage precisions (`STORAGE_PRECISION`) on the example campaigns.
+
+Reports the memory taken by the 2D data of the campaign and the processing time, and
+compares the integrals of the compounds with the float64 results - the largest relative
+difference of the integrals and the number of compounds that were not found in both results.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import app
+import cache
+import campaign.processing
+from campaign.processing import process_campaign
+from mocca2.dataset.settings import ProcessingSettings
+
+from benchmarks.common import CAMPAIGNS, load_example_campaign
+
+
+PRECISIONS = ["float64", "float32", "float16"]
+
+
+def process(campaign_folder: str, precision: str) -> tuple:
+    """Processes the campaign stored in `precision`, returns the campaign and processing time [ms]"""
+    campaign.processing.STORAGE_PRECISION = precision
+
+    camp = load_example_campaign(campaign_folder)
+    cache.cast_campaign_arrays(camp, precision)
+
+    start = time.perf_counter()
+    process_campaign(camp, ProcessingSettings())
+    return camp, (time.perf_counter() - start) * 1e3
+
+
+def compare(integrals: pd.DataFrame, reference: pd.DataFrame) -> tuple:
+    """Returns the largest relative difference of the integrals and the number of mismatched compounds"""
+    common = [col for col in reference.columns if col in integrals.columns and col != "Chromatogram"]
+    mismatched = len(set(reference.columns) ^ set(integrals.columns))
+
+    if len(common) == 0:
+        return np.nan, mismatched
+
+    values = integrals[common].to_numpy(dtype=np.float64)
+    expected = reference[common].to_numpy(dtype=np.float64)
+    scale = np.maximum(np.abs(expected), np.nanmax(np.abs(expected)) * 1e-6)
+    return float(np.nanmax(np.abs(values - expected) / scale)), mismatched
+
+
+def main(campaigns=CAMPAIGNS):
+    print(
+        f"{'campaign':<24}{'precision':<12}{'data [MB]':>12}{'process [ms]':>14}"
+        f"{'max rel. diff':>16}{'mismatched':>12}"
+    )
+
+    for campaign_folder in campaigns:
+        reference = None
+        for precision in PRECISIONS:
+            camp, elapsed = process(campaign_folder, precision)
+            size = cache.sessions.estimate_campaign_size(camp) / 2**20
+
+            integrals, _ = camp.get_integrals()
+            if reference is None:
+                reference = integrals
+            diff, mismatched = compare(integrals, reference)
+
+            print(
+                f"{campaign_folder:<24}{precision:<12}{size:>12.2f}{elapsed:>14.0f}"
+                f"{diff:>16.2e}{mismatched:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or CAMPAIGNS)
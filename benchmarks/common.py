@@ -0,0 +1,62 @@
+"""Shared helpers for the benchmarks"""
+
+from typing import Callable, List, Tuple
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+from mocca2 import MoccaDataset, Chromatogram
+
+EXAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), "example_data")
+
+CAMPAIGNS = ["calibration", "reaction_ba_ome_nme2"]
+"""Folders in `example_data` used for the benchmarks"""
+
+
+def example_files(folder: str) -> Tuple[str, List[str]]:
+    """Returns path to the blank (gradient) and to the samples in the `example_data` folder"""
+    files = sorted(glob.glob(os.path.join(EXAMPLE_DATA, folder, "*.csv")))
+    blank = [f for f in files if f.endswith("_grad.csv")][0]
+    samples = [f for f in files if f != blank]
+    return blank, samples
+
+
+def load_example_campaign(folder: str) -> MoccaDataset:
+    """Loads all samples from the `example_data` folder into a new campaign, same as `campaign.campaign_from_table`"""
+    blank, samples = example_files(folder)
+
+    camp = MoccaDataset()
+    for path in samples:
+        chromatogram = Chromatogram(
+            sample=path, blank=blank, name=os.path.basename(path), interpolate_blank=True
+        )
+        if len(camp.chromatograms) > 0:
+            chromatogram.interpolate_time(camp.chromatograms[0].time, inplace=True)
+        camp.add_chromatogram(chromatogram)
+
+    return camp
+
+
+def imports_app() -> bool:
+    """Returns True if `app` was imported in this process, e.g. to check the worker processes of the pools"""
+    return "app" in sys.modules
+
+
+def measure(func: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """Returns mean time [ms] of one call and peak allocated memory [MB] during one call"""
+    func()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat * 1e3
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak / 2**20
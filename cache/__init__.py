@@ -1,21 +1,52 @@
 """This module has to be used for all global variables and cached files!!!"""
 
-from cache.classes import CachedFile, CampaignProcessingInfo
+from cache.classes import CachedFile, CampaignProcessingInfo, CampaignExportInfo, SessionInfo, StreamingUpload
 
-from cache.global_vars import get_campaign, set_campaign
-from cache.global_vars import get_cached_files, set_cached_files
+from cache.backends import StateBackend, ReferenceBackend, FlaskCacheBackend
+
+from cache.sessions import get_session_id, session_scope, get_export_path
+
+from cache.global_vars import locked, set_backend, init_session
+from cache.global_vars import get_campaign, set_campaign, get_campaign_version
+from cache.global_vars import get_campaign_metadata, get_chromatogram_names, update_campaign
+from cache.global_vars import get_chromatogram, get_raw_2d_data, get_compound, get_compounds
+from cache.global_vars import update_compound_name, get_time_axis, get_wavelength_axis
 from cache.global_vars import get_current_blank, set_current_blank
+from cache.global_vars import get_campaign_building_info, set_campaign_building_info
 from cache.global_vars import get_campaign_processing_info, set_campaign_processing_info
+from cache.global_vars import get_campaign_export_info, set_campaign_export_info
 from cache.global_vars import get_displayed_chromatogram, set_displayed_chromatogram
 
-from cache.files import add_cached_file, get_cached_file
+from cache.files import add_cached_file, get_cached_file, get_cached_files_by_name
+from cache.files import register_file
+
+from cache.folder_import import import_folder, find_files, resolve_folder, pair_with_blanks
+
+from cache.uploading_files import store_uploaded_file
+
+# registers the routes for uploading files in chunks
+from cache import streaming_uploads
+
+from cache.parsed_data import BlankRegistry, load_parsed_data_batch
+
+from cache.memoize import memoize_per_campaign_version, LRUCache
 
-from cache.uploading_files import save_uploaded_file
+from cache.arrays import spill_array, spill_campaign_arrays, cast_campaign_arrays, is_spilled, is_loaded, remove_released_arrays
 
 from cache.global_vars import init as init_vars
 from cache.files import init as init_files
+from cache.arrays import init as init_arrays
+from cache.parsed_data import init as init_parsed_data
+from cache.folder_import import init as init_folder_import
+from cache.sessions import init as init_sessions
+from cache.streaming_uploads import init as init_streaming_uploads
 
 def init():
     """Initialize cache"""
-    init_vars()
-    init_files()
\ No newline at end of file
+    init_files()
+    init_arrays()
+    init_parsed_data()
+    init_folder_import()
+    init_streaming_uploads()
+    init_sessions()
+    init_vars()
\ No newline at end of file
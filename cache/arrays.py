@@ -0,0 +1,182 @@
+"""
+Storing large arrays in the cache folder.
+
+The arrays are saved as `.npy` files and replaced by `numpy.memmap`, so the
+operating system pages the data in only when they are accessed, e.g. when
+the chromatogram is processed or displayed. The files are removed when no
+memory-mapped array uses them anymore, and on startup.
+"""
+
+from typing import Any, Dict, List
+from numpy.typing import NDArray
+
+import hashlib
+import os
+import shutil
+import threading
+import weakref
+
+import numpy as np
+
+from mocca2 import MoccaDataset
+from mocca2.classes import Data2D
+
+from app import CACHE_DIR
+
+ARRAYS_DIR = os.path.join(CACHE_DIR, "arrays")
+"""Folder with the spilled arrays"""
+
+RESERVED_FILES = 256
+"""File descriptors kept free for other files and connections when raising the limit of open files"""
+
+_references: Dict[str, int] = dict()
+"""Number of memory-mapped arrays using each spilled file [path -> count]"""
+
+_released: List[str] = []
+"""Files of the memory-mapped arrays that were garbage collected, processed by `_remove_released()`"""
+
+_lock = threading.Lock()
+"""Guards `_references` and the files in the folder"""
+
+
+def init():
+    """Creates the folder for the spilled arrays, removes the arrays from previous runs"""
+    if os.path.exists(ARRAYS_DIR):
+        shutil.rmtree(ARRAYS_DIR, ignore_errors=True)
+    os.makedirs(ARRAYS_DIR, exist_ok=True)
+
+
+def is_spilled(array: NDArray) -> bool:
+    """Checks whether the array is memory-mapped from a file (copies of memory-mapped arrays are not)"""
+    return isinstance(array, np.memmap) and array.filename is not None
+
+
+def is_loaded(data: Data2D) -> bool:
+    """Checks whether the 2D data are in memory (or memory-mapped), campaigns loaded lazily from .mocca2 files read them on first access"""
+    return isinstance(data.__dict__.get("data"), np.ndarray)
+
+
+def cast_campaign_arrays(campaign: MoccaDataset, dtype: Any):
+    """
+    Converts the raw and processed 2D data in the campaign to `dtype` in place, e.g. to save memory.
+
+    Arrays shared by the chromatogram and its raw data stay shared, data that were not loaded yet are skipped.
+    """
+    for idx, raw in campaign._raw_2d_data.items():
+        if not is_loaded(raw):
+            continue
+        chromatogram = campaign.chromatograms.get(idx)
+        shared = chromatogram is not None and is_loaded(chromatogram) and chromatogram.data is raw.data
+
+        raw.data = raw.data.astype(dtype, copy=False)
+        if shared:
+            chromatogram.data = raw.data
+
+    for chromatogram in campaign.chromatograms.values():
+        if is_loaded(chromatogram):
+            chromatogram.data = chromatogram.data.astype(dtype, copy=False)
+
+
+def spill_array(array: NDArray) -> NDArray:
+    """
+    Saves the array into the cache folder and returns a memory-mapped array backed by the file.
+
+    The files are named by the hash of the content, so identical arrays share one file.
+    The memory map is copy-on-write: in-place changes are kept in memory and never written to the file.
+    """
+    # the released files are removed also when all arrays of the campaign are spilled already
+    remove_released_arrays()
+    if is_spilled(array):
+        return array
+
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(array.data, digest_size=16)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    path = os.path.join(ARRAYS_DIR, digest.hexdigest() + ".npy")
+
+    with _lock:
+        if os.path.exists(path):
+            return _map(path)
+
+    # write to temporary file first, so that other threads never map incomplete file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+
+    with _lock:
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        return _map(path)
+
+
+def _map(path: str) -> NDArray:
+    """Memory-maps the spilled file and counts the reference, must be called with `_lock` held"""
+    _references[path] = _references.get(path, 0) + 1
+    _ensure_file_limit(sum(_references.values()))
+
+    array = np.load(path, mmap_mode="c", allow_pickle=False)
+    # views of the array keep it alive, so the file is released when the data are not used anymore;
+    # the finalizer can run in any thread at any time, so the file is removed later under the lock
+    weakref.finalize(array, _released.append, path)
+    return array
+
+
+def remove_released_arrays():
+    """Removes the spilled files that are not used by any memory-mapped array anymore, e.g. after a session was evicted"""
+    with _lock:
+        _remove_released()
+
+
+def _remove_released():
+    """Removes the spilled files that are not used by any memory-mapped array, must be called with `_lock` held"""
+    while len(_released) > 0:
+        path = _released.pop()
+        _references[path] -= 1
+        if _references[path] == 0:
+            del _references[path]
+            try:
+                os.remove(path)
+            except OSError:
+                # still mapped (on Windows), removed on next startup
+                pass
+
+
+def _ensure_file_limit(mapped: int):
+    """Raises the limit of open files if needed, every memory-mapped array keeps one file descriptor open"""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = mapped + RESERVED_FILES
+    if soft == resource.RLIM_INFINITY or needed <= soft:
+        return
+
+    # raised in steps, so that the limit is not changed for every new array
+    limit = max(needed, 2 * soft)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def spill_campaign_arrays(campaign: MoccaDataset):
+    """Replaces the raw and processed 2D data in the campaign by memory-mapped arrays, data that were not loaded yet are skipped"""
+    for idx, raw in campaign._raw_2d_data.items():
+        if not is_loaded(raw):
+            continue
+        chromatogram = campaign.chromatograms.get(idx)
+        shared = chromatogram is not None and is_loaded(chromatogram) and chromatogram.data is raw.data
+
+        raw.data = spill_array(raw.data)
+        if shared:
+            chromatogram.data = raw.data
+
+    for chromatogram in campaign.chromatograms.values():
+        if is_loaded(chromatogram):
+            chromatogram.data = spill_array(chromatogram.data)
@@ -0,0 +1,86 @@
+"""Storage backends for the global variables, see `cache.global_vars`"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from abc import ABC, abstractmethod
+import threading
+
+
+@dataclass
+class StateBackend(ABC):
+    """
+    Base class for storages of global variables, the subclasses must implement all methods.
+
+    All methods must be safe to call from multiple threads. To make a sequence
+    of calls atomic (e.g. read-modify-write of a variable), hold `lock`.
+    """
+
+    lock: threading.RLock = field(init=False, default_factory=threading.RLock)
+    """Reentrant lock guarding the stored values"""
+
+    @abstractmethod
+    def get(self, name: str) -> Any:
+        """Returns the value of the variable, or None if it is not set"""
+
+    @abstractmethod
+    def set(self, name: str, value: Any):
+        """Sets the value of the variable"""
+
+    @abstractmethod
+    def delete(self, name: str):
+        """Removes the variable, does nothing if it is not set"""
+
+
+@dataclass
+class ReferenceBackend(StateBackend):
+    """
+    Keeps the values in the memory of the server process, nothing is copied or serialized.
+
+    `get` returns the stored object itself, so in-place changes are immediately
+    visible to all other callbacks. Long-running modifications should be done
+    on a copy, which is then stored with `set`.
+    """
+
+    values: Dict[str, Any] = field(init=False, default_factory=dict)
+    """The stored variables [name -> value]"""
+
+    def get(self, name: str) -> Any:
+        with self.lock:
+            return self.values.get(name)
+
+    def set(self, name: str, value: Any):
+        with self.lock:
+            self.values[name] = value
+
+    def delete(self, name: str):
+        with self.lock:
+            self.values.pop(name, None)
+
+
+@dataclass
+class FlaskCacheBackend(StateBackend):
+    """
+    Stores the values using flask-caching.
+
+    With `SimpleCache`, every value is pickled on `set` and unpickled on `get`,
+    so each access returns a new copy of the object.
+    """
+
+    server: Any = None
+    """The Flask server (`app.server`)"""
+
+    flask_cache: Any = None
+    """The initialized `flask_caching.Cache` (`app.flask_cache`)"""
+
+    def get(self, name: str) -> Any:
+        with self.lock, self.server.app_context():
+            return self.flask_cache.get(name)
+
+    def set(self, name: str, value: Any):
+        with self.lock, self.server.app_context():
+            self.flask_cache.set(name, value)
+
+    def delete(self, name: str):
+        with self.lock, self.server.app_context():
+            self.flask_cache.delete(name)
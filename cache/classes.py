@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Literal
+from typing import Any, Literal
 
 @dataclass(frozen=True,init=True)
 class CachedFile:
@@ -13,6 +13,9 @@ class CachedFile:
 
     cached_path: str
     """Full path to the file in the cache directory"""
+
+    content_hash: str | None = None
+    """SHA-256 of the file content, if known. Files with same content and extension share the cached path"""
     
 
 @dataclass(init=True, slots=True)
@@ -20,4 +23,45 @@ class CampaignProcessingInfo:
     """Status of the campaign processing running in background"""
     status : Literal['IDLE', 'PROCESSING', 'NEW_DATA_READY']
     message : str
-    message_class : str
\ No newline at end of file
+    message_class : str
+
+@dataclass(init=True, slots=True)
+class CampaignExportInfo:
+    """Status of exporting the campaign into .mocca2 file in background"""
+    status : Literal['IDLE', 'EXPORTING', 'READY']
+    message : str
+    message_class : str
+    version : int | None = None
+    """Campaign version in the last exported file"""
+    path : str | None = None
+    """Path to the last exported file, it is downloaded again if the campaign was not changed"""
+
+@dataclass(init=True, slots=True)
+class SessionInfo:
+    """Bookkeeping of one browser session, see `cache.sessions`"""
+    last_access : float
+    """Time of the last access to the session variables (`time.monotonic()`)"""
+    campaign_size : int
+    """Estimated memory taken by the campaign [bytes]"""
+    snapshot_path : str | None
+    """If the session was evicted, path to the .mocca2 snapshot of its campaign"""
+    restoring : bool = False
+    """True while the campaign is being loaded from the snapshot"""
+
+@dataclass(init=True, slots=True)
+class StreamingUpload:
+    """File that is being uploaded in chunks, see `cache.streaming_uploads`"""
+    name : str
+    """Original name of the uploaded file"""
+    size : int
+    """Total size of the file [bytes], as announced by the browser"""
+    received : int
+    """Number of bytes received so far"""
+    path : str
+    """Path to the partially uploaded file"""
+    digest : Any
+    """SHA-256 of the received content (`hashlib.sha256` object)"""
+    last_activity : float
+    """Time when the last chunk was received (`time.monotonic()`)"""
+    lock : Any
+    """Held while a chunk is written, so that the chunks are appended one by one (`threading.Lock`)"""
@@ -1,10 +1,28 @@
-from typing import Tuple
+"""
+Index of the cached files.
+
+The information about cached files is stored in a SQLite database in the cache folder,
+so it is shared by all sessions and survives restarts of the server.
+"""
+
+from typing import List, Tuple
 
 import os
+import sqlite3
+import threading
 
 from app import CACHE_DIR
 import cache
 
+INDEX_PATH = os.path.join(CACHE_DIR, "files.sqlite")
+"""Database with information about all cached files"""
+
+_connection: sqlite3.Connection | None = None
+"""Connection to the index, opened by `init()`"""
+
+_lock = threading.Lock()
+"""The connection is shared by all threads, so it must be used by one at a time"""
+
 def init():
     """Initializes file caching"""
 
@@ -12,37 +30,103 @@ def init():
     if not os.path.exists(CACHE_DIR):
         os.mkdir(CACHE_DIR)
 
+    global _connection
+    with _lock:
+        _connection = sqlite3.connect(INDEX_PATH, check_same_thread=False, isolation_level=None)
+        # AUTOINCREMENT never reuses IDs of deleted files
+        _connection.executescript("""
+            CREATE TABLE IF NOT EXISTS cached_files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_name TEXT NOT NULL,
+                cached_path TEXT NOT NULL,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS cached_files_original_name ON cached_files (original_name);
+            CREATE INDEX IF NOT EXISTS cached_files_content_hash ON cached_files (content_hash);
+            CREATE INDEX IF NOT EXISTS cached_files_cached_path ON cached_files (cached_path);
+        """)
+
 def get_cached_file(id: int) -> cache.CachedFile:
     """Returns the CachedFile with given ID"""
-    files = cache.get_cached_files()
+    files = _query("SELECT * FROM cached_files WHERE id = ?", (id,))
+
+    if len(files) == 0:
+        raise KeyError(f"There is no cached file with ID {id}")
+    return files[0]
+
+def get_cached_files_by_name(original_name: str) -> List[cache.CachedFile]:
+    """Returns all cached files that were uploaded with given name, oldest first"""
+    return _query("SELECT * FROM cached_files WHERE original_name = ? ORDER BY id", (original_name,))
 
-    return files[id]
+def add_cached_file(original_name : str, content_hash: str | None = None) -> Tuple[int, str]:
+    """
+    Returns ID and full path for location where new cached file can be saved.
 
-def add_cached_file(original_name : str) -> Tuple[int, str]:
-    """Returns ID and full path for location where new cached file can be saved"""
-    id = _find_new_id()
-    filename = _get_filename(id)
-    extension = original_name.split('.')[-1]
-    cached_path = os.path.join(CACHE_DIR, filename + '.' + extension)
+    If `content_hash` is specified, the file is named by the hash and extension, so that the same content
+    is stored only once - every upload gets its own ID and original name, but they share the cached path.
+    """
+    with _lock:
+        assert _connection is not None, "The cache was not initialized"
+        with _connection:
+            _connection.execute("BEGIN")
+            id = _connection.execute(
+                "INSERT INTO cached_files (original_name, cached_path, content_hash) VALUES (?, '', ?)",
+                (original_name, content_hash),
+            ).lastrowid
+            assert id is not None
 
-    files = cache.get_cached_files()
-    files[id] = cache.CachedFile(id, original_name, cached_path)
-    cache.set_cached_files(files)
+            if content_hash is None:
+                cached_path = os.path.join(CACHE_DIR, _get_filename(id) + '.' + _get_extension(original_name))
+            else:
+                cached_path = get_content_path(original_name, content_hash)
+            _connection.execute("UPDATE cached_files SET cached_path = ? WHERE id = ?", (cached_path, id))
 
     return id, cached_path
 
-def _get_filename(id: int) -> str:
-    """Generates filename for caching from ID"""
-    return f"cached{id:04.0f}"
+def get_content_path(original_name: str, content_hash: str) -> str:
+    """Returns path where the file with given content and extension is stored, see `add_cached_file`"""
+    return os.path.join(CACHE_DIR, f"sha256-{content_hash}.{_get_extension(original_name)}")
+
+def register_file(path: str) -> int:
+    """
+    Registers a file (or folder, e.g. Agilent `.D`) that is already on the server, returns its ID.
+
+    The file stays where it is and is not copied into the cache folder. The content hash is
+    not stored, because the file may be changed by other programs. Registering the same path
+    again returns the same ID.
+    """
+    path = os.path.abspath(path)
+
+    with _lock:
+        assert _connection is not None, "The cache was not initialized"
+        with _connection:
+            _connection.execute("BEGIN")
+            row = _connection.execute(
+                "SELECT id FROM cached_files WHERE cached_path = ? AND content_hash IS NULL", (path,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+
+            id = _connection.execute(
+                "INSERT INTO cached_files (original_name, cached_path, content_hash) VALUES (?, ?, NULL)",
+                (os.path.basename(path), path),
+            ).lastrowid
+            assert id is not None
 
-def _find_new_id() -> int:
-    """Finds lowest ID for cached file that is not currently used"""
+    return id
 
-    files = cache.get_cached_files()
+def _query(sql: str, parameters: Tuple) -> List[cache.CachedFile]:
+    """Runs query on the index, the selected columns must match `CachedFile`"""
+    with _lock:
+        assert _connection is not None, "The cache was not initialized"
+        rows = _connection.execute(sql, parameters).fetchall()
 
-    # assuming that less than 10 000 files will be cached
-    for id in range(10000):
-        if id not in files:
-            return id
-    
-    raise Exception("Could not find suitable ID for cache file - maybe delete old files from cache folder?")
\ No newline at end of file
+    return [cache.CachedFile(*row) for row in rows]
+
+def _get_extension(original_name: str) -> str:
+    """Returns extension of the file, the whole name if there is no dot"""
+    return original_name.split('.')[-1]
+
+def _get_filename(id: int) -> str:
+    """Generates filename for caching from ID"""
+    return f"cached{id:04.0f}"
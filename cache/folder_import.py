@@ -0,0 +1,112 @@
+"""
+Importing chromatograms from a folder on the server.
+
+The HPLC exports often land on a file system that the server can read, so the files
+can be registered in place instead of uploading them through the browser.
+"""
+
+from typing import List, Tuple
+
+import fnmatch
+import glob
+import os
+
+from app import IMPORT_ROOT
+from cache.files import register_file
+
+
+def import_folder(
+    folder: str, pattern: str, blank_pattern: str | None
+) -> List[Tuple[int, int | None]]:
+    """
+    Registers all files in `folder` matching the glob `pattern`, returns IDs of (sample, blank) pairs.
+
+    The blanks are recognized and paired with the samples by `pair_with_blanks`.
+    """
+    pairs = pair_with_blanks(find_files(folder, pattern), blank_pattern)
+    if len(pairs) == 0:
+        raise Exception(f"There are no samples matching {pattern} in {folder}!")
+
+    return [
+        (register_file(sample), register_file(blank) if blank is not None else None)
+        for sample, blank in pairs
+    ]
+
+
+def init():
+    """Creates the folder from which the chromatograms can be imported"""
+    if not os.path.exists(IMPORT_ROOT):
+        os.makedirs(IMPORT_ROOT)
+
+
+def find_files(folder: str, pattern: str) -> List[str]:
+    """
+    Returns sorted paths of all files in `folder` matching the glob `pattern`.
+
+    Relative folders are inside `IMPORT_ROOT`. Files outside `IMPORT_ROOT` are never returned,
+    also when the folder contains symbolic links pointing outside of it.
+    """
+    root = _get_root()
+    folder = resolve_folder(folder)
+
+    if os.path.isabs(pattern) or os.path.splitdrive(pattern)[0] != "" or ".." in _split_path(pattern):
+        raise Exception("The pattern of files must be relative and must not contain '..'!")
+    if not os.path.isdir(folder):
+        raise Exception(f"The folder {folder} does not exist!")
+
+    paths = glob.glob(os.path.join(glob.escape(folder), pattern), recursive=True)
+    return sorted(path for path in paths if _is_inside(os.path.realpath(path), root))
+
+
+def resolve_folder(folder: str) -> str:
+    """Returns the real path of the folder, relative folders are inside `IMPORT_ROOT`. Raises if it is outside of it."""
+    root = _get_root()
+    folder = os.path.realpath(os.path.join(root, os.path.expanduser(folder)))
+    if not _is_inside(folder, root):
+        raise Exception(f"Only folders inside {root} can be imported!")
+    return folder
+
+
+def _get_root() -> str:
+    """Returns the real path of `IMPORT_ROOT`"""
+    return os.path.realpath(os.path.expanduser(IMPORT_ROOT))
+
+
+def _is_inside(path: str, root: str) -> bool:
+    """Checks whether the resolved `path` is `root` or inside it"""
+    return os.path.commonpath([root, path]) == root
+
+
+def _split_path(path: str) -> List[str]:
+    """Splits the path into its components, both / and the OS separator are recognized"""
+    return path.replace(os.sep, "/").split("/")
+
+
+def is_blank(path: str, blank_pattern: str | None) -> bool:
+    """Checks whether the file name matches the pattern for blanks (case insensitive)"""
+    return blank_pattern is not None and fnmatch.fnmatch(
+        os.path.basename(path).lower(), blank_pattern.lower()
+    )
+
+
+def pair_with_blanks(
+    paths: List[str], blank_pattern: str | None
+) -> List[Tuple[str, str | None]]:
+    """
+    Returns (sample, blank) pairs of paths, the blanks are the files matching `blank_pattern` (e.g. `*blank*`).
+
+    Every sample is paired with the last blank before it in alphabetical order - the names usually
+    start with date and time, so this is the most recent blank. Samples before the first blank are
+    paired with the first blank.
+    """
+    blanks = [path for path in sorted(paths) if is_blank(path, blank_pattern)]
+    blank = blanks[0] if len(blanks) > 0 else None
+
+    pairs: List[Tuple[str, str | None]] = []
+    for path in sorted(paths):
+        if is_blank(path, blank_pattern):
+            blank = path
+        else:
+            pairs.append((path, blank))
+
+    return pairs
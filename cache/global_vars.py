@@ -1,52 +1,298 @@
 """Functions for getting and setting global variables"""
 
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Set, Tuple
+from numpy.typing import NDArray
 
-from mocca2 import MoccaDataset
+import copy
+import threading
 
-from app import server, flask_cache
+from mocca2 import MoccaDataset, Chromatogram
+from mocca2.classes import Data2D, Compound
+
+from app import server, flask_cache, STATE_BACKEND, MEMMAP_ARRAYS, STORAGE_PRECISION
 import cache
+from cache.backends import StateBackend, ReferenceBackend, FlaskCacheBackend
+from cache.arrays import spill_campaign_arrays, cast_campaign_arrays
+from cache import sessions
+
+def _create_backend(name: str) -> StateBackend:
+    """Creates the storage backend for global variables specified in `app.STATE_BACKEND`"""
+    if name == 'reference':
+        return ReferenceBackend()
+    elif name == 'flask-cache':
+        return FlaskCacheBackend(server, flask_cache)
+    else:
+        raise ValueError(f"Unknown backend for global variables: '{name}'")
+
+_backend = _create_backend(STATE_BACKEND)
+
+def set_backend(backend: StateBackend):
+    """Replaces the storage backend for global variables. The variables are not transferred."""
+    global _backend
+    _backend = backend
+    sessions.forget_all()
+
+def locked() -> threading.RLock:
+    """
+    Returns the lock of the global variables. Hold it to make a sequence of gets and sets atomic:
+
+    ```
+    with cache.locked():
+        campaign = cache.get_campaign()
+        ...
+        cache.set_campaign(campaign)
+    ```
+    """
+    return _backend.lock
+
+SHARED_VARIABLES: Set[str] = set()
+"""Variables shared by all sessions, other variables belong to the current session. The cached files are indexed in `cache.files`"""
+
+def _key(name : str) -> str:
+    """Returns the key under which the variable of the current session is stored"""
+    if name in SHARED_VARIABLES:
+        return name
+    session_id = sessions.get_session_id()
+    sessions.touch(session_id)
+    return f'{session_id}/{name}'
 
 def _set(name : str, value : Any):
     """Sets variable value, not to be used outside this package"""
-    with server.app_context():
-        flask_cache.set(name, value)
+    _backend.set(_key(name), value)
 
 def _get(name : str) -> Any:
     """Gets variable value, not to be used outside this package"""
-    with server.app_context():
-        value = flask_cache.get(name)
-    
-    return value
+    return _backend.get(_key(name))
+
+def _delete(name : str):
+    """Removes variable, not to be used outside this package"""
+    _backend.delete(_key(name))
 
 def init():
-    """Initialize global variables"""
+    """Initialize global variables shared by all sessions, session variables are initialized on first access"""
+    for name in SHARED_VARIABLES:
+        _delete(name)
+
+def init_session():
+    """Initialize variables of the current session"""
+    if get_campaign_version() is None:
+        _set('campaign_version', 0)
     set_campaign(MoccaDataset())
-    set_cached_files(dict())
     set_current_blank(None)
+    set_campaign_building_info(
+        cache.CampaignProcessingInfo("IDLE", "", ""))
     set_campaign_processing_info(
         cache.CampaignProcessingInfo("IDLE", "", ""))
+    set_campaign_export_info(
+        cache.CampaignExportInfo("IDLE", "", ""))
     set_displayed_chromatogram(None)
 
 # CAMPAIGN
+# The campaign is stored in slices, so that the chromatograms, raw data and compounds
+# can be accessed one by one without loading the whole campaign.
+# 'campaign' contains only the metadata, the dictionaries with large objects are empty.
 
 def get_campaign() -> MoccaDataset:
     """Returns the current MOCCA campaign"""
-    return _get('campaign')
+    with _backend.lock:
+        campaign = copy.copy(_get('campaign'))
+        chromatogram_ids = _get('campaign_chromatogram_ids')
+        compound_ids = _get('campaign_compound_ids')
+
+        slices = {idx: _get(f'campaign_chromatogram_{idx}') for idx in chromatogram_ids}
+
+        campaign.chromatograms = {idx: chromatogram for idx, (chromatogram, _) in slices.items()}
+        campaign._raw_2d_data = {idx: raw for idx, (_, raw) in slices.items()}
+        campaign.compounds = {idx: get_compound(idx) for idx in compound_ids}
+
+    return campaign
+
+def set_campaign(campaign: MoccaDataset, keep_version: bool = False):
+    """
+    Updates the current MOCCA campaign and increments the campaign version.
+
+    With `keep_version`, the version is not incremented, e.g. when the same campaign is restored from a snapshot.
+    """
+    cast_campaign_arrays(campaign, STORAGE_PRECISION)
+    if MEMMAP_ARRAYS:
+        spill_campaign_arrays(campaign)
+
+    size = sessions.estimate_campaign_size(campaign)
+
+    metadata = copy.copy(campaign)
+    metadata.chromatograms = {}
+    metadata._raw_2d_data = {}
+    metadata.compounds = {}
+
+    with _backend.lock:
+        # remove slices that are not in the new campaign
+        for idx in set(_get('campaign_chromatogram_ids') or []) - set(campaign.chromatograms):
+            _delete(f'campaign_chromatogram_{idx}')
+        for idx in set(_get('campaign_compound_ids') or []) - set(campaign.compounds):
+            _delete(f'campaign_compound_{idx}')
+
+        # chromatogram and its raw data are stored together, because they share the data until processing
+        for idx, chromatogram in campaign.chromatograms.items():
+            _set(f'campaign_chromatogram_{idx}', (chromatogram, campaign._raw_2d_data[idx]))
+        for idx, compound in campaign.compounds.items():
+            _set(f'campaign_compound_{idx}', compound)
+
+        _set('campaign_chromatogram_ids', list(campaign.chromatograms))
+        _set('campaign_chromatogram_names', {idx: c.name for idx, c in campaign.chromatograms.items()})
+        _set('campaign_compound_ids', list(campaign.compounds))
+        _set('campaign_time', campaign.time())
+        _set('campaign_wavelength', campaign.wavelength())
+        _set('campaign', metadata)
+        if not keep_version:
+            _bump_campaign_version()
+
+    sessions.update_campaign_size(sessions.get_session_id(), size)
+
+def update_campaign(
+    metadata: MoccaDataset,
+    chromatograms: Dict[int, Tuple[Chromatogram, Data2D]],
+    removed: Iterable[int] = (),
+    keep_compounds: bool = False,
+):
+    """
+    Applies changes to the current campaign, the unchanged chromatograms are not stored again.
+
+    `metadata` replaces the campaign metadata (its chromatograms and compounds are ignored),
+    `chromatograms` are the new or changed chromatograms with their raw data [ID -> (chromatogram, raw)]
+    and `removed` are the IDs of removed chromatograms. The new chromatograms are added at the end.
+    The compounds are removed unless `keep_compounds` is True. Increments the campaign version.
+    """
+    changed = MoccaDataset()
+    changed.chromatograms = {idx: chromatogram for idx, (chromatogram, _) in chromatograms.items()}
+    changed._raw_2d_data = {idx: raw for idx, (_, raw) in chromatograms.items()}
+    cast_campaign_arrays(changed, STORAGE_PRECISION)
+    if MEMMAP_ARRAYS:
+        spill_campaign_arrays(changed)
+
+    metadata = copy.copy(metadata)
+    metadata.chromatograms = {}
+    metadata._raw_2d_data = {}
+    metadata.compounds = {}
 
-def set_campaign(campaign: MoccaDataset):
-    """Updates the current MOCCA campaign"""
-    _set('campaign', campaign)
+    with _backend.lock:
+        chromatogram_ids = _get('campaign_chromatogram_ids')
+        names = dict(_get('campaign_chromatogram_names'))
+        removed = set(removed) & set(chromatogram_ids)
 
-# CACHED FILES
+        # the memory of the replaced slices is released
+        replaced = MoccaDataset()
+        for idx in (removed | set(chromatograms)) & set(chromatogram_ids):
+            replaced.chromatograms[idx], replaced._raw_2d_data[idx] = _get(f'campaign_chromatogram_{idx}')
+        delta = sessions.estimate_campaign_size(changed) - sessions.estimate_campaign_size(replaced)
 
-def get_cached_files() -> Dict[int,cache.CachedFile]:
-    """Returns dictionary with information about all cached files"""
-    return _get('cached_files_info')
+        for idx in removed:
+            _delete(f'campaign_chromatogram_{idx}')
+            del names[idx]
+        for idx, (chromatogram, raw) in chromatograms.items():
+            _set(f'campaign_chromatogram_{idx}', (chromatogram, raw))
+            names[idx] = chromatogram.name
 
-def set_cached_files(cached_files: Dict[int,cache.CachedFile]):
-    """Sets the dictionary with information about all cached files"""
-    _set('cached_files_info', cached_files)
+        chromatogram_ids = [idx for idx in chromatogram_ids if idx not in removed]
+        chromatogram_ids += [idx for idx in chromatograms if idx not in chromatogram_ids]
+
+        if not keep_compounds:
+            for idx in _get('campaign_compound_ids'):
+                _delete(f'campaign_compound_{idx}')
+            _set('campaign_compound_ids', [])
+
+        # the axes are taken from the first chromatogram, same as `MoccaDataset.time()`
+        if len(chromatogram_ids) == 0:
+            first = None
+        elif chromatogram_ids[0] in chromatograms:
+            first = chromatograms[chromatogram_ids[0]][0]
+        else:
+            first = get_chromatogram(chromatogram_ids[0])
+
+        _set('campaign_chromatogram_ids', chromatogram_ids)
+        _set('campaign_chromatogram_names', names)
+        _set('campaign_time', first.time if first is not None else None)
+        _set('campaign_wavelength', first.wavelength if first is not None else None)
+        _set('campaign', metadata)
+        _bump_campaign_version()
+
+    sessions.change_campaign_size(sessions.get_session_id(), delta)
+
+def delete_campaign():
+    """Removes the campaign of the current session from memory, the campaign version is kept"""
+    with _backend.lock:
+        for idx in _get('campaign_chromatogram_ids'):
+            _delete(f'campaign_chromatogram_{idx}')
+        for idx in _get('campaign_compound_ids'):
+            _delete(f'campaign_compound_{idx}')
+        for name in ['campaign_chromatogram_ids', 'campaign_chromatogram_names', 'campaign_compound_ids', 'campaign_time', 'campaign_wavelength', 'campaign']:
+            _delete(name)
+
+def get_campaign_metadata() -> MoccaDataset:
+    """
+    Returns the current campaign without the chromatograms, raw data and compounds, which are not loaded.
+
+    The chromatograms, raw data and compounds are new empty dicts, so filling them does not change the stored campaign.
+    """
+    metadata = copy.copy(_get('campaign'))
+    metadata.chromatograms = {}
+    metadata._raw_2d_data = {}
+    metadata.compounds = {}
+    return metadata
+
+def get_chromatogram_names() -> Dict[int, str]:
+    """Returns the names of the chromatograms of the current campaign in the campaign order [ID -> name]"""
+    return dict(_get('campaign_chromatogram_names'))
+
+def get_campaign_version() -> int:
+    """
+    Returns the version of the current campaign without loading it.
+
+    The version is incremented by every `set_campaign()` and `update_*()`, so any
+    in-place changes of the campaign must be followed by `set_campaign()` to be noticed.
+    """
+    return _get('campaign_version')
+
+def _bump_campaign_version():
+    """Increments the campaign version, not to be used outside this package"""
+    with _backend.lock:
+        _set('campaign_version', get_campaign_version() + 1)
+
+def get_chromatogram(chromatogram_id: int) -> Chromatogram:
+    """Returns one chromatogram of the current campaign"""
+    return _get(f'campaign_chromatogram_{chromatogram_id}')[0]
+
+def get_raw_2d_data(chromatogram_id: int) -> Data2D:
+    """Returns the raw data (without wavelength cropping) of one chromatogram of the current campaign"""
+    return _get(f'campaign_chromatogram_{chromatogram_id}')[1]
+
+def get_compound(compound_id: int) -> Compound:
+    """Returns one compound of the current campaign"""
+    return _get(f'campaign_compound_{compound_id}')
+
+def get_compounds() -> Dict[int, Compound]:
+    """Returns all compounds of the current campaign, without loading the chromatograms"""
+    with _backend.lock:
+        return {idx: get_compound(idx) for idx in _get('campaign_compound_ids')}
+
+def update_compound_name(compound_id: int, name: str):
+    """Renames one compound of the current campaign, the stored compound is replaced by a renamed copy"""
+    with _backend.lock:
+        compound = get_compound(compound_id)
+        if compound.name == name:
+            return
+        # others may still hold the stored compound, e.g. an export or a snapshot of the session
+        compound = copy.copy(compound)
+        compound.name = name
+        _set(f'campaign_compound_{compound_id}', compound)
+        _bump_campaign_version()
+
+def get_time_axis() -> NDArray | None:
+    """Returns the time axis of the current campaign, if there are any chromatograms"""
+    return _get('campaign_time')
+
+def get_wavelength_axis() -> NDArray | None:
+    """Returns the (cropped) wavelength axis of the current campaign, if there are any chromatograms"""
+    return _get('campaign_wavelength')
 
 # DATA PAGE - CURRENT BLANK
 
@@ -58,6 +304,26 @@ def set_current_blank(id: int | None):
     """Sets the cached file ID of the current blank file for uploading samples"""
     _set('current_blank', id)
 
+# DATA PAGE - CAMPAIGN BUILDING INFO
+
+def get_campaign_building_info() -> cache.CampaignProcessingInfo:
+    """Returns the status of loading the chromatograms after confirming the upload table"""
+    return _get('campaign_building_info')
+
+def set_campaign_building_info(status : cache.CampaignProcessingInfo):
+    """Sets the status of loading the chromatograms after confirming the upload table"""
+    _set('campaign_building_info', status)
+
+# DATA PAGE - CAMPAIGN EXPORT INFO
+
+def get_campaign_export_info() -> cache.CampaignExportInfo:
+    """Returns the status of exporting the campaign into .mocca2 file"""
+    return _get('campaign_export_info')
+
+def set_campaign_export_info(status : cache.CampaignExportInfo):
+    """Sets the status of exporting the campaign into .mocca2 file"""
+    _set('campaign_export_info', status)
+
 # PROCESS PAGE - CAMPAIGN PROCESSING INFO
 
 def get_campaign_processing_info() -> cache.CampaignProcessingInfo:
@@ -0,0 +1,108 @@
+"""Memoization of values derived from the current campaign, and LRU cache of values with known size"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from collections import OrderedDict
+import functools
+import threading
+
+import cache
+
+_lock = threading.Lock()
+
+_memos: List[Dict[str, Dict[str, Any]]] = []
+"""Memos of all memoized functions [session ID -> {'version', 'results'}]"""
+
+
+def memoize_per_campaign_version(func: Callable) -> Callable:
+    """
+    Decorator that caches the results of `func` until the campaign is updated by `cache.set_campaign()`.
+
+    The arguments of `func` must be hashable. Only results for the current version of the campaign are kept, separately for each session.
+    """
+    memos: Dict[str, Dict[str, Any]] = {}
+    with _lock:
+        _memos.append(memos)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session_id = cache.get_session_id()
+        version = cache.get_campaign_version()
+        key: Tuple = (args, tuple(sorted(kwargs.items())))
+
+        with _lock:
+            memo = memos.get(session_id)
+            if memo is None or memo["version"] != version:
+                memo = memos[session_id] = {"version": version, "results": {}}
+            elif key in memo["results"]:
+                return memo["results"][key]
+
+        result = func(*args, **kwargs)
+
+        with _lock:
+            if memo["version"] == version:
+                memo["results"][key] = result
+
+        return result
+
+    return wrapper
+
+
+def forget_session(session_id: str):
+    """Removes all memoized results of the session"""
+    with _lock:
+        for memos in _memos:
+            memos.pop(session_id, None)
+
+
+@dataclass
+class LRUCache:
+    """
+    Thread-safe cache limited by the total size of the values, the least recently used values are removed first.
+
+    The size of every value is given by the caller, e.g. estimated memory in bytes.
+    """
+
+    max_size: int
+    """Maximal total size of the values"""
+
+    size: int = 0
+    """Current total size of the values"""
+
+    items: OrderedDict = field(default_factory=OrderedDict)
+    """Cached values [key -> (value, size)], from the least recently used"""
+
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Returns the value and marks it as recently used, None if it is not cached"""
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            self.items.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """Adds the value, values larger than `max_size` are not cached"""
+        if size > self.max_size:
+            return
+
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+            self.items[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, removed_size) = self.items.popitem(last=False)
+                self.size -= removed_size
+
+    def clear(self):
+        """Removes all values"""
+        with self.lock:
+            self.items.clear()
+            self.size = 0
@@ -0,0 +1,214 @@
+"""
+Cache of parsed chromatograms.
+
+Parsing the raw files (especially CSV) is slow, so the parsed and blank-subtracted
+data are saved as `.npz` files in the cache folder. The files are named by the
+content hashes of the sample and blank and by the parsing options, so the same
+combination of files is parsed only once - also across sessions and restarts.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Set, Tuple
+from numpy.typing import NDArray
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from mocca2.classes import Data2D
+
+from app import CACHE_DIR, PARSING_WORKERS
+import cache
+from workers import MP_CONTEXT
+from workers.parsing import parse, init_worker, parse_in_worker
+
+logger = logging.getLogger(__name__)
+
+PARSED_DIR = os.path.join(CACHE_DIR, "parsed")
+"""Folder with the parsed chromatograms"""
+
+PARSED_FORMAT = 1
+"""Version of the parsed data, change it when the parsing changes to invalidate old files"""
+
+
+def init():
+    """Creates the folder for the parsed chromatograms"""
+    if not os.path.exists(PARSED_DIR):
+        os.makedirs(PARSED_DIR)
+
+
+@dataclass
+class BlankRegistry:
+    """
+    Parsed blanks shared by all samples in one build of the campaign.
+
+    Every distinct blank is loaded only once and kept in memory, the samples are
+    then parsed without reading the blank file again.
+    """
+
+    blanks: Dict[str, Data2D] = field(default_factory=dict)
+    """Parsed blanks [cached path -> data]"""
+
+    parsed: Set[str] = field(default_factory=set)
+    """Cached paths of the blanks that were parsed, not loaded from the cache folder"""
+
+    uses: Dict[str, int] = field(default_factory=dict)
+    """Number of parsed samples that needed each blank [cached path -> count]"""
+
+    def get(self, blank: cache.CachedFile) -> Data2D:
+        """Returns the parsed blank, loads or parses it on first use"""
+        if blank.cached_path not in self.blanks:
+            path = _get_parsed_path(blank, None, False)
+            data = _load(path)
+            if data is None:
+                data = Data2D(*parse(blank.cached_path, None, False, path))
+                self.parsed.add(blank.cached_path)
+            self.blanks[blank.cached_path] = data
+        return self.blanks[blank.cached_path]
+
+    def use(self, blank: cache.CachedFile) -> Data2D:
+        """Same as `get`, counts the sample that is parsed with the blank"""
+        self.uses[blank.cached_path] = self.uses.get(blank.cached_path, 0) + 1
+        return self.get(blank)
+
+    @property
+    def saved(self) -> int:
+        """
+        Number of blank parses saved compared to parsing the blank with every sample.
+
+        Only the blanks parsed in this build are counted, the blanks loaded from
+        the cache folder were not parsed at all.
+        """
+        return sum(max(self.uses.get(path, 0) - 1, 0) for path in self.parsed)
+
+
+def load_parsed_data_batch(
+    files: List[Tuple[cache.CachedFile, cache.CachedFile | None]],
+    interpolate_blank: bool = True,
+    workers: int | None = PARSING_WORKERS,
+    progress: Callable[[int, int], None] | None = None,
+    blanks: BlankRegistry | None = None,
+) -> List[Data2D]:
+    """
+    Returns the data of the samples with blanks subtracted for many pairs of (sample, blank), in the same order.
+
+    The data are loaded from the cache folder if the sample and blank were parsed before,
+    the other files are parsed in parallel by `workers` processes (all CPUs if None)
+    and the results are saved. Each blank is parsed only once and kept in `blanks`, which also
+    counts the saved parses. After each loaded file, `progress(done, total)` is called.
+    """
+    if blanks is None:
+        blanks = BlankRegistry()
+
+    results: List[Data2D | None] = [None] * len(files)
+    done = 0
+
+    # the same sample and blank may be in the table multiple times, parse them only once
+    to_parse: Dict[str, List[int]] = dict()
+    for idx, (sample, blank) in enumerate(files):
+        path = _get_parsed_path(sample, blank, interpolate_blank)
+        results[idx] = _load(path)
+        if results[idx] is None:
+            to_parse.setdefault(path, []).append(idx)
+        else:
+            done += 1
+
+    if progress is not None:
+        progress(done, len(files))
+
+    def _parsed(path: str, parsed: Tuple[NDArray, NDArray, NDArray]):
+        nonlocal done
+        time, wavelength, data = parsed
+        for i, idx in enumerate(to_parse[path]):
+            # the data of the chromatograms are modified in place during processing
+            results[idx] = Data2D(time, wavelength, data if i == 0 else data.copy())
+            done += 1
+        if progress is not None:
+            progress(done, len(files))
+
+    # (sample path, blank path, path of parsed data)
+    tasks: List[Tuple[str, str | None, str]] = []
+    for path, indices in to_parse.items():
+        sample, blank = files[indices[0]]
+        if blank is not None:
+            blanks.use(blank)
+        tasks.append((sample.cached_path, blank.cached_path if blank is not None else None, path))
+
+    if len(tasks) == 1 or workers == 1:
+        for sample_path, blank_path, path in tasks:
+            blank_data = blanks.blanks[blank_path] if blank_path is not None else None
+            _parsed(path, parse(sample_path, blank_data, interpolate_blank, path))
+    elif len(tasks) > 1:
+        # the blanks are sent to every worker process only once
+        used_blanks = {blank_path: blanks.blanks[blank_path] for _, blank_path, _ in tasks if blank_path is not None}
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=MP_CONTEXT, initializer=init_worker, initargs=(used_blanks,)
+        ) as pool:
+            futures = {
+                pool.submit(parse_in_worker, sample_path, blank_path, interpolate_blank, path): path
+                for sample_path, blank_path, path in tasks
+            }
+            for future in as_completed(futures):
+                _parsed(futures[future], future.result())
+
+    return results  # type: ignore
+
+
+def _load(path: str) -> Data2D | None:
+    """Loads previously parsed data, returns None if they are not in the cache folder"""
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as parsed:
+            return Data2D(parsed["time"], parsed["wavelength"], parsed["data"])
+    except Exception as ex:
+        logger.warning(f"Could not load parsed chromatogram {path}, parsing it again: {ex}")
+        return None
+
+
+def _get_parsed_path(
+    sample: cache.CachedFile, blank: cache.CachedFile | None, interpolate_blank: bool
+) -> str:
+    """Returns path of the parsed data for given sample, blank and parsing options"""
+    key = "|".join(
+        [
+            str(PARSED_FORMAT),
+            # the parsers recognize the file type by extension
+            _get_content_hash(sample) + os.path.splitext(sample.cached_path)[1].lower(),
+            _get_content_hash(blank) + os.path.splitext(blank.cached_path)[1].lower()
+            if blank is not None
+            else "",
+            # the option does not matter without blank
+            f"interpolate_blank={interpolate_blank}" if blank is not None else "",
+        ]
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(PARSED_DIR, digest + ".npz")
+
+
+def _get_content_hash(file: cache.CachedFile) -> str:
+    """Returns hash of the cached file content, computes it if it is not known"""
+    if file.content_hash is not None:
+        return file.content_hash
+
+    digest = hashlib.sha256()
+    if os.path.isdir(file.cached_path):
+        # some formats are folders, e.g. Agilent `.D`
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(file.cached_path)
+            for name in names
+        )
+    else:
+        paths = [file.cached_path]
+
+    for path in paths:
+        digest.update(os.path.relpath(path, file.cached_path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,340 @@
+"""
+Browser sessions - every browser has its own campaign and other global variables.
+
+The session ID is stored in a cookie, background threads use `session_scope()`. Evicted sessions are restored
+when the request starts or the scope is entered, before the lock of the global variables is taken.
+
+When the campaigns of all sessions take more memory than `SESSION_MEMORY_BUDGET_MB`,
+the least recently used idle sessions are evicted: their campaign is saved as
+.mocca2 snapshot into the cache folder and restored when the session is used again.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import flask
+from mocca2 import MoccaDataset
+
+from app import server, CACHE_DIR, SESSION_MEMORY_BUDGET_MB, SESSION_IDLE_TIMEOUT
+import cache
+from cache.arrays import is_spilled, is_loaded, remove_released_arrays
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "mocca_session"
+"""Name of the cookie with session ID"""
+
+DEFAULT_SESSION = "default"
+"""Session used outside of requests, e.g. on startup or in scripts"""
+
+SESSIONS_DIR = os.path.join(CACHE_DIR, "sessions")
+"""Folder with snapshots of evicted sessions"""
+
+EXPORTS_DIR = os.path.join(CACHE_DIR, "exports")
+"""Folder with the last exported .mocca2 file of each session"""
+
+_sessions: OrderedDict[str, cache.SessionInfo] = OrderedDict()
+"""All known sessions, from least to most recently used"""
+
+_local = threading.local()
+"""Session of the current thread set by `session_scope()`"""
+
+_evicting = threading.Lock()
+"""Held by the thread that evicts sessions, see `_enforce_budget()`"""
+
+_recheck = threading.Event()
+"""Set when the campaigns may not fit into the budget, the evicting thread then checks it again"""
+
+_restored: threading.Condition | None = None
+"""Notified when a session is restored, shares the lock of the global variables, see `_restored_condition()`"""
+
+
+def init():
+    """Creates the folders for session snapshots and exports, removes the exports from previous runs"""
+    if not os.path.exists(SESSIONS_DIR):
+        os.makedirs(SESSIONS_DIR)
+    if os.path.exists(EXPORTS_DIR):
+        shutil.rmtree(EXPORTS_DIR)
+    os.makedirs(EXPORTS_DIR)
+
+
+@server.before_request
+def _read_session_cookie():
+    """Reads the session ID from the cookie, or creates new one"""
+    session_id = flask.request.cookies.get(COOKIE_NAME)
+    # the ID is used in file names, so accept only IDs generated here
+    if session_id is None or not re.fullmatch(r"[0-9a-f]{32}", session_id):
+        session_id = uuid.uuid4().hex
+        flask.g.new_session = True
+    flask.g.session_id = session_id
+
+    # evicted session is restored before the callback holds the lock of global variables
+    if session_id in _sessions:
+        touch(session_id)
+
+
+@server.after_request
+def _set_session_cookie(response: flask.Response) -> flask.Response:
+    """Sends the cookie with new session ID to the browser"""
+    if flask.g.get("new_session", False):
+        response.set_cookie(
+            COOKIE_NAME,
+            flask.g.session_id,
+            max_age=30 * 24 * 3600,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def get_session_id() -> str:
+    """Returns ID of the session that is used by the current callback or thread"""
+    session_id = getattr(_local, "session_id", None)
+    if session_id is not None:
+        return session_id
+    if flask.has_request_context() and "session_id" in flask.g:
+        return flask.g.session_id
+    return DEFAULT_SESSION
+
+
+def get_export_path() -> str:
+    """Returns path of the .mocca2 file exported by the current session, each export overwrites the previous one"""
+    return os.path.join(EXPORTS_DIR, f"{get_session_id()}.mocca2")
+
+
+@contextmanager
+def session_scope(session_id: str, touch: bool = True) -> Iterator[None]:
+    """
+    Global variables accessed inside this context belong to the given session.
+
+    Background threads have no request to take the session from, so they must access
+    the global variables inside this context with the session that started them.
+
+    If `touch` is False, the access does not count as session activity. Otherwise evicted session
+    is restored here, so it must be entered before the lock of the global variables is taken.
+    """
+    previous = getattr(_local, "session_id", None), getattr(_local, "touch", True)
+    _local.session_id, _local.touch = session_id, touch
+    try:
+        # `touch` is shadowed by the argument
+        cache.sessions.touch(session_id)
+        yield
+    finally:
+        _local.session_id, _local.touch = previous
+
+
+def touch(session_id: str):
+    """
+    Marks the session as recently used, initializes new sessions and restores evicted ones.
+
+    Only one thread restores the session, other threads using it wait until it is restored.
+    """
+    if not getattr(_local, "touch", True):
+        return
+
+    with cache.locked():
+        info = _sessions.get(session_id)
+        if info is None:
+            info = cache.SessionInfo(time.monotonic(), 0, None)
+            _sessions[session_id] = info
+            with session_scope(session_id):
+                cache.init_session()
+
+        info.last_access = time.monotonic()
+        _sessions.move_to_end(session_id)
+
+        if info.restoring:
+            # the lock is released while waiting, even if the caller holds it
+            _restored_condition().wait_for(lambda: not info.restoring)
+            return
+        if info.snapshot_path is None:
+            return
+        info.restoring = True
+
+    _restore(session_id, info)
+
+
+def forget_all():
+    """Forgets all sessions and their memoized results, e.g. when the storage backend is replaced"""
+    global _restored
+    with cache.locked():
+        for session_id in _sessions:
+            cache.memoize.forget_session(session_id)
+        _sessions.clear()
+        _restored = None
+
+
+def _restored_condition() -> threading.Condition:
+    """Returns the condition notified when a session is restored, must be called with the lock held"""
+    global _restored
+    if _restored is None:
+        _restored = threading.Condition(cache.locked())
+    return _restored
+
+
+def estimate_campaign_size(campaign: MoccaDataset) -> int:
+    """Estimates memory taken by the 2D data of the campaign [bytes], memory-mapped and not loaded data are not counted"""
+    arrays = {
+        id(data.data): data.data
+        for data in [*campaign._raw_2d_data.values(), *campaign.chromatograms.values()]
+        if is_loaded(data)
+    }
+    return sum(a.nbytes for a in arrays.values() if not is_spilled(a))
+
+
+def update_campaign_size(session_id: str, size: int):
+    """Updates the memory taken by the campaign of the session and evicts idle sessions if necessary"""
+    with cache.locked():
+        if session_id in _sessions:
+            _sessions[session_id].campaign_size = size
+    _enforce_budget()
+
+
+def change_campaign_size(session_id: str, delta: int):
+    """Adds `delta` to the memory taken by the campaign of the session, see `update_campaign_size()`"""
+    with cache.locked():
+        if session_id in _sessions:
+            info = _sessions[session_id]
+            info.campaign_size = max(info.campaign_size + delta, 0)
+    _enforce_budget()
+
+
+def _enforce_budget():
+    """
+    Evicts least recently used idle sessions until the campaigns fit into the memory budget.
+
+    The caller often holds the lock of the global variables (e.g. `cache.update_campaign()`
+    inside `with cache.locked():`), so the snapshots are saved by another thread,
+    which takes the lock only for a moment before and after saving each snapshot.
+    """
+    with cache.locked():
+        total = sum(info.campaign_size for info in _sessions.values())
+    if total <= SESSION_MEMORY_BUDGET_MB * 2**20:
+        return
+    # the running thread checks the budget again when it finishes
+    _recheck.set()
+    if not _evicting.locked():
+        threading.Thread(target=_evict_over_budget, daemon=True).start()
+
+
+def _evict_over_budget():
+    """Evicts the sessions in the background thread started by `_enforce_budget()`"""
+    while _recheck.is_set() and _evicting.acquire(blocking=False):
+        try:
+            _recheck.clear()
+            with cache.locked():
+                total = sum(info.campaign_size for info in _sessions.values())
+                now = time.monotonic()
+                candidates = [
+                    session_id
+                    for session_id, info in _sessions.items()
+                    if info.snapshot_path is None
+                    and info.campaign_size > 0
+                    and now - info.last_access > SESSION_IDLE_TIMEOUT
+                ]
+
+            for session_id in candidates:
+                if total <= SESSION_MEMORY_BUDGET_MB * 2**20:
+                    break
+                total -= _evict(session_id)
+        finally:
+            _evicting.release()
+
+
+def _evict(session_id: str) -> int:
+    """Saves the campaign of the session to disk and removes it from memory, returns the freed memory [bytes]"""
+    # imported here, because `campaign` depends on `cache`
+    from campaign.pickling import dump_campaign
+
+    with cache.locked():
+        info = _sessions.get(session_id)
+        if info is None:
+            return 0
+        last_access = info.last_access
+        with session_scope(session_id, touch=False):
+            if (
+                cache.get_campaign_processing_info().status == "PROCESSING"
+                or cache.get_campaign_building_info().status == "PROCESSING"
+            ):
+                return 0
+            campaign = cache.get_campaign()
+
+    # saving takes long, so other sessions are not blocked
+    path = os.path.join(SESSIONS_DIR, f"{session_id}.mocca2")
+    dump_campaign(campaign, path, lossless=True)
+
+    with cache.locked():
+        # the session was used while saving the snapshot
+        if info.last_access != last_access:
+            os.remove(path)
+            return 0
+
+        with session_scope(session_id, touch=False):
+            cache.global_vars.delete_campaign()
+        cache.memoize.forget_session(session_id)
+
+        freed = info.campaign_size
+        info.campaign_size = 0
+        info.snapshot_path = path
+
+    # the spilled arrays of the campaign are not used anymore
+    del campaign
+    remove_released_arrays()
+
+    logger.info(f"Session {session_id} was idle and has been saved to {path}")
+    return freed
+
+
+def _restore(session_id: str, info: cache.SessionInfo):
+    """
+    Loads the campaign of evicted session from the snapshot, other sessions are not blocked while loading.
+
+    If the snapshot cannot be loaded, it is kept as `<session>-<time>.failed.mocca2`
+    and the user gets an empty campaign with the error message on the Data page.
+    """
+    from campaign.pickling import load_campaign
+
+    path = info.snapshot_path
+    assert path is not None
+
+    # the variables are accessed without touch, otherwise the session would wait for itself
+    with session_scope(session_id, touch=False):
+        try:
+            campaign = load_campaign(path)
+            failed_path = None
+        except Exception as ex:
+            campaign = MoccaDataset()
+            failed_path = os.path.join(SESSIONS_DIR, f"{session_id}-{int(time.time())}.failed.mocca2")
+            os.replace(path, failed_path)
+            logger.error(f"Could not restore session {session_id} from {path}, it was kept in {failed_path}: {ex}")
+            cache.set_campaign_building_info(
+                cache.CampaignProcessingInfo(
+                    status="NEW_DATA_READY",
+                    message=f"Error! Your campaign could not be restored: {ex}. It was saved to {failed_path}.",
+                    message_class="text-danger",
+                )
+            )
+
+        published = False
+        try:
+            # the campaign is the same as before eviction, so the memoized results and queued jobs stay valid
+            cache.set_campaign(campaign, keep_version=failed_path is None)
+            published = True
+        finally:
+            with cache.locked():
+                if published:
+                    info.snapshot_path = None
+                info.restoring = False
+                _restored_condition().notify_all()
+
+    if failed_path is None:
+        os.remove(path)
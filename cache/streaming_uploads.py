@@ -0,0 +1,182 @@
+"""
+Uploading files in chunks directly into the cache folder.
+
+`dcc.Upload` sends the whole file base64-encoded in the callback request, which needs
+several times the file size of memory. Instead, the browser (`assets/chunked_upload.js`)
+sends the files in chunks to these routes, the chunks are written to disk as they arrive,
+and only the cached file IDs are passed to the Dash callbacks.
+
+1. `POST /upload/start` with JSON `{"name": ..., "size": ...}` returns `{"upload_id": ...}`
+2. `PUT /upload/<upload_id>?offset=<bytes received so far>` with the chunk as body, returns progress
+3. `POST /upload/<upload_id>/finish` returns `{"file_id": ..., "name": ...}`
+
+`GET /upload/<upload_id>` returns the progress of the upload.
+
+The total size of unfinished uploads is limited by `UPLOAD_MAX_MB`, uploads that received
+no chunk for `UPLOAD_TIMEOUT` seconds are removed when a new upload starts.
+"""
+
+from typing import Dict
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import flask
+
+from app import server, CACHE_DIR, UPLOAD_MAX_MB, UPLOAD_TIMEOUT
+import cache
+from cache.uploading_files import store_uploaded_file
+
+UPLOADS_DIR = os.path.join(CACHE_DIR, "uploads")
+"""Folder with partially uploaded files"""
+
+READ_SIZE = 2**20
+"""Size of the pieces in which the chunks are read from the request [bytes]"""
+
+_uploads: Dict[str, cache.StreamingUpload] = dict()
+"""Unfinished uploads [upload ID -> upload]"""
+
+_lock = threading.Lock()
+"""Guards `_uploads`, the content of each upload is guarded by its own lock"""
+
+
+def init():
+    """Creates the folder for uploads, removes unfinished uploads from previous runs"""
+    if os.path.exists(UPLOADS_DIR):
+        shutil.rmtree(UPLOADS_DIR)
+    os.makedirs(UPLOADS_DIR)
+
+
+def _progress(upload_id: str, upload: cache.StreamingUpload) -> Dict:
+    """Returns the progress of the upload as JSON-serializable dict"""
+    return dict(upload_id=upload_id, name=upload.name, size=upload.size, received=upload.received)
+
+
+def _get_upload(upload_id: str) -> cache.StreamingUpload:
+    """Returns the unfinished upload, responds with 404 if there is no such upload"""
+    with _lock:
+        upload = _uploads.get(upload_id)
+    if upload is None:
+        flask.abort(404, "Unknown upload")
+    return upload
+
+
+@server.route("/upload/start", methods=["POST"])
+def start_upload():
+    """Starts new upload, returns its ID"""
+    request = flask.request.get_json(silent=True) or dict()
+    name = request.get("name")
+    size = request.get("size")
+    if not isinstance(name, str) or name == "" or not isinstance(size, int) or size < 0:
+        flask.abort(400, "Name and size of the file must be specified")
+
+    _remove_stale_uploads()
+
+    upload_id = uuid.uuid4().hex
+    upload = cache.StreamingUpload(
+        name=os.path.basename(name),
+        size=size,
+        received=0,
+        path=os.path.join(UPLOADS_DIR, upload_id + ".part"),
+        digest=hashlib.sha256(),
+        last_activity=time.monotonic(),
+        lock=threading.Lock(),
+    )
+
+    with _lock:
+        # the announced sizes are reserved, so that the limit cannot be exceeded by uploads running in parallel
+        reserved = sum(u.size for u in _uploads.values())
+        if reserved + size > UPLOAD_MAX_MB * 2**20:
+            flask.abort(413, f"The files being uploaded must not be larger than {UPLOAD_MAX_MB} MB in total")
+        _uploads[upload_id] = upload
+    open(upload.path, "wb").close()
+
+    return flask.jsonify(_progress(upload_id, upload))
+
+
+@server.route("/upload/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id: str):
+    """Appends the chunk in the request body to the uploaded file"""
+    upload = _get_upload(upload_id)
+
+    # the offset is checked and the chunk written under the lock of the upload,
+    # so a chunk resent by the browser while the first one is written is not appended twice
+    with upload.lock:
+        # removed as stale while waiting for the lock
+        with _lock:
+            if _uploads.get(upload_id) is not upload:
+                flask.abort(404, "Unknown upload")
+
+        # the browser may resend a chunk if the response got lost, accept only the next one
+        offset = flask.request.args.get("offset", type=int)
+        if offset != upload.received:
+            return flask.jsonify(_progress(upload_id, upload)), 409
+
+        with open(upload.path, "ab") as f:
+            while True:
+                piece = flask.request.stream.read(READ_SIZE)
+                if not piece:
+                    break
+                if upload.received + len(piece) > upload.size:
+                    flask.abort(400, "The file is larger than announced")
+                f.write(piece)
+                upload.digest.update(piece)
+                upload.received += len(piece)
+                upload.last_activity = time.monotonic()
+
+        return flask.jsonify(_progress(upload_id, upload))
+
+
+@server.route("/upload/<upload_id>", methods=["GET"])
+def get_upload_progress(upload_id: str):
+    """Returns the progress of the upload"""
+    return flask.jsonify(_progress(upload_id, _get_upload(upload_id)))
+
+
+@server.route("/upload/<upload_id>/finish", methods=["POST"])
+def finish_upload(upload_id: str):
+    """Moves the uploaded file into the cache folder, returns cached file ID"""
+    upload = _get_upload(upload_id)
+
+    with upload.lock:
+        if upload.received != upload.size:
+            flask.abort(400, "The file was not uploaded completely")
+
+        with _lock:
+            # finished by another request in the meantime
+            if _uploads.pop(upload_id, None) is None:
+                flask.abort(404, "Unknown upload")
+
+    try:
+        file_id = store_uploaded_file(upload.name, upload.path, upload.digest.hexdigest())
+    except BaseException:
+        # the upload is not known anymore, so the stale uploads would never remove the file
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+        raise
+
+    return flask.jsonify(dict(file_id=file_id, name=upload.name))
+
+
+def _remove_stale_uploads():
+    """Removes the uploads that received no chunk for `UPLOAD_TIMEOUT` seconds, e.g. when the browser was closed"""
+    now = time.monotonic()
+    with _lock:
+        stale = {
+            upload_id: upload
+            for upload_id, upload in _uploads.items()
+            if now - upload.last_activity > UPLOAD_TIMEOUT
+            # chunk is being written right now
+            and upload.lock.acquire(blocking=False)
+        }
+        for upload_id in stale:
+            del _uploads[upload_id]
+
+    for upload in stale.values():
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+        upload.lock.release()
@@ -1,36 +1,39 @@
-import base64
+import os
+import threading
 
-from cache.files import add_cached_file
+from cache.files import add_cached_file, get_content_path
 
-def save_uploaded_file(name: str, content: str) -> int:
+_lock = threading.Lock()
+"""Guards moving the uploaded files into the cache folder, the other global variables are not blocked meanwhile"""
+
+def store_uploaded_file(name: str, path: str, content_hash: str) -> int:
     """
-    Decode and store a file uploaded with Plotly Dash. The file will be saved in the cache folder.
+    Moves a completely uploaded file into the cache folder, returns cached file ID.
 
-    The file name is automatically generated, the information is saved in `file_handling.cached_files`
-    
-    The cache folder is defined in `file_handling.CACHE_DIR`.
+    The files are stored by content: if a file with the same content and extension
+    was uploaded before, it is not stored again. The new ID still keeps the new name.
 
     Parameters
     ----------
     name : string
-        The name of the new file
-    content: string
-        base64-encoded content as received from Dash upload function
-    automatic_name: bool
-        if True, the file name will be generated automatically (this is done to prevent filename collisions)
+        The original name of the file
+    path: string
+        Path to the uploaded file, the file is moved or deleted
+    content_hash: string
+        SHA-256 of the file content
 
     Returns
     -------
     Returns cached file ID
     """
 
-    id, path = add_cached_file(name)
-    
-    # remove the header added by Dash
-    data = content.encode("utf8").split(b";base64,")[1]
-    
-    # decode and save the content
-    with open(path, "wb") as fp:
-        fp.write(base64.decodebytes(data))
+    with _lock:
+        # the file is moved before it is added to the index, so the index never points to a missing file
+        cached_path = get_content_path(name, content_hash)
+        if os.path.exists(cached_path):
+            os.remove(path)
+        else:
+            os.replace(path, cached_path)
+        id, _ = add_cached_file(name, content_hash)
 
-    return id
\ No newline at end of file
+    return id
@@ -1,5 +1,8 @@
 """This module handles everything related to MOCCA dataset"""
 
-from campaign.builder import campaign_from_table
+from campaign.builder import campaign_from_table, append_chromatograms
 from campaign.loader import gen_upload_table_from_campaign
-from campaign.pickling import pickle_all, unpickle_all
\ No newline at end of file
+from campaign.pickling import pickle_all, unpickle_all
+from campaign.processing import process_campaign
+from campaign.jobs import submit_processing, cancel_job, get_jobs
+from campaign.watching import start_watching, stop_watching, get_watcher
@@ -0,0 +1,81 @@
+"""
+Aligning the time axes of parsed chromatograms before they are added to the campaign.
+
+All chromatograms in the campaign must have the same time points. The samples are grouped
+by their time grid, identical grids are recognized by a hash, and every group with a different
+sampling is interpolated onto the reference grid at once - same as `Data2D.interpolate_time`
+with linear interpolation, but without the loop over samples and wavelengths.
+"""
+
+from typing import Dict, List, Tuple
+from numpy.typing import NDArray
+
+import hashlib
+import warnings
+
+import numpy as np
+
+from mocca2.classes import Data2D
+
+
+def align_time(parsed: List[Data2D], reference: NDArray | None = None) -> List[Data2D]:
+    """
+    Returns the data interpolated to the `reference` time points, in the same order.
+
+    If `reference` is None, the time of the first chromatogram is used. Data that already
+    have the reference sampling are returned as they are, the other ones are new `Data2D`.
+    """
+    if len(parsed) == 0:
+        return []
+    if reference is None:
+        reference = parsed[0].time
+
+    # group the samples by time grid, stacking requires same number of wavelengths too
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    for i, data in enumerate(parsed):
+        key = (_grid_hash(data.time), data.data.shape[0])
+        groups.setdefault(key, []).append(i)
+
+    reference_hash = _grid_hash(reference)
+    aligned = list(parsed)
+
+    for (grid_hash, _), indices in groups.items():
+        time = parsed[indices[0]].time
+        if grid_hash == reference_hash or (
+            time.shape == reference.shape and np.allclose(time, reference)
+        ):
+            continue
+
+        warnings.warn("Chromatograms have different sampling rates!")
+
+        stack = np.stack([parsed[i].data for i in indices])
+        interpolated = _interpolate_stack(time, stack, reference)
+        for i, data in zip(indices, interpolated):
+            aligned[i] = Data2D(reference, parsed[i].wavelength, data)
+
+    return aligned
+
+
+def _grid_hash(time: NDArray) -> str:
+    """Hash of the time points, equal grids have equal hashes"""
+    time = np.ascontiguousarray(time, dtype=np.float64)
+    return hashlib.sha1(time.tobytes()).hexdigest()
+
+
+def _interpolate_stack(time: NDArray, stack: NDArray, new_time: NDArray) -> NDArray:
+    """
+    Linear interpolation of 3D array [sample, wavelength, time] to `new_time`.
+
+    Outside of `time`, the first or last values are used, same as in `Data2D.interpolate_time`.
+    """
+    if time.shape[0] == 1:
+        return np.repeat(stack.astype(np.float64), new_time.shape[0], axis=2)
+
+    order = np.argsort(time, kind="stable")
+    time, stack = time[order], stack[:, :, order]
+
+    # the indices and weights are same for all samples and wavelengths
+    left = np.clip(np.searchsorted(time, new_time, side="right") - 1, 0, time.shape[0] - 2)
+    weight = np.clip((new_time - time[left]) / (time[left + 1] - time[left]), 0.0, 1.0)
+
+    return stack[:, :, left] * (1.0 - weight) + stack[:, :, left + 1] * weight
@@ -1,24 +1,41 @@
-from typing import List, Dict, Tuple, Any
+from typing import Any, Callable, Dict, List, Tuple
 
-import warnings
+import copy
 from mocca2 import MoccaDataset, Chromatogram
+from mocca2.classes import Data2D
 import numpy as np
 
 import cache
+from campaign.alignment import align_time
+from campaign.processing import get_data_hash, get_fingerprint, is_processed, process_campaign
 
 
-def campaign_from_table(data: List[Dict], istd: str | None = None) -> None:
+def campaign_from_table(
+    data: List[Dict],
+    istd: str | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
     """
-    Tries to create MOCCA campaign from the upload table (on `data` page).
+    Tries to update MOCCA campaign from the upload table (on `data` page).
+
+    Only the differences between the table and the current campaign are applied - the new rows
+    are parsed and added, the removed rows are deleted and the names, concentrations and references
+    of the other chromatograms are updated, their data are not loaded or stored again.
+    New samples are parsed in parallel, `progress(parsed, total)` is called after each one.
+    Returns the number of blank parses that were saved by parsing every blank only once.
     """
 
-    old_campaign = cache.get_campaign()
+    with cache.locked():
+        version = cache.get_campaign_version()
+        camp = cache.get_campaign_metadata()
+        names = cache.get_chromatogram_names()
 
-    # Create campaign
-    camp = MoccaDataset()
+    old_references = (camp.compound_references, camp.istd_concentrations, camp._istd_chromatogram)
 
-    # Copy settings from current campaign
-    camp.settings = old_campaign.settings
+    # the metadata are filled from the table again
+    camp.compound_references = {}
+    camp.istd_concentrations = {}
+    camp._istd_chromatogram = None
 
     # get name of ISTD and check that it is in data
     if istd == "":
@@ -58,28 +75,34 @@ def campaign_from_table(data: List[Dict], istd: str | None = None) -> None:
 
         return compound_name, compound_conc, istd_conc
 
-    # Copy chromatograms that are already loaded
+    # Update metadata of chromatograms that are already loaded
+    renamed: Dict[int, str] = {}
     for row in data:
         idx = row["chromatogram_id"]
         if idx is not None:
-            camp.chromatograms[idx] = old_campaign.chromatograms[idx]
-            camp._raw_2d_data[idx] = old_campaign._raw_2d_data[idx]
+            if idx not in names:
+                raise Exception("The campaign was changed, please reload the page")
             # update data from the table
             compound_name, compound_conc, istd_conc = parse_data(row)
             if compound_name is not None:
                 camp.compound_references[idx] = (compound_name, compound_conc)
             if istd_conc is not None:
                 camp.istd_concentrations[idx] = istd_conc
-            camp.chromatograms[idx].name = row["name"]
+            if names[idx] != row["name"]:
+                renamed[idx] = row["name"]
             if istd is not None and row["compound_name"] == istd:
                 camp._istd_chromatogram = row["chromatogram_id"]
 
-    # Add the samples to the campaign
-    for row in data:
-        if row["chromatogram_id"] is not None:
-            continue
+    # Chromatograms that are not in the table anymore are removed
+    kept = {row["chromatogram_id"] for row in data if row["chromatogram_id"] is not None}
+    removed = [idx for idx in names if idx not in kept]
 
-        # Get the paths to the cached files
+    # Get the paths to the cached files of the new samples
+    new_rows = [row for row in data if row["chromatogram_id"] is None]
+    # Get compound names and concentrations, so that errors in table are found before parsing
+    new_rows_data = [parse_data(row) for row in new_rows]
+    cached_files = []
+    for row in new_rows:
         cached_sample = cache.get_cached_file(int(row["sample_id"]))
 
         if row["blank_id"] == "" or row["blank_id"] is None:
@@ -87,44 +110,185 @@ def campaign_from_table(data: List[Dict], istd: str | None = None) -> None:
         else:
             cached_blank = cache.get_cached_file(int(row["blank_id"]))
 
-        # Get compound names and concentrations
-        compound_name, compound_conc, istd_conc = parse_data(row)
+        cached_files.append((cached_sample, cached_blank))
+
+    # Parse the new samples in parallel, the results are in table order
+    # every blank is parsed only once and reused for all samples
+    blanks = cache.BlankRegistry()
+    parsed_data = cache.load_parsed_data_batch(
+        cached_files, interpolate_blank=True, progress=progress, blanks=blanks
+    )
+
+    changed: Dict[int, Tuple[Chromatogram, Data2D]] = {}
+
+    # The new samples get the first free IDs and are checked against the kept chromatograms
+    if len(new_rows) > 0:
+        for idx in names:
+            if idx in kept:
+                camp.chromatograms[idx] = cache.get_chromatogram(idx)
+                camp._raw_2d_data[idx] = cache.get_raw_2d_data(idx)
+
+        parsed_data = align_time(parsed_data, _get_reference_time(camp))
+
+        for row, row_data, (cached_sample, cached_blank), parsed in zip(
+            new_rows, new_rows_data, cached_files, parsed_data
+        ):
+            compound_name, compound_conc, istd_conc = row_data
+
+            idx = add_parsed_chromatogram(
+                camp,
+                parsed,
+                row["name"],
+                cached_sample,
+                cached_blank,
+                istd_conc=istd_conc,
+                compound_name=compound_name,
+                compound_conc=compound_conc,
+                istd_reference=istd is not None and istd == compound_name,
+            )
+            changed[idx] = (camp.chromatograms[idx], camp._raw_2d_data[idx])
+
+    # The stored chromatograms must not be modified, but their data need not be copied
+    for idx, name in renamed.items():
+        chromatogram = copy.copy(cache.get_chromatogram(idx))
+        chromatogram.name = name
+        changed[idx] = (chromatogram, cache.get_raw_2d_data(idx))
+
+    # The compounds are kept only if the chromatograms were just renamed
+    references_changed = old_references != (
+        camp.compound_references, camp.istd_concentrations, camp._istd_chromatogram
+    )
+    keep_compounds = len(new_rows) == 0 and len(removed) == 0 and not references_changed
+    if not keep_compounds:
+        camp.istd_compound = None
+
+    # Store the changes in the global variables, unless the campaign was changed in the meantime
+    with cache.locked():
+        if cache.get_campaign_version() != version:
+            raise Exception(
+                "The campaign was changed while loading the chromatograms, please confirm the changes again"
+            )
+        if len(changed) > 0 or not keep_compounds:
+            cache.update_campaign(camp, changed, removed, keep_compounds=keep_compounds)
+
+    return blanks.saved
+
+
+def add_parsed_chromatogram(
+    camp: MoccaDataset,
+    parsed: Data2D,
+    name: str,
+    cached_sample: cache.CachedFile,
+    cached_blank: cache.CachedFile | None,
+    istd_conc: float | None = None,
+    compound_name: str | None = None,
+    compound_conc: float | None = None,
+    istd_reference: bool = False,
+) -> int:
+    """
+    Adds the parsed data of a sample to the campaign, returns ID of the new chromatogram.
+
+    The data must have the same time points as the other chromatograms, see `align_time`.
+    """
+
+    chromatogram = Chromatogram(sample=parsed, name=name)
+
+    # add chromatogram to campaign
+    idx = camp.add_chromatogram(
+        chromatogram=chromatogram,
+        istd_concentration=istd_conc,
+        reference_for_compound=compound_name,
+        compound_concentration=compound_conc,
+        istd_reference=istd_reference,
+    )
+
+    # Change chromatogram paths to the original paths
+    # Once the chromatogram data is loaded, the paths are there only for info
+    camp.chromatograms[idx].sample_path = cached_sample.original_name
+    if cached_blank is not None:
+        camp.chromatograms[idx].blank_path = cached_blank.original_name
+    camp.chromatograms[idx].name = name
+
+    # the data are in memory now, later they may be memory-mapped or not loaded at all
+    get_data_hash(camp._raw_2d_data[idx])
+
+    return idx
+
+
+def _get_reference_time(camp: MoccaDataset) -> np.ndarray | None:
+    """Returns time of the first chromatogram in the campaign, the new ones are aligned to it"""
+    if len(camp.chromatograms) == 0:
+        return None
+    return next(iter(camp.chromatograms.values())).time
+
+
+def copy_campaign_shell(campaign: MoccaDataset) -> MoccaDataset:
+    """
+    Returns copy of the campaign whose chromatograms and dicts can be replaced or modified.
+
+    The stored chromatograms must not be modified, but their data need not be copied,
+    the arrays are only replaced by new ones (e.g. by processing).
+    """
+    camp = copy.copy(campaign)
+    camp.chromatograms = {
+        idx: copy.copy(chromatogram) for idx, chromatogram in campaign.chromatograms.items()
+    }
+    camp._raw_2d_data = dict(campaign._raw_2d_data)
+    camp.compound_references = dict(campaign.compound_references)
+    camp.istd_concentrations = dict(campaign.istd_concentrations)
+    return camp
+
+
+def append_chromatograms(
+    files: List[Tuple[int, int | None]], names: List[str], process: bool = False
+) -> Tuple[List[int], bool]:
+    """
+    Adds new samples to the current campaign, the existing chromatograms are kept as they are.
+
+    `files` are the cached file IDs of (sample, blank). If `process` is True and the campaign
+    was processed before, only the new chromatograms are processed and the compounds are matched again.
+    Returns IDs of the new chromatograms and whether they were processed.
+    """
+
+    with cache.locked():
+        version = cache.get_campaign_version()
+        old_campaign = cache.get_campaign()
 
-        # Add all the data to to campaign
-        chromatogram = Chromatogram(
-            sample=cached_sample.cached_path,
-            blank=cached_blank.cached_path if cached_blank is not None else None,
-            name=row["name"],
-            interpolate_blank=True,
+    cached_files = [
+        (
+            cache.get_cached_file(sample_id),
+            cache.get_cached_file(blank_id) if blank_id is not None else None,
         )
+        for sample_id, blank_id in files
+    ]
+    parsed_data = cache.load_parsed_data_batch(cached_files, interpolate_blank=True)
+    parsed_data = align_time(parsed_data, _get_reference_time(old_campaign))
+
+    camp = copy_campaign_shell(old_campaign)
+
+    new_ids = [
+        add_parsed_chromatogram(camp, parsed, name, cached_sample, cached_blank)
+        for name, (cached_sample, cached_blank), parsed in zip(names, cached_files, parsed_data)
+    ]
 
-        istd_reference = istd is not None and istd == compound_name
-
-        # check that the chromatogram has the same sampling as the other ones
-        if len(camp.chromatograms) > 0:
-            if chromatogram.time.shape != camp.chromatograms[
-                0
-            ].time.shape or not np.allclose(
-                chromatogram.time, camp.chromatograms[0].time
-            ):
-                warnings.warn("Chromatograms have different sampling rates!")
-                chromatogram.interpolate_time(camp.chromatograms[0].time, inplace=True)
-
-        # add chromatogram to campaign
-        idx = camp.add_chromatogram(
-            chromatogram=chromatogram,
-            istd_concentration=istd_conc,
-            reference_for_compound=compound_name,
-            compound_concentration=compound_conc,
-            istd_reference=istd_reference,
+    # the new chromatograms can be processed alone only if the other ones are processed
+    settings = camp.settings
+    processed = (
+        process
+        and settings is not None
+        and len(old_campaign.compounds) > 0
+        and all(
+            is_processed(chromatogram, get_fingerprint(old_campaign._raw_2d_data[idx], settings))
+            for idx, chromatogram in old_campaign.chromatograms.items()
         )
+    )
+    if processed:
+        # only the new chromatograms are not processed yet
+        process_campaign(camp, settings)
 
-        # Change chromatogram paths to the original paths
-        # Once the chromatogram data is loaded, the paths are there only for info
-        camp.chromatograms[idx].sample_path = cached_sample.original_name
-        if cached_blank is not None:
-            camp.chromatograms[idx].blank_path = cached_blank.original_name
-        camp.chromatograms[idx].name = row["name"]
+    with cache.locked():
+        if cache.get_campaign_version() != version:
+            raise Exception("The campaign was changed while adding the chromatograms")
+        cache.set_campaign(camp)
 
-    # Store the new campaign in the global variable
-    cache.set_campaign(camp)
+    return new_ids, processed
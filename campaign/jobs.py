@@ -0,0 +1,229 @@
+"""
+Queue of processing jobs (Process all) running in background.
+
+Every click on `Process All` submits a new job with its own ID. The jobs of one session are
+processed one by one by a background thread, in the order in which they were submitted.
+Queued jobs can be cancelled immediately, the running job is cancelled cooperatively -
+`campaign.processing.process_campaign` stops after the chromatogram that is being processed.
+
+The jobs store the progress (number of processed chromatograms), so that the Process page
+can show the elapsed time and estimate the remaining time.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal
+
+import copy
+import itertools
+import threading
+import time
+
+from mocca2.dataset.settings import ProcessingSettings
+
+import cache
+from campaign.builder import copy_campaign_shell
+from campaign.processing import ProcessingCancelled, process_campaign
+
+JOB_HISTORY = 5
+"""Number of finished jobs kept for every session"""
+
+
+@dataclass
+class ProcessingJob:
+    """Processing of the campaign of one session with given settings"""
+
+    job_id: int
+    """Unique ID of the job"""
+
+    session_id: str
+    """Session whose campaign is processed"""
+
+    settings: ProcessingSettings
+    """Settings used for processing"""
+
+    status: Literal["QUEUED", "RUNNING", "FINISHED", "FAILED", "CANCELLED"] = "QUEUED"
+
+    done: int = 0
+    """Number of processed chromatograms"""
+
+    total: int | None = None
+    """Number of chromatograms that must be processed (the other ones are up to date), known when the processing starts"""
+
+    started: float | None = None
+    """Time when the job was started (`time.monotonic()`)"""
+
+    finished: float | None = None
+    """Time when the job was finished, failed or cancelled"""
+
+    message: str = ""
+    """Result of the job, shown on the Process page"""
+
+    message_class: str = "text-info"
+    """CSS class of the message"""
+
+    reported: bool = False
+    """The result was already shown on the Process page"""
+
+    cancel: threading.Event = field(default_factory=threading.Event)
+    """Set to cancel the job"""
+
+    def elapsed(self) -> float:
+        """Returns time since the job was started [s]"""
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    def eta(self) -> float | None:
+        """Returns estimated time until all chromatograms are processed [s], None if it is not known yet"""
+        if self.status != "RUNNING" or self.total is None or self.done == 0:
+            return None
+        return self.elapsed() / self.done * (self.total - self.done)
+
+
+_jobs: Dict[str, List[ProcessingJob]] = dict()
+"""Queued, running and recently finished jobs [session ID -> jobs in order of submission]"""
+
+_runners: Dict[str, threading.Thread] = dict()
+"""Threads that process the queued jobs [session ID -> thread]"""
+
+_job_ids = itertools.count(1)
+
+_lock = threading.Lock()
+"""Guards `_jobs`, `_runners` and the status of the jobs"""
+
+
+def submit_processing(settings: ProcessingSettings) -> ProcessingJob:
+    """Adds new processing job to the queue of the current session, returns the job"""
+    session_id = cache.get_session_id()
+
+    with _lock:
+        job = ProcessingJob(next(_job_ids), session_id, copy.deepcopy(settings))
+        _jobs.setdefault(session_id, []).append(job)
+
+        runner = _runners.get(session_id)
+        if runner is None or not runner.is_alive():
+            runner = threading.Thread(target=_run_jobs, args=[session_id], daemon=True)
+            _runners[session_id] = runner
+            runner.start()
+
+    return job
+
+
+def cancel_job(job_id: int) -> bool:
+    """Cancels the job of the current session, returns False if it is already finished"""
+    with _lock:
+        for job in _jobs.get(cache.get_session_id(), []):
+            if job.job_id != job_id or job.status not in ["QUEUED", "RUNNING"]:
+                continue
+            job.cancel.set()
+            if job.status == "QUEUED":
+                _finish(job, "CANCELLED", f"Job #{job.job_id} was cancelled", "text-warning")
+            return True
+    return False
+
+
+def get_jobs() -> List[ProcessingJob]:
+    """Returns the queued, running and recently finished jobs of the current session"""
+    with _lock:
+        return list(_jobs.get(cache.get_session_id(), []))
+
+
+def take_finished_jobs() -> List[ProcessingJob]:
+    """Returns the jobs of the current session that finished since the last call"""
+    with _lock:
+        finished = [
+            job
+            for job in _jobs.get(cache.get_session_id(), [])
+            if job.finished is not None and not job.reported
+        ]
+        for job in finished:
+            job.reported = True
+    return finished
+
+
+def _run_jobs(session_id: str):
+    """Processes the queued jobs of the session one by one, until the queue is empty"""
+    while True:
+        with _lock:
+            job = next((j for j in _jobs.get(session_id, []) if j.status == "QUEUED"), None)
+            if job is None:
+                _runners.pop(session_id, None)
+                return
+
+        with cache.session_scope(session_id):
+            # wait until the campaign is not loaded or processed by the folder watcher,
+            # the loaded campaign waiting to be reported on the Data page (NEW_DATA_READY) can be processed
+            with cache.locked():
+                busy = (
+                    cache.get_campaign_processing_info().status != "IDLE"
+                    or cache.get_campaign_building_info().status == "PROCESSING"
+                )
+                if not busy:
+                    cache.set_campaign_processing_info(
+                        cache.CampaignProcessingInfo(status="PROCESSING", message="", message_class="")
+                    )
+            if busy:
+                time.sleep(1)
+                continue
+
+            try:
+                _run_job(job)
+            finally:
+                cache.set_campaign_processing_info(
+                    cache.CampaignProcessingInfo(status="IDLE", message="", message_class="")
+                )
+
+
+def _run_job(job: ProcessingJob):
+    """Processes the campaign of the current session, the campaign is replaced when processing finishes"""
+    with _lock:
+        # cancelled while waiting
+        if job.status != "QUEUED":
+            return
+        job.status, job.started = "RUNNING", time.monotonic()
+
+    def progress(done: int, total: int):
+        job.done, job.total = done, total
+
+    try:
+        # the campaign is processed on a copy, other pages keep showing the old results until it is finished,
+        # the raw data are never modified, so only the chromatograms are copied and outside of the lock
+        with cache.locked():
+            version = cache.get_campaign_version()
+            stored_campaign = cache.get_campaign()
+        current_campaign = copy_campaign_shell(stored_campaign)
+        processed = process_campaign(
+            current_campaign, job.settings, progress=progress, cancel=job.cancel
+        )
+        # do not overwrite data that were confirmed while processing
+        with cache.locked():
+            if cache.get_campaign_version() != version:
+                raise Exception(
+                    "The campaign was changed during processing, please process the data again"
+                )
+            cache.set_campaign(current_campaign)
+        result = (
+            "FINISHED",
+            "Data has been processed successfuly! You can now go to results "
+            f"({len(processed)} of {len(current_campaign.chromatograms)} chromatograms had to be processed)",
+            "text-success",
+        )
+    except ProcessingCancelled:
+        result = "CANCELLED", f"Job #{job.job_id} was cancelled", "text-warning"
+    except Exception as ex:
+        result = "FAILED", str(ex), "text-danger"
+
+    with _lock:
+        _finish(job, *result)
+
+
+def _finish(job: ProcessingJob, status: str, message: str, message_class: str):
+    """Marks the job as finished and forgets the oldest finished jobs, `_lock` must be held"""
+    job.status, job.message, job.message_class = status, message, message_class  # type: ignore
+    job.finished = time.monotonic()
+
+    jobs = _jobs[job.session_id]
+    finished = [j for j in jobs if j.finished is not None]
+    for old in finished[:-JOB_HISTORY]:
+        jobs.remove(old)
@@ -1,27 +1,223 @@
 """
 Functions for dumping and loading the campaign object into .mocca2 file.
 
-The mocca2 file is compressed JSON file - this prevents injection attacks while minimizing the file size.
+There are two versions of the .mocca2 file, both can be loaded safely without pickle:
+
+1. compressed JSON file (zlib) with all data, the floats are rounded to 7 decimal places
+2. zip file with the 2D data as `.npy` files (float32) and a JSON manifest with everything else
+
+The second version is written by default, it is much faster to save and load and smaller.
+The arrays are converted, compressed and written (or read) in chunks, so saving and loading
+never needs more memory than the campaign itself plus a few chunks.
+
+With `lazy=True`, only the metadata, peaks, compounds and axes are loaded from the version 2 file,
+the absorbances of each chromatogram are read from the file when they are accessed for the first
+time (e.g. when the chromatogram is displayed or processed), see `LazyData2D`.
 """
 
-import zlib, json, re
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, List, Tuple
+from numpy.typing import NDArray
 
-from mocca2 import MoccaDataset
+import copy
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import weakref
+import zipfile
+import zlib
 
+import numpy as np
+
+from mocca2 import MoccaDataset, Chromatogram
+from mocca2.classes import Data2D, DeconvolvedPeak, Peak
+
+from app import CAMPAIGN_COMPRESSION_LEVEL, STORAGE_PRECISION
 import cache
+from campaign.processing import Deconvolution
+
+FORMAT_VERSION = 2
+"""Version of the .mocca2 files written by `dump_campaign`"""
+
+MANIFEST_NAME = "manifest.json"
+"""Name of the JSON manifest in the version 2 .mocca2 file"""
+
+DATA_DTYPE = np.float32
+"""Data type of the absorbances in the version 2 .mocca2 file, time and wavelength are kept as they are"""
+
+CHUNK_SIZE = 4 * 2**20
+"""Size of the chunks in which the arrays are written and read [bytes]"""
+
+
+def dump_campaign(
+    campaign: MoccaDataset,
+    path: str,
+    level: int = CAMPAIGN_COMPRESSION_LEVEL,
+    progress: Callable[[int, int], None] | None = None,
+    lossless: bool = False,
+):
+    """
+    Dumps the campaign into a .mocca2 file at given path.
+
+    The .mocca2 file is a zip file with a JSON manifest and the time, wavelength and absorbances
+    of all chromatograms as `.npy` files. Arrays shared by several chromatograms are stored once.
+    The files are compressed with zlib `level` (0-9), 0 means that they are stored uncompressed.
+    After the data of each chromatogram (or raw data) are written, `progress(written, total)` is called.
+
+    If `lossless` is True (snapshots of evicted sessions), the absorbances keep their dtype and
+    the deconvolved peaks with their fingerprints (`Deconvolution`) and the hashes of the raw data
+    are stored too, so the loaded campaign does not have to be processed again.
+    """
+    if level == 0:
+        options = dict(compression=zipfile.ZIP_STORED)
+    else:
+        options = dict(compression=zipfile.ZIP_DEFLATED, compresslevel=level)
+
+    with zipfile.ZipFile(path, "w", **options) as archive:
+        writer = _ArrayWriter(archive, None if lossless else DATA_DTYPE)
+
+        # the metadata, peaks and compounds are serialized by mocca2, only the 2D data are replaced
+        skeleton = copy.copy(campaign)
+        skeleton.chromatograms = {
+            idx: _without_arrays(chromatogram) for idx, chromatogram in campaign.chromatograms.items()
+        }
+        skeleton._raw_2d_data = {
+            idx: _without_arrays(data) for idx, data in campaign._raw_2d_data.items()
+        }
+        campaign_dict = skeleton.to_dict()
+
+        total = len(campaign.chromatograms) + len(campaign._raw_2d_data)
+        written = 0
+        for key, items in [
+            ("chromatograms", campaign.chromatograms),
+            ("_raw_2d_data", campaign._raw_2d_data),
+        ]:
+            for idx, data in items.items():
+                campaign_dict[key][idx].update(writer.write_data2d(data))
+                written += 1
+                if progress is not None:
+                    progress(written, total)
+
+        manifest = {"format": "mocca2", "version": FORMAT_VERSION, "campaign": campaign_dict}
+        if lossless:
+            manifest["processing"] = _dump_processing(campaign)
+        with io.TextIOWrapper(archive.open(MANIFEST_NAME, "w"), encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+
+
+def load_campaign(path: str, lazy: bool = False) -> MoccaDataset:
+    """
+    Loads the campaign from a .mocca2 file at given path, both versions of the file are supported.
+
+    The absorbances are converted to `STORAGE_PRECISION`. If `lazy` is True, the absorbances are loaded
+    when they are accessed for the first time, the file must not be removed until then.
+    Version 1 files are always loaded completely.
+    """
+    if not zipfile.is_zipfile(path):
+        return load_campaign_v1(path)
+
+    with zipfile.ZipFile(path, "r") as archive:
+        with io.TextIOWrapper(archive.open(MANIFEST_NAME, "r"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != "mocca2" or manifest.get("version") != FORMAT_VERSION:
+            raise Exception(
+                f"Unsupported .mocca2 file version {manifest.get('version')}, please update MOCCA"
+            )
+
+        reader = _ArrayReader(archive, path)
+        campaign_dict = manifest["campaign"]
+
+        # mocca2 creates the objects without the 2D data, the arrays are assigned afterwards
+        arrays = {}
+        for key in ["chromatograms", "_raw_2d_data"]:
+            for idx, data in campaign_dict[key].items():
+                arrays[key, int(idx)] = reader.read_data2d(data, lazy)
+                data.update(time=[], wavelength=[], data=[])
+
+        campaign = MoccaDataset.from_dict(campaign_dict)
+        if "processing" in manifest:
+            _load_processing(campaign, manifest["processing"])
+
+    for key, items, lazy_class in [
+        ("chromatograms", campaign.chromatograms, LazyChromatogram),
+        ("_raw_2d_data", campaign._raw_2d_data, LazyData2D),
+    ]:
+        for idx, data in items.items():
+            if lazy:
+                data.__class__ = lazy_class
+            data.time, data.wavelength, data.data = arrays[key, idx]
+
+    return campaign
+
+
+@dataclass(frozen=True)
+class ArchivedArray:
+    """Absorbances stored in a version 2 .mocca2 file, which were not loaded yet"""
+
+    path: str
+    """Absolute path to the .mocca2 file"""
+
+    name: str
+    """Name of the `.npy` file in the .mocca2 file"""
+
+    def load(self) -> NDArray:
+        """Reads the absorbances in `STORAGE_PRECISION`, arrays shared by several chromatograms are read only once"""
+        with _loaded_lock:
+            array = _loaded.get(self)
+            if array is None:
+                with zipfile.ZipFile(self.path, "r") as archive, archive.open(self.name, "r") as f:
+                    array = _read_npy(f, STORAGE_PRECISION)
+                _loaded[self] = array
+        return array
+
+
+_loaded: weakref.WeakValueDictionary[ArchivedArray, NDArray] = weakref.WeakValueDictionary()
+"""Archived arrays that are loaded and still used by some chromatogram"""
+
+_loaded_lock = threading.Lock()
+"""Guards `_loaded`"""
+
+
+class _LazyData:
+    """Descriptor of the absorbances (`data`), which loads them on first access"""
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        data = obj.__dict__["data"]
+        if isinstance(data, ArchivedArray):
+            data = obj.__dict__["data"] = data.load()
+        return data
+
+    def __set__(self, obj, value):
+        obj.__dict__["data"] = value
+
+
+class LazyData2D(Data2D):
+    """Raw data loaded with `lazy=True`, the absorbances are read from the .mocca2 file on first access"""
+
+    data = _LazyData()
+
+
+class LazyChromatogram(Chromatogram):
+    """Chromatogram loaded with `lazy=True`, the absorbances are read from the .mocca2 file on first access"""
+
+    data = _LazyData()
 
 
-def pickle_all() -> str:
+def dump_campaign_v1(campaign: MoccaDataset, path: str):
     """
-    Dumps the current campaign into a .mocca2 file.
+    Dumps the campaign into a version 1 .mocca2 file at given path, e.g. for older versions of MOCCA.
 
     The .mocca2 file is json compressed with zlib.
     """
 
-    # compress current campaign to bytes
-    current_campaign = cache.get_campaign()
+    # compress campaign to bytes
     campaign_json = json.dumps(
-        current_campaign.to_dict(),
+        campaign.to_dict(),
         separators=(",", ":"),  # remove whitespace
     )
 
@@ -35,24 +231,19 @@ def pickle_all() -> str:
     campaign_json = zlib.compress(campaign_json.encode("utf-8"), level=9)
 
     # Save the compressed JSON to a file
-    _, path = cache.add_cached_file("campaign.mocca2")
     with open(path, "wb") as f:
         f.write(campaign_json)
 
-    return path
-
 
-def unpickle_all(pickle_id: int):
+def load_campaign_v1(path: str) -> MoccaDataset:
     """
-    Loads the campaign from a .mocca2 file
+    Loads the campaign from a version 1 .mocca2 file at given path
 
     The .mocca2 file is json compressed with zlib.
     """
 
-    pickle_path = cache.get_cached_file(pickle_id).cached_path
-
     # Load the compressed JSON
-    with open(pickle_path, "rb") as f:
+    with open(path, "rb") as f:
         campaign_json = f.read()
 
     # deflate
@@ -60,7 +251,203 @@ def unpickle_all(pickle_id: int):
 
     # Load the campaign from the JSON
     campaign_dict = json.loads(campaign_json)
-    restored_campaign = MoccaDataset.from_dict(campaign_dict)
+    return MoccaDataset.from_dict(campaign_dict)
+
+
+def _dump_processing(campaign: MoccaDataset) -> Dict[str, Any]:
+    """Returns the results of processing single chromatograms and the hashes of the raw data as JSON-serializable dict"""
+    deconvolutions = {}
+    for idx, chromatogram in campaign.chromatograms.items():
+        deconvolution: Deconvolution | None = getattr(chromatogram, "_deconvolution", None)
+        if deconvolution is not None:
+            deconvolutions[idx] = {
+                "fingerprint": deconvolution.fingerprint,
+                "peaks": [peak.to_dict() for peak in deconvolution.peaks],
+            }
+    data_hashes = {
+        idx: raw._data_hash for idx, raw in campaign._raw_2d_data.items() if hasattr(raw, "_data_hash")
+    }
+    return {"deconvolutions": deconvolutions, "data_hashes": data_hashes}
+
+
+def _load_processing(campaign: MoccaDataset, processing: Dict[str, Any]):
+    """Restores the results stored by `_dump_processing`"""
+    for idx, deconvolution in processing["deconvolutions"].items():
+        peaks = [
+            Peak.from_dict(peak) if peak["__classname__"] == "Peak" else DeconvolvedPeak.from_dict(peak)
+            for peak in deconvolution["peaks"]
+        ]
+        campaign.chromatograms[int(idx)]._deconvolution = Deconvolution(  # type: ignore
+            deconvolution["fingerprint"], peaks
+        )
+    for idx, data_hash in processing["data_hashes"].items():
+        campaign._raw_2d_data[int(idx)]._data_hash = data_hash  # type: ignore
+
+
+def _without_arrays(data: Data2D) -> Data2D:
+    """Returns shallow copy of the data (or chromatogram) without the time, wavelength and absorbances"""
+    data = copy.copy(data)
+    data.time = data.wavelength = data.data = np.empty(0)
+    return data
+
+
+class _ArrayWriter:
+    """Writes arrays into the zip file as `.npy` files, every array is written only once"""
+
+    def __init__(self, archive: zipfile.ZipFile, data_dtype: Any = DATA_DTYPE):
+        self.archive = archive
+        self.data_dtype = data_dtype  # None keeps the dtype of the absorbances
+        self.names: Dict[Tuple[int, str], str] = {}
+        self.arrays = []  # keeps the arrays alive, so that their IDs are not reused
+
+    def write(self, array: NDArray, dtype: Any) -> str:
+        """Writes the array converted to `dtype`, returns its name in the zip file"""
+        key = (id(array), np.dtype(dtype).str)
+        if key not in self.names:
+            name = f"arrays/{len(self.names)}.npy"
+            with self.archive.open(name, "w", force_zip64=True) as f:
+                _write_npy(f, array, dtype)
+            self.names[key] = name
+            self.arrays.append(array)
+        return self.names[key]
+
+    def copy(self, archived: ArchivedArray) -> str:
+        """Copies absorbances that were not loaded yet from their .mocca2 file, returns the new name"""
+        key = (id(archived), np.dtype(DATA_DTYPE).str)
+        if key not in self.names:
+            name = f"arrays/{len(self.names)}.npy"
+            with zipfile.ZipFile(archived.path, "r") as source:
+                with source.open(archived.name, "r") as f_in:
+                    with self.archive.open(name, "w", force_zip64=True) as f_out:
+                        shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+            self.names[key] = name
+            self.arrays.append(archived)
+        return self.names[key]
+
+    def write_data2d(self, data: Data2D) -> Dict[str, str]:
+        """Writes the arrays of the data, returns the names to be stored in the manifest"""
+        absorbances = data.__dict__.get("data")
+        return {
+            "time": self.write(data.time, data.time.dtype),
+            "wavelength": self.write(data.wavelength, data.wavelength.dtype),
+            "data": (
+                self.copy(absorbances)
+                if isinstance(absorbances, ArchivedArray)
+                else self.write(data.data, self.data_dtype or data.data.dtype)
+            ),
+        }
+
+
+class _ArrayReader:
+    """Reads `.npy` files from the zip file, every file is read only once"""
+
+    def __init__(self, archive: zipfile.ZipFile, path: str):
+        self.archive = archive
+        self.path = os.path.abspath(path)
+        self.arrays: Dict[Tuple[str, Any], NDArray] = {}
+        self.archived: Dict[str, ArchivedArray] = {}
+
+    def read(self, name: str, dtype: Any = None) -> NDArray:
+        """Reads array from the zip file, optionally converted to `dtype`"""
+        key = (name, dtype)
+        if key not in self.arrays:
+            with self.archive.open(name, "r") as f:
+                self.arrays[key] = _read_npy(f, dtype)
+        return self.arrays[key]
+
+    def read_archived(self, name: str) -> ArchivedArray:
+        """Returns reference to the array in the zip file, which is read later"""
+        if name not in self.archived:
+            self.archive.getinfo(name)  # check that the file exists
+            self.archived[name] = ArchivedArray(self.path, name)
+        return self.archived[name]
+
+    def read_data2d(self, data: Dict[str, Any], lazy: bool = False) -> Tuple[NDArray, NDArray, Any]:
+        """Reads time, wavelength and absorbances (or references to them) from the names stored in the manifest"""
+        return (
+            self.read(data["time"]),
+            self.read(data["wavelength"]),
+            self.read_archived(data["data"]) if lazy else self.read(data["data"], STORAGE_PRECISION),
+        )
+
+
+def _write_npy(f: IO[bytes], array: NDArray, dtype: Any):
+    """Writes the array converted to `dtype` in `.npy` format, the conversion is done in chunks"""
+    dtype = np.dtype(dtype)
+    header = {
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": False,
+        "shape": array.shape,
+    }
+    np.lib.format.write_array_header_1_0(f, header)
+
+    for chunk in _chunks(array.shape, dtype.itemsize):
+        f.write(np.ascontiguousarray(array[chunk], dtype=dtype).tobytes())
+
+
+def _read_npy(f: IO[bytes], dtype: Any = None) -> NDArray:
+    """Reads array in `.npy` format, optionally converted to `dtype` chunk by chunk"""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, stored_dtype = np.lib.format.read_array_header_1_0(f)
+    elif version == (2, 0):
+        shape, fortran_order, stored_dtype = np.lib.format.read_array_header_2_0(f)
+    else:
+        raise Exception(f"Unsupported array format {version} in the .mocca2 file")
+    if fortran_order or stored_dtype.hasobject:
+        raise Exception("Unsupported array in the .mocca2 file")
+
+    array = np.empty(shape, dtype=stored_dtype if dtype is None else dtype)
+    for chunk in _chunks(shape, stored_dtype.itemsize):
+        target = array[chunk]
+        data = f.read(target.size * stored_dtype.itemsize)
+        if len(data) != target.size * stored_dtype.itemsize:
+            raise Exception("The .mocca2 file is damaged")
+        target[...] = np.frombuffer(data, dtype=stored_dtype).reshape(target.shape)
+
+    return array
+
+
+def _chunks(shape: Tuple[int, ...], itemsize: int) -> List[Any]:
+    """Returns indices that split the array along the first axis into chunks of about `CHUNK_SIZE` bytes"""
+    if len(shape) == 0:
+        return [...]
+    row_size = max(int(np.prod(shape[1:])) * itemsize, 1)
+    rows = max(CHUNK_SIZE // row_size, 1)
+    return [slice(start, start + rows) for start in range(0, shape[0], rows)]
+
+
+def pickle_all(progress: Callable[[int, int], None] | None = None) -> str:
+    """
+    Dumps the current campaign into a .mocca2 file, returns path to the file.
+
+    Every session has one export file (`cache.get_export_path()`), which is replaced by the next export.
+    `progress(written, total)` is called after the data of each chromatogram are written.
+    """
+
+    path = cache.get_export_path()
+
+    # the previous export may be still downloading, so it is replaced only when the new one is complete
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        dump_campaign(cache.get_campaign(), tmp_path, progress=progress)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
+
+
+def unpickle_all(pickle_id: int, lazy: bool = False):
+    """
+    Loads the campaign from a cached .mocca2 file (any version) and makes it the current campaign
+
+    If `lazy` is True, the absorbances are loaded from the cached file only when they are needed.
+    """
+
+    pickle_path = cache.get_cached_file(pickle_id).cached_path
+    restored_campaign = load_campaign(pickle_path, lazy=lazy)
 
     # Restore the campaign
     cache.set_campaign(restored_campaign)
@@ -0,0 +1,340 @@
+"""
+Processing of the campaign, same steps as `MoccaDataset.process_all`, but split into two steps:
+
+1. every chromatogram is processed separately - cropping, baseline correction, peak picking and deconvolution
+2. the deconvolved peaks of all chromatograms are matched to compounds - clustering, peak refinement and naming
+
+The deconvolved peaks from the first step are kept with the chromatogram together with fingerprint
+of its raw data and of the settings used in the first step (`CHROMATOGRAM_SETTINGS`). Only chromatograms
+whose fingerprint changed are processed again, e.g. when new chromatogram is added, only this chromatogram
+is processed, and when only the settings of the matching change, only the second step is repeated.
+The first step is independent for every chromatogram, so it runs in parallel processes.
+The intermediate results of the first step (baseline corrected data, picked and deconvolved peaks)
+are cached by the settings of each stage (`STAGES`), so changing e.g. the peak picking settings
+reuses the baseline corrected data - both on the Process page preview and in Process all.
+
+The deconvolution seeds the random state of the spectral clustering (see `workers.processing.run_stages`),
+so the results do not depend on the order and the process in which the chromatograms are processed,
+but they can differ slightly from `MoccaDataset.process_all`, which does not seed it.
+
+The stored data may have lower precision (`STORAGE_PRECISION`), both steps compute in float64
+and the concentration profiles of the components are converted back to the storage precision.
+Both steps get the data in the storage precision also for the chromatograms that are not stored yet,
+so processing only the changed chromatograms gives the same results as processing all of them.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import copy
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from mocca2 import MoccaDataset, Chromatogram
+from mocca2.classes import Data2D, Component, DeconvolvedPeak, Peak
+from mocca2.clustering.cluster_components import cluster_components
+from mocca2.dataset.settings import ProcessingSettings
+from mocca2.math import cosine_similarity
+
+from app import PROCESSING_WORKERS, STAGE_CACHE_MB, STORAGE_PRECISION
+import cache
+from workers import MP_CONTEXT
+from workers.processing import STAGES, run_stages
+
+
+CHROMATOGRAM_SETTINGS = [name for names in STAGES.values() for name in names]
+"""Settings used by `process_chromatogram`, the other settings affect only matching of the compounds"""
+
+_stages = cache.LRUCache(STAGE_CACHE_MB * 2**20)
+"""Results of the stages of `process_chromatogram` [(data hash, stage, settings hash) -> result], shared by all sessions"""
+
+
+class ProcessingCancelled(Exception):
+    """Raised by `process_campaign` when the processing was cancelled"""
+
+
+@dataclass
+class Deconvolution:
+    """Result of processing a single chromatogram (first step), kept as `chromatogram._deconvolution`"""
+
+    fingerprint: str
+    """Fingerprint of the raw data and the settings used for processing the chromatogram, see `get_fingerprint`"""
+
+    peaks: List[DeconvolvedPeak]
+    """Deconvolved peaks before matching to compounds"""
+
+
+def process_chromatogram(
+    raw: Data2D, settings: ProcessingSettings, data_hash: str | None = None
+) -> Chromatogram:
+    """
+    Crops the raw data, corrects baseline, picks and deconvolves peaks.
+
+    Returns new chromatogram with processed data and deconvolved peaks, `raw` is not modified.
+    The results of the stages are cached by the hash of the raw data (`data_hash` if known)
+    and the settings of the stage (`STAGES`), so e.g. changing the peak picking settings
+    does not correct the baseline again.
+    """
+    keys = _get_stage_keys(data_hash or get_data_hash(raw), settings)
+    chromatogram, results = run_stages(_as_stored(raw), settings, _get_cached_stages(keys))
+    _store_stages(keys, results)
+    return chromatogram
+
+
+def _as_stored(raw: Data2D) -> Data2D:
+    """
+    Returns the raw data in the storage precision, same as the data hash (see `get_data_hash`).
+
+    New chromatograms are converted only when the campaign is stored, so they are processed
+    from the same data as when they are processed again after storing.
+    """
+    if raw.data.dtype == np.dtype(STORAGE_PRECISION):
+        return raw
+    return Data2D(raw.time, raw.wavelength, raw.data.astype(STORAGE_PRECISION))
+
+
+def _get_cached_stages(keys: Dict[str, Tuple]) -> Dict[str, Any]:
+    """Returns copies of the cached results of the stages that `run_stages` can continue from"""
+    cached: Dict[str, Any] = {}
+    baseline = _stages.get(keys["baseline"])
+    if baseline is None:
+        return cached
+    cached["baseline"] = copy.deepcopy(baseline)
+
+    # only the last cached stage is needed
+    for stage in ["deconvolution", "peaks"]:
+        result = _stages.get(keys[stage])
+        if result is not None:
+            cached[stage] = copy.deepcopy(result)
+            break
+    return cached
+
+
+def _store_stages(keys: Dict[str, Tuple], results: Dict[str, Any]):
+    """Adds copies of the results of `run_stages` to the cache, the size of the data estimates the memory"""
+    for stage, result in results.items():
+        if stage == "baseline":
+            size = result.data.nbytes + result.time.nbytes + result.wavelength.nbytes
+        else:
+            size = len(pickle.dumps(result))
+        _stages.put(keys[stage], copy.deepcopy(result), size)
+
+
+def _get_stage_keys(data_hash: str, settings: ProcessingSettings) -> Dict[str, Tuple]:
+    """Returns keys of the cached results of the stages, each stage depends on the settings of the previous stages too"""
+    keys: Dict[str, Tuple] = {}
+    names: List[str] = []
+    for stage, stage_names in STAGES.items():
+        names += stage_names
+        keys[stage] = (data_hash, stage, get_settings_hash(settings, names))
+    return keys
+
+
+def get_data_hash(raw: Data2D) -> str:
+    """
+    Returns hash of the raw data, equal data have equal hashes.
+
+    The raw data are never modified, so the hash is computed only once and kept with them
+    (`raw._data_hash`). The chromatograms get it when they are added to the campaign
+    (`campaign.builder.add_parsed_chromatogram`), so the data are not read again to find
+    which chromatograms must be processed.
+    """
+    data_hash = getattr(raw, "_data_hash", None)
+    if data_hash is None:
+        hasher = hashlib.sha1()
+        # new data are converted to the storage precision only when the campaign is stored
+        for array in [raw.time, raw.wavelength, raw.data.astype(STORAGE_PRECISION, copy=False)]:
+            array = np.ascontiguousarray(array)
+            hasher.update(f"{array.dtype.str}{array.shape}".encode())
+            hasher.update(array.tobytes())
+        data_hash = raw._data_hash = hasher.hexdigest()  # type: ignore
+    return data_hash
+
+
+def get_settings_hash(settings: ProcessingSettings, names: Iterable[str] | None = None) -> str:
+    """Returns hash of the settings with given `names`, all settings if None"""
+    if names is None:
+        names = [f.name for f in fields(settings)]
+    values = [(name, getattr(settings, name)) for name in names]
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+def get_fingerprint(raw: Data2D, settings: ProcessingSettings) -> str:
+    """Returns hash of the raw data and of the settings that `process_chromatogram` depends on"""
+    return get_data_hash(raw) + get_settings_hash(settings, CHROMATOGRAM_SETTINGS)
+
+
+def is_processed(chromatogram: Chromatogram, fingerprint: str) -> bool:
+    """Checks whether the deconvolved peaks of the chromatogram were obtained from data and settings with given fingerprint"""
+    deconvolution: Deconvolution | None = getattr(chromatogram, "_deconvolution", None)
+    return deconvolution is not None and deconvolution.fingerprint == fingerprint
+
+
+def match_compounds(campaign: MoccaDataset, settings: ProcessingSettings):
+    """
+    Clusters the deconvolved peaks of all chromatograms into compounds, refines the peaks and names the compounds.
+
+    All chromatograms must be processed by `process_chromatogram` first.
+    """
+    # matching modifies the peaks, the deconvolved peaks are kept for the next matching
+    for chromatogram in campaign.chromatograms.values():
+        chromatogram.peaks = copy.deepcopy(chromatogram._deconvolution.peaks)  # type: ignore
+        _cast_components(chromatogram.peaks, np.float64)
+        chromatogram.data = np.ascontiguousarray(chromatogram.data, dtype=np.float64)
+
+    # Cluster individual peaks to build averaged compounds
+    components = [
+        component
+        for chromatogram in campaign.chromatograms.values()
+        for component in chromatogram.all_components()
+    ]
+
+    def are_same_compound(comp1: Component, comp2: Component) -> bool:
+        # estimate peak width
+        pw1 = np.sum(comp1.concentration - np.max(comp1.concentration) / 2 > 0) / 2
+        pw2 = np.sum(comp2.concentration - np.max(comp2.concentration) / 2 > 0) / 2
+        max_peak_dist = pw1 + pw2
+
+        if abs(comp1.elution_time - comp2.elution_time) > max_peak_dist * settings.max_peak_distance:
+            return False
+        if cosine_similarity(comp1.spectrum, comp2.spectrum) < settings.min_spectrum_correl:
+            return False
+
+        return True
+
+    def importance(comp: Component) -> float:
+        return comp.integral * comp.peak_fraction**4
+
+    campaign.compounds = cluster_components(
+        components, are_same=are_same_compound, weights=importance
+    )
+
+    # Refine peaks
+    for chromatogram in campaign.chromatograms.values():
+        chromatogram.refine_peaks(
+            compounds=campaign.compounds,
+            model=settings.peak_model,
+            relaxe_concs=settings.relaxe_concs,
+            min_rel_integral=settings.min_rel_integral,
+        )
+
+    # Remove compounds that are not present
+    present = {
+        component.compound_id
+        for chromatogram in campaign.chromatograms.values()
+        for component in chromatogram.all_components()
+    }
+    campaign.compounds = {
+        idx: compound for idx, compound in campaign.compounds.items() if idx in present
+    }
+
+    # Name all compounds
+    campaign._name_compounds()
+
+    for chromatogram in campaign.chromatograms.values():
+        _cast_components(chromatogram.peaks, STORAGE_PRECISION)
+
+
+def _cast_components(peaks: Iterable[Peak], dtype):
+    """Converts the concentration profiles of the deconvolved components to `dtype` in place"""
+    for peak in peaks:
+        if isinstance(peak, DeconvolvedPeak):
+            for component in peak.components:
+                component.concentration = component.concentration.astype(dtype, copy=False)
+
+
+def process_campaign(
+    campaign: MoccaDataset,
+    settings: ProcessingSettings,
+    force: Iterable[int] = (),
+    progress: Callable[[int, int], None] | None = None,
+    workers: int | None = PROCESSING_WORKERS,
+    cancel: threading.Event | None = None,
+) -> List[int]:
+    """
+    Processes the campaign in place, same steps as `MoccaDataset.process_all` (see the module docstring).
+
+    Only the chromatograms that were not processed from the same raw data with the same settings
+    (see `is_processed`) and the chromatograms in `force` are processed, the deconvolved peaks
+    of the other ones are reused. The compounds are always matched again. Returns IDs of the processed chromatograms.
+    The chromatograms are processed by `workers` processes (all CPUs if None), the compounds
+    are matched afterwards in this process, so the results do not depend on the number of workers.
+    Before the first and after each processed chromatogram, `progress(processed, total)` is called.
+    When `cancel` is set, the chromatograms that are not processed yet are skipped
+    and `ProcessingCancelled` is raised, the campaign is then only partially processed.
+    """
+    if any(c is None for c in campaign.chromatograms.values()):
+        raise Exception("Some chromatograms are missing")
+
+    campaign.settings = settings
+    campaign.compounds = {}
+
+    force = set(force)
+    data_hashes = {idx: get_data_hash(campaign._raw_2d_data[idx]) for idx in campaign.chromatograms}
+    settings_hash = get_settings_hash(settings, CHROMATOGRAM_SETTINGS)
+    to_process: Dict[int, Chromatogram] = {
+        idx: chromatogram
+        for idx, chromatogram in campaign.chromatograms.items()
+        if idx in force or not is_processed(chromatogram, data_hashes[idx] + settings_hash)
+    }
+    done = 0
+
+    def _check_cancelled():
+        if cancel is not None and cancel.is_set():
+            raise ProcessingCancelled("The processing was cancelled")
+
+    def _processed(idx: int, processed: Chromatogram):
+        nonlocal done
+        chromatogram = to_process[idx]
+        # the matching must get the same data as for the reused chromatograms, which are stored in lower precision
+        chromatogram.data = processed.data.astype(STORAGE_PRECISION, copy=False)
+        chromatogram.time = processed.time
+        chromatogram.wavelength = processed.wavelength
+        _cast_components(processed.peaks, STORAGE_PRECISION)
+        chromatogram._deconvolution = Deconvolution(  # type: ignore
+            data_hashes[idx] + settings_hash, processed.peaks
+        )
+
+        done += 1
+        if progress is not None:
+            progress(done, len(to_process))
+        _check_cancelled()
+
+    if progress is not None:
+        progress(0, len(to_process))
+
+    workers = min(workers or os.cpu_count() or 1, len(to_process))
+    if workers <= 1:
+        for idx in to_process:
+            _processed(
+                idx, process_chromatogram(campaign._raw_2d_data[idx], settings, data_hashes[idx])
+            )
+    else:
+        # the cached stages are looked up and stored here, the workers only run the remaining stages
+        keys = {idx: _get_stage_keys(data_hashes[idx], settings) for idx in to_process}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT) as pool:
+            futures = {}
+            for idx in to_process:
+                cached = _get_cached_stages(keys[idx])
+                raw = _as_stored(campaign._raw_2d_data[idx]) if "baseline" not in cached else None
+                futures[pool.submit(run_stages, raw, settings, cached)] = idx
+            try:
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    processed, results = future.result()
+                    _store_stages(keys[idx], results)
+                    _processed(idx, processed)
+            except BaseException:
+                # don't wait for the chromatograms that were not started yet
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    _check_cancelled()
+    match_compounds(campaign, settings)
+
+    return list(to_process.keys())
@@ -0,0 +1,188 @@
+"""
+Watching a folder on the server for new chromatograms, e.g. during reaction monitoring.
+
+The folder is checked every `WATCH_INTERVAL` seconds by a background thread. New files are
+added to the current campaign by `campaign.builder.append_chromatograms`, the chromatograms
+that are already in the campaign are not loaded again.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+import os
+import threading
+
+from app import WATCH_INTERVAL
+import cache
+from campaign.builder import append_chromatograms
+
+
+@dataclass
+class FolderWatcher:
+    """Folder watched for one session"""
+
+    session_id: str
+    """Session whose campaign receives the new chromatograms"""
+
+    folder: str
+    """The watched folder"""
+
+    pattern: str
+    """Glob pattern of the chromatogram files"""
+
+    blank_pattern: str | None
+    """Pattern of the file names of blanks"""
+
+    process: bool
+    """If True, the new chromatograms are processed (if the campaign was processed before)"""
+
+    known: Set[str] = field(default_factory=set)
+    """Files that are already in the campaign, or were skipped"""
+
+    sizes: Dict[str, int] = field(default_factory=dict)
+    """Sizes of new files in the last check, the file is added when the size does not change"""
+
+    added: List[int] = field(default_factory=list)
+    """IDs of added chromatograms that were not yet shown in the upload table"""
+
+    message: str = ""
+    """Status shown on the Data page"""
+
+    message_class: str = "text-info"
+    """CSS class of the status message"""
+
+    stop: threading.Event = field(default_factory=threading.Event)
+    """Set to stop watching"""
+
+
+_watchers: Dict[str, FolderWatcher] = dict()
+"""Active watchers [session ID -> watcher]"""
+
+_lock = threading.Lock()
+"""Guards `_watchers` and `FolderWatcher.added`"""
+
+
+def start_watching(folder: str, pattern: str, blank_pattern: str | None, process: bool):
+    """
+    Starts watching the folder for the current session, the previous watcher is stopped.
+
+    Files whose names are already in the campaign are not added again.
+    """
+    # check that the folder can be watched
+    paths = cache.find_files(folder, pattern)
+
+    # stored as resolved by `cache.find_files`, relative folders are inside `IMPORT_ROOT`
+    watcher = FolderWatcher(
+        cache.get_session_id(), cache.resolve_folder(folder), pattern, blank_pattern, process
+    )
+
+    current_campaign = cache.get_campaign()
+    in_campaign = {c.sample_path for c in current_campaign.chromatograms.values()}
+    watcher.known = {path for path in paths if os.path.basename(path) in in_campaign}
+    watcher.message = f"Watching {watcher.folder} for new chromatograms..."
+
+    stop_watching()
+    with _lock:
+        _watchers[watcher.session_id] = watcher
+
+    threading.Thread(target=_watch, args=[watcher], daemon=True).start()
+
+
+def stop_watching():
+    """Stops watching the folder for the current session"""
+    with _lock:
+        watcher = _watchers.pop(cache.get_session_id(), None)
+    if watcher is not None:
+        watcher.stop.set()
+
+
+def get_watcher() -> FolderWatcher | None:
+    """Returns the active watcher of the current session"""
+    with _lock:
+        return _watchers.get(cache.get_session_id())
+
+
+def take_added_chromatograms(watcher: FolderWatcher) -> List[int]:
+    """Returns IDs of the chromatograms added since the last call"""
+    with _lock:
+        added, watcher.added = watcher.added, []
+    return added
+
+
+def _watch(watcher: FolderWatcher):
+    """Checks the folder periodically until the watcher is stopped"""
+    while not watcher.stop.is_set():
+        with cache.session_scope(watcher.session_id):
+            try:
+                _check_folder(watcher)
+            except Exception as ex:
+                watcher.message, watcher.message_class = f"Error! {ex}", "text-danger"
+        watcher.stop.wait(WATCH_INTERVAL)
+
+
+def _check_folder(watcher: FolderWatcher):
+    """Adds new files that are completely written to the campaign"""
+    paths = cache.find_files(watcher.folder, watcher.pattern)
+    pairs = cache.pair_with_blanks(paths, watcher.blank_pattern)
+
+    # files that are being written are added in the next check
+    ready = []
+    for sample, blank in pairs:
+        if sample in watcher.known:
+            continue
+        size = _get_size(sample)
+        if size > 0 and watcher.sizes.get(sample) == size:
+            ready.append((sample, blank))
+        watcher.sizes[sample] = size
+
+    if len(ready) == 0:
+        return
+
+    # don't interfere with the processing or loading started by the user, try again later
+    with cache.locked():
+        if (
+            cache.get_campaign_processing_info().status != "IDLE"
+            or cache.get_campaign_building_info().status == "PROCESSING"
+        ):
+            return
+        if watcher.process:
+            cache.set_campaign_processing_info(
+                cache.CampaignProcessingInfo(status="PROCESSING", message="", message_class="")
+            )
+
+    try:
+        files = [
+            (cache.register_file(sample), cache.register_file(blank) if blank is not None else None)
+            for sample, blank in ready
+        ]
+        names = [os.path.splitext(os.path.basename(sample))[0] for sample, _ in ready]
+        new_ids, processed = append_chromatograms(files, names, process=watcher.process)
+    finally:
+        if watcher.process:
+            cache.set_campaign_processing_info(
+                cache.CampaignProcessingInfo(status="IDLE", message="", message_class="")
+            )
+
+    for sample, _ in ready:
+        watcher.known.add(sample)
+        watcher.sizes.pop(sample, None)
+    with _lock:
+        watcher.added.extend(new_ids)
+
+    watcher.message = f"{', '.join(names)} added to the campaign"
+    if watcher.process and processed:
+        watcher.message += " and processed"
+    elif watcher.process:
+        watcher.message += ", please process all data (the campaign was not processed with current settings)"
+    watcher.message_class = "text-success"
+
+
+def _get_size(path: str) -> int:
+    """Returns size of the file, or total size of all files in the folder (e.g. Agilent `.D`)"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
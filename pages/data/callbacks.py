@@ -1,6 +1,12 @@
-from dash import Input, Output, State, callback, dcc  # type: ignore
+from typing import Dict, List
+
+from dash import Input, Output, State, callback, dcc, no_update  # type: ignore
+from dash.exceptions import PreventUpdate  # type: ignore
+import os
+import threading
 
 import cache
+from cache import CampaignProcessingInfo
 import campaign
 
 
@@ -9,14 +15,12 @@ import campaign
         Output("data-span-uploaded-blank-message", "children"),
         Output("data-span-uploaded-blank-message", "className"),
     ],
-    inputs=[Input("data-upload-blank", "contents")],
-    state=[State("data-upload-blank", "filename")],
+    inputs=[Input("data-store-blank", "data")],
 )
-def upload_blank(content, name):
+def upload_blank(uploaded):
     """Handles upload of blank chromatogram file"""
-    if content is not None:
-        fileid = cache.save_uploaded_file(name, content)
-        cache.set_current_blank(fileid)
+    if uploaded is not None:
+        cache.set_current_blank(uploaded["files"][0]["file_id"])
 
     blank_id = cache.get_current_blank()
     if blank_id is None:
@@ -29,53 +33,164 @@ def upload_blank(content, name):
         return blank.original_name, "text-success col"
 
 
+def new_table_row(sample_id: int, blank_id: int | None, rows: List[Dict]) -> Dict:
+    """Creates row of the upload table for new sample, `rows` are the current rows of the table"""
+    if blank_id is None:
+        blank_name = "No blank selected!"
+    else:
+        blank_name = cache.get_cached_file(blank_id).original_name
+
+    sample_names = {r["name"] for r in rows}
+    name_idx = 1
+    name = f"Sample {name_idx}"
+    while name in sample_names:
+        name_idx += 1
+        name = f"Sample {name_idx}"
+
+    return dict(
+        chromatogram_id=None,
+        sample_id=sample_id,
+        blank_id=blank_id,
+        name=name,
+        sample=cache.get_cached_file(sample_id).original_name,
+        blank=blank_name,
+        compound_name="",
+        compound_conc="",
+        istd_conc="",
+    )
+
+
 @callback(
     output=[
         Output("data-table-sample-data", "data", allow_duplicate=True),
         Output("data-span-buttons-message", "children", allow_duplicate=True),
         Output("data-span-buttons-message", "className", allow_duplicate=True),
     ],
-    inputs=[Input("data-upload-sample", "contents")],
+    inputs=[Input("data-store-sample", "data")],
+    state=[State("data-table-sample-data", "data")],
+    prevent_initial_call=True,
+)
+def upload_sample(uploaded, rows):
+    """Handles upload of sample chromatogram files"""
+    if uploaded is not None:
+        for file in sorted(uploaded["files"], key=lambda f: f["name"]):
+            rows.append(new_table_row(file["file_id"], cache.get_current_blank(), rows))
+
+    return rows, "Don't forget to confirm the changes!", "text-warning"
+
+
+@callback(
+    output=[
+        Output("data-table-sample-data", "data", allow_duplicate=True),
+        Output("data-span-buttons-message", "children", allow_duplicate=True),
+        Output("data-span-buttons-message", "className", allow_duplicate=True),
+    ],
+    inputs=[Input("data-button-import-folder", "n_clicks")],
     state=[
-        State("data-upload-sample", "filename"),
+        State("data-input-import-folder", "value"),
+        State("data-input-import-pattern", "value"),
+        State("data-input-import-blank-pattern", "value"),
         State("data-table-sample-data", "data"),
     ],
     prevent_initial_call=True,
 )
-def upload_sample(contents, names, rows):
-    """Handles upload of sample chromatogram files"""
-    if contents is not None:
-        for name, content in sorted(zip(names, contents)):
-            blank_id = cache.get_current_blank()
-
-            sample_id = cache.save_uploaded_file(name, content)
-
-            if blank_id is None:
-                blank_name = "No blank selected!"
-            else:
-                blank_name = cache.get_cached_file(blank_id).original_name
-
-            sample_names = {r["name"] for r in rows}
-            name_idx = 1
-            name = f"Sample {name_idx}"
-            while name in sample_names:
-                name_idx += 1
-                name = f"Sample {name_idx}"
-
-            data = dict(
-                chromatogram_id=None,
-                sample_id=sample_id,
-                blank_id=blank_id,
-                name=name,
-                sample=cache.get_cached_file(sample_id).original_name,
-                blank=blank_name,
-                compound_name="",
-                compound_conc="",
-                istd_conc="",
-            )
-            rows.append(data)
+def import_folder(_, folder, pattern, blank_pattern, rows):
+    """Registers the chromatograms from a folder on the server and adds them to the table"""
+    if folder is None or folder == "":
+        return rows, "Please specify the folder to import!", "text-danger"
+    if blank_pattern == "":
+        blank_pattern = None
 
-    return rows, "Don't forget to confirm the changes!", "text-warning"
+    try:
+        pairs = cache.import_folder(folder, pattern or "*", blank_pattern)
+    except Exception as ex:
+        return rows, "Error! " + str(ex), "text-danger"
+
+    # all rows are added at once
+    rows = list(rows)
+    for sample_id, blank_id in pairs:
+        rows.append(new_table_row(sample_id, blank_id, rows))
+
+    return (
+        rows,
+        f"{len(pairs)} chromatograms were imported. Don't forget to confirm the changes!",
+        "text-warning",
+    )
+
+
+@callback(
+    output=[
+        Output("data-span-watch-message", "children", allow_duplicate=True),
+        Output("data-span-watch-message", "className", allow_duplicate=True),
+    ],
+    inputs=[Input("data-button-watch-folder", "n_clicks")],
+    state=[
+        State("data-input-import-folder", "value"),
+        State("data-input-import-pattern", "value"),
+        State("data-input-import-blank-pattern", "value"),
+        State("data-checklist-watch-process", "value"),
+    ],
+    prevent_initial_call=True,
+)
+def watch_folder(_, folder, pattern, blank_pattern, process):
+    """Starts watching the folder on the server for new chromatograms"""
+    if folder is None or folder == "":
+        return "Please specify the folder to watch!", "text-danger"
+    if blank_pattern == "":
+        blank_pattern = None
+
+    try:
+        campaign.start_watching(folder, pattern or "*", blank_pattern, "process" in process)
+    except Exception as ex:
+        return "Error! " + str(ex), "text-danger"
+
+    watcher = campaign.get_watcher()
+    return watcher.message, watcher.message_class
+
+
+@callback(
+    output=[
+        Output("data-span-watch-message", "children", allow_duplicate=True),
+        Output("data-span-watch-message", "className", allow_duplicate=True),
+    ],
+    inputs=[Input("data-button-stop-watching", "n_clicks")],
+    prevent_initial_call=True,
+)
+def stop_watching(_):
+    """Stops watching the folder"""
+    campaign.stop_watching()
+    return "The folder is not watched.", "text-info"
+
+
+@callback(
+    output=[
+        Output("data-span-watch-message", "children", allow_duplicate=True),
+        Output("data-span-watch-message", "className", allow_duplicate=True),
+        Output("data-table-sample-data", "data", allow_duplicate=True),
+    ],
+    inputs=[Input("data-interval-background-updater", "n_intervals")],
+    state=[
+        State("data-span-watch-message", "children"),
+        State("data-table-sample-data", "data"),
+    ],
+    prevent_initial_call=True,
+)
+def update_watch_status(_, current_message, rows):
+    """Shows the status of the watched folder and adds the new chromatograms to the table"""
+    watcher = campaign.get_watcher()
+    if watcher is None:
+        raise PreventUpdate()
+
+    # the chromatograms are already in the campaign, so the rows must be added to the table,
+    # otherwise they would be removed when the changes are confirmed
+    added = campaign.watching.take_added_chromatograms(watcher)
+    if len(added) > 0:
+        campaign_rows, _ = campaign.gen_upload_table_from_campaign()
+        rows = rows + [row for row in campaign_rows if row["chromatogram_id"] in added]
+    elif watcher.message == current_message:
+        raise PreventUpdate()
+
+    return watcher.message, watcher.message_class, rows
 
 
 @callback(
@@ -85,21 +200,23 @@ def upload_sample(contents, names, rows):
         Output("data-span-buttons-message", "children", allow_duplicate=True),
         Output("data-span-buttons-message", "className", allow_duplicate=True),
     ],
-    inputs=[Input("data-upload-campaign", "contents")],
+    inputs=[Input("data-store-campaign", "data")],
     state=[
         State("data-table-sample-data", "data"),
         State("data-input-istd", "value"),
+        State("data-checklist-lazy-load", "value"),
     ],
     prevent_initial_call=True,
 )
-def upload_campaign(content, old_rows, old_istd):
+def upload_campaign(uploaded, old_rows, old_istd, lazy_load):
     """Handles upload of sample chromatogram files"""
-    if content is not None:
+    if uploaded is not None:
         try:
-            # Save the file in cache folder
-            file_id = cache.save_uploaded_file("campaign.mocca2", content)
-            # Unpickle the file
-            campaign.unpickle_all(file_id)
+            # The file is already in cache folder, unpickle it
+            # in lazy mode, the 2D data are read from the file when a chromatogram is opened
+            campaign.unpickle_all(
+                uploaded["files"][0]["file_id"], lazy="lazy" in (lazy_load or [])
+            )
             # Generate the data for upload table
             rows, istd = campaign.gen_upload_table_from_campaign()
         except Exception as ex:
@@ -121,6 +238,7 @@ def upload_campaign(content, old_rows, old_istd):
     output=[
         Output("data-span-buttons-message", "children", allow_duplicate=True),
         Output("data-span-buttons-message", "className", allow_duplicate=True),
+        Output("data-button-confirm-changes", "disabled", allow_duplicate=True),
     ],
     inputs=[
         Input("data-button-confirm-changes", "n_clicks"),
@@ -129,46 +247,199 @@ def upload_campaign(content, old_rows, old_istd):
     prevent_initial_call=True,
 )
 def confirm_changes(_, rows, istd):
-    """Reads the data from the upload table and creates the MOCCA campaign"""
-    try:
-        campaign.campaign_from_table(rows, istd)
-    except Exception as ex:
-        # raise ex
-        return "Error! " + str(ex), "text-danger"
+    """Reads the data from the upload table and creates the MOCCA campaign in background"""
 
-    current_campaign = cache.get_campaign()
-    if len(current_campaign.chromatograms) == 0:
-        return (
-            "Campaign updated successfuly, but there aren't any HPLC data!",
-            "text-warning",
-        )
-    else:
-        return (
-            "Campaign updated successfuly! You can now process your data",
-            "text-success",
+    # If the chromatograms are currently loaded, don't load them again
+    with cache.locked():
+        if cache.get_campaign_building_info().status != "IDLE":
+            raise PreventUpdate()
+
+        cache.set_campaign_building_info(
+            CampaignProcessingInfo(
+                status="PROCESSING",
+                message="The chromatograms are being loaded...",
+                message_class="text-warning",
+            )
         )
 
+    # Parsing many chromatograms takes long, so it runs in background same as processing
+    def build_campaign(rows, istd, session_id):
+        with cache.session_scope(session_id):
+
+            def progress(done: int, total: int):
+                cache.set_campaign_building_info(
+                    CampaignProcessingInfo(
+                        status="PROCESSING",
+                        message=f"Loading the chromatograms: {done} / {total}",
+                        message_class="text-warning",
+                    )
+                )
+
+            try:
+                saved_blank_parses = campaign.campaign_from_table(rows, istd, progress)
+
+                if len(cache.get_chromatogram_names()) == 0:
+                    message = (
+                        "Campaign updated successfuly, but there aren't any HPLC data!",
+                        "text-warning",
+                    )
+                else:
+                    message = (
+                        "Campaign updated successfuly! You can now process your data",
+                        "text-success",
+                    )
+                    if saved_blank_parses > 0:
+                        message = (
+                            message[0] + f" (blanks were parsed only once, {saved_blank_parses} parses saved)",
+                            message[1],
+                        )
+            except Exception as ex:
+                message = "Error! " + str(ex), "text-danger"
+
+            cache.set_campaign_building_info(
+                CampaignProcessingInfo(
+                    status="NEW_DATA_READY", message=message[0], message_class=message[1]
+                )
+            )
+
+    threading.Thread(
+        target=build_campaign, args=[rows, istd, cache.get_session_id()]
+    ).start()
+
+    return "The chromatograms are being loaded...", "text-warning", True
+
+
+@callback(
+    output=[
+        Output("data-span-buttons-message", "children", allow_duplicate=True),
+        Output("data-span-buttons-message", "className", allow_duplicate=True),
+        Output("data-button-confirm-changes", "disabled", allow_duplicate=True),
+    ],
+    inputs=[Input("data-interval-background-updater", "n_intervals")],
+    state=[State("data-span-buttons-message", "children")],
+    prevent_initial_call=True,
+)
+def update_background_results(_, current_message):
+    """Shows the progress of loading the chromatograms and the result when it is finished"""
+
+    building_info = cache.get_campaign_building_info()
+
+    if building_info.status == "PROCESSING":
+        if building_info.message == current_message:
+            raise PreventUpdate()
+        return building_info.message, building_info.message_class, True
+
+    if building_info.status != "NEW_DATA_READY":
+        raise PreventUpdate()
+
+    building_info.status = "IDLE"
+    cache.set_campaign_building_info(building_info)
+
+    return building_info.message, building_info.message_class, False
+
 
 @callback(
     output=[
-        Output("data-button-download-campaign-pkl", "data"),
+        Output("data-button-download-campaign-pkl", "data", allow_duplicate=True),
         Output("data-span-buttons-message", "children", allow_duplicate=True),
         Output("data-span-buttons-message", "className", allow_duplicate=True),
+        Output("data-button-download-campaign", "disabled", allow_duplicate=True),
     ],
     inputs=[Input("data-button-download-campaign", "n_clicks")],
     prevent_initial_call=True,
 )
 def download_campaign(_):
-    """Pickles and downloads the current MOCCA campaign"""
-    print("Saving the campaign into .mocca2 file (compressed JSON file)")
-    path = campaign.pickle_all()
-    print("Sending .mocca2 file to browser")
+    """Saves the current MOCCA campaign into .mocca2 file in background, the file is then downloaded"""
 
-    return (
-        dcc.send_file(path, "campaign.mocca2"),
-        "The campaign is downloading...",
-        "text-success",
+    with cache.locked():
+        export_info = cache.get_campaign_export_info()
+        if export_info.status != "IDLE":
+            raise PreventUpdate()
+
+        # The campaign was not changed since the last export, the file can be downloaded again
+        version = cache.get_campaign_version()
+        if (
+            export_info.version == version
+            and export_info.path is not None
+            and os.path.exists(export_info.path)
+        ):
+            return (
+                dcc.send_file(export_info.path, "campaign.mocca2"),
+                "The campaign is downloading...",
+                "text-success",
+                False,
+            )
+
+        export_info.status = "EXPORTING"
+        export_info.message = "Saving the campaign..."
+        export_info.message_class = "text-warning"
+        cache.set_campaign_export_info(export_info)
+
+    # Saving large campaigns takes long, so it runs in background same as processing
+    def export_campaign(version, session_id):
+        with cache.session_scope(session_id):
+
+            def progress(done: int, total: int):
+                export_info = cache.get_campaign_export_info()
+                export_info.message = f"Saving the campaign: {100 * done // total} %"
+                cache.set_campaign_export_info(export_info)
+
+            export_info = cache.get_campaign_export_info()
+            try:
+                export_info.path = campaign.pickle_all(progress)
+                export_info.version = version
+                export_info.status = "READY"
+                export_info.message = "The campaign is downloading..."
+                export_info.message_class = "text-success"
+            except Exception as ex:
+                export_info.path = export_info.version = None
+                export_info.status = "READY"
+                export_info.message = "Error! " + str(ex)
+                export_info.message_class = "text-danger"
+            cache.set_campaign_export_info(export_info)
+
+    threading.Thread(
+        target=export_campaign, args=[version, cache.get_session_id()]
+    ).start()
+
+    return no_update, "Saving the campaign...", "text-warning", True
+
+
+@callback(
+    output=[
+        Output("data-button-download-campaign-pkl", "data", allow_duplicate=True),
+        Output("data-span-buttons-message", "children", allow_duplicate=True),
+        Output("data-span-buttons-message", "className", allow_duplicate=True),
+        Output("data-button-download-campaign", "disabled", allow_duplicate=True),
+    ],
+    inputs=[Input("data-interval-background-updater", "n_intervals")],
+    state=[State("data-span-buttons-message", "children")],
+    prevent_initial_call=True,
+)
+def update_export_status(_, current_message):
+    """Shows the progress of saving the campaign and sends the file when it is ready"""
+
+    with cache.locked():
+        export_info = cache.get_campaign_export_info()
+
+        if export_info.status == "EXPORTING":
+            if export_info.message == current_message:
+                raise PreventUpdate()
+            return no_update, export_info.message, export_info.message_class, True
+
+        if export_info.status != "READY":
+            raise PreventUpdate()
+
+        export_info.status = "IDLE"
+        cache.set_campaign_export_info(export_info)
+
+    # the path is None if the export failed
+    download = (
+        dcc.send_file(export_info.path, "campaign.mocca2")
+        if export_info.path is not None
+        else no_update
     )
+    return download, export_info.message, export_info.message_class, False
 
 
 @callback(
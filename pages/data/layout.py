@@ -3,6 +3,7 @@
 from typing import Tuple
 
 from dash import html, dcc, dash_table  # type: ignore
+from app import IMPORT_ROOT
 from campaign import gen_upload_table_from_campaign
 
 explanation_of_table = """\
@@ -66,13 +67,26 @@ def data_table() -> Tuple[dash_table.DataTable, str]:
 
 
 def upload_card(
-    header: str, text: str, id: str, allow_multiple: bool = True
+    header: str, text: str, id: str, allow_multiple: bool = True, footer=None
 ) -> html.Div:
-    """Generates the upload cards"""
-    upl = dcc.Upload(
+    """
+    Generates the upload cards.
+
+    The files are uploaded in chunks by `assets/chunked_upload.js`, the IDs of the
+    cached files are then written into `dcc.Store` with ID `data-store-[name]`,
+    where `id` is `data-upload-[name]`. The `footer` is shown below the upload area.
+    """
+    name = id.removeprefix("data-upload-")
+    upl = html.Div(
         id=id,
-        className="cursor-pointer align-items-center row",
-        children=html.Div(html.Small(text)),
+        className="chunked-upload cursor-pointer align-items-center row",
+        children=html.Div(
+            [
+                html.Small(text),
+                html.Br(),
+                html.Small(id=f"data-span-{name}-progress", className="text-info"),
+            ]
+        ),
         style={
             "borderWidth": "1px",
             "borderStyle": "dashed",
@@ -82,14 +96,22 @@ def upload_card(
             "min-height": "40px",
         },
         # Allow multiple files to be uploaded
-        multiple=allow_multiple,
+        **{
+            "data-multiple": "true" if allow_multiple else "false",
+            "data-store": f"data-store-{name}",
+            "data-progress": f"data-span-{name}-progress",
+        },
     )
 
     card = html.Div(
         className="card bg-light col",
         children=[
             html.Div(header, className="card-header"),
-            html.Div(className="card-body row", children=[upl]),
+            html.Div(
+                className="card-body row",
+                children=[upl] if footer is None else [upl, footer],
+            ),
+            dcc.Store(id=f"data-store-{name}"),
         ],
     )
     return card
@@ -106,6 +128,14 @@ def get_layout():
                 "Restore a previous campaign from .mocca2 file",
                 "data-upload-campaign",
                 allow_multiple=False,
+                footer=dcc.Checklist(
+                    id="data-checklist-lazy-load",
+                    className="mt-2 px-0",
+                    options=[
+                        {"label": " Load chromatograms only when opened", "value": "lazy"}
+                    ],
+                    value=[],
+                ),
             ),
             upload_card(
                 "Select Blank",
@@ -121,6 +151,91 @@ def get_layout():
         ],
     )
 
+    # Import from folder on the server
+    import_folder = html.Div(
+        className="card bg-light mt-4",
+        children=[
+            html.Div("Import from Folder", className="card-header"),
+            html.Div(
+                className="card-body row g-2 align-items-end",
+                children=[
+                    html.Div(
+                        className="col-md-5",
+                        children=[
+                            html.Label("Folder on the server:", htmlFor="data-input-import-folder"),
+                            dcc.Input(
+                                id="data-input-import-folder",
+                                className="form-control",
+                                placeholder=f"e.g. 2024-03-24 (inside {IMPORT_ROOT})",
+                            ),
+                        ],
+                    ),
+                    html.Div(
+                        className="col-md-2",
+                        children=[
+                            html.Label("Files:", htmlFor="data-input-import-pattern"),
+                            dcc.Input(
+                                id="data-input-import-pattern",
+                                className="form-control",
+                                value="*.csv",
+                            ),
+                        ],
+                    ),
+                    html.Div(
+                        className="col-md-2",
+                        children=[
+                            html.Label("Blanks:", htmlFor="data-input-import-blank-pattern"),
+                            dcc.Input(
+                                id="data-input-import-blank-pattern",
+                                className="form-control",
+                                value="*blank*",
+                            ),
+                        ],
+                    ),
+                    html.Div(
+                        className="col-md-auto",
+                        children=html.Button(
+                            "Import",
+                            id="data-button-import-folder",
+                            className="btn btn-outline-primary",
+                        ),
+                    ),
+                    html.Small(
+                        "The files are matched by glob patterns (use ** for subfolders). "
+                        "Each sample is paired with the last blank before it in alphabetical order. "
+                        "When watching, new files in the folder are added to the campaign automatically.",
+                        className="text-muted",
+                    ),
+                    html.Div(
+                        className="col-md-auto",
+                        children=html.Button(
+                            "Watch Folder",
+                            id="data-button-watch-folder",
+                            className="btn btn-outline-primary",
+                        ),
+                    ),
+                    html.Div(
+                        className="col-md-auto",
+                        children=html.Button(
+                            "Stop Watching",
+                            id="data-button-stop-watching",
+                            className="btn btn-outline-danger",
+                        ),
+                    ),
+                    html.Div(
+                        className="col-md-auto",
+                        children=dcc.Checklist(
+                            id="data-checklist-watch-process",
+                            options=[{"label": " Process new chromatograms", "value": "process"}],
+                            value=[],
+                        ),
+                    ),
+                    html.Span(id="data-span-watch-message", className="col-md"),
+                ],
+            ),
+        ],
+    )
+
     # Current blank
     current_blank = html.Div(
         className="row",
@@ -178,6 +293,7 @@ def get_layout():
 
     layout = [
         upload_cards,
+        import_folder,
         current_blank,
         table_header,
         table,
@@ -187,6 +303,10 @@ def get_layout():
         html.Hr(className="mt-5 mb-3"),
         explanation,
         dcc.Download(id="data-button-download-campaign-pkl"),
+        dcc.Interval(
+            id="data-interval-background-updater",
+            interval=500,  # ms
+        ),
     ]
 
     return layout
@@ -0,0 +1,15 @@
+"""Helpers for the plotly figures shown on the pages"""
+
+import numpy as np
+import plotly.graph_objects as go  # type: ignore
+
+
+def estimate_figure_size(figure: go.Figure) -> int:
+    """Estimates memory taken by the figure [bytes] from the data of its traces, e.g. for `cache.LRUCache`"""
+    size = 0
+    for trace in figure.data:
+        for name in ["x", "y", "z"]:
+            values = trace[name] if name in trace else None
+            if values is not None:
+                size += values.nbytes if isinstance(values, np.ndarray) else 8 * len(values)
+    return size
@@ -1,13 +1,13 @@
-from dash import Input, Output, State, callback, html  # type: ignore
+from dash import ALL, Input, Output, State, callback, ctx, html, no_update  # type: ignore
 from dash.exceptions import PreventUpdate  # type: ignore
-import threading
 import base64
 
 from mocca2.dataset.settings import ProcessingSettings
 
+from pages.process.layout_jobs import get_job_signature, get_jobs_layout
 from pages.process.process_single import process_single
 import cache
-from cache import CampaignProcessingInfo
+import campaign
 
 
 @callback(
@@ -90,8 +90,7 @@ def process_single_hplc(disabled, sample_index: int, *args: float):
     if type(result) is str:
         return "", result, "text-danger", False
 
-    current_campaign = cache.get_campaign()
-    sample_name = current_campaign.chromatograms[sample_index].name
+    sample_name = cache.get_chromatogram_names()[sample_index]
 
     layout = [html.H5(f"Preview of {sample_name}:", className="mt-3"), result]
 
@@ -102,7 +101,6 @@ def process_single_hplc(disabled, sample_index: int, *args: float):
     output=[
         Output("process-span-process-all-message", "children", allow_duplicate=True),
         Output("process-span-process-all-message", "className", allow_duplicate=True),
-        Output("process-button-process-all", "disabled", allow_duplicate=True),
     ],
     inputs=[Input("process-button-process-all", "n_clicks")],
     state=[
@@ -141,60 +139,60 @@ def process_all_hplc(_, *args: float):
         min_rel_integral=args[12],
     )
 
-    # If the campaign is currently processed, don't process it again
-    if cache.get_campaign_processing_info().status != "IDLE":
-        raise PreventUpdate()
+    # the jobs are processed one after another in background, see `campaign.jobs`
+    job = campaign.submit_processing(settings)
 
-    cache.set_campaign_processing_info(
-        CampaignProcessingInfo(status="PROCESSING", message="", message_class="")
-    )
+    return f"Processing job #{job.job_id} was queued, the progress is shown below", "text-warning"
 
-    # Explicit threading is used instead of Dash background callbacks, because:
-    # 1. the DiskCache callbacks are really slow
-    # 2. sharing state (flask-cache) with background callbacks is not trivial
-    def process_all(settings):
-        try:
-            current_campaign = cache.get_campaign()
-            current_campaign.process_all(settings)
-            cache.set_campaign(current_campaign)
-            message = (
-                "Data has been processed successfuly! You can now go to results",
-                "text-success",
-            )
-        except Exception as ex:
-            message = str(ex), "text-danger"
 
-        cache.set_campaign_processing_info(
-            CampaignProcessingInfo(
-                status="NEW_DATA_READY", message=message[0], message_class=message[1]
-            )
-        )
+@callback(
+    output=[
+        Output("process-div-jobs", "children"),
+        Output("process-store-jobs-signature", "data"),
+        Output("process-span-process-all-message", "children", allow_duplicate=True),
+        Output("process-span-process-all-message", "className", allow_duplicate=True),
+    ],
+    inputs=[Input("process-interval-background-updater", "n_intervals")],
+    state=[State("process-store-jobs-signature", "data")],
+    prevent_initial_call=True,
+)
+def update_background_results(_, signature):
+    """Shows the progress of the processing jobs and the result of the last finished job"""
 
-    threading.Thread(target=process_all, args=[settings]).start()
+    jobs = campaign.get_jobs()
+    finished = campaign.jobs.take_finished_jobs()
 
-    return "The data is being processed, please wait...", "text-warning", True
+    new_signature = get_job_signature(jobs)
+    if new_signature == signature and len(finished) == 0:
+        raise PreventUpdate()
+
+    if len(finished) > 0:
+        message, message_class = finished[-1].message, finished[-1].message_class
+    else:
+        message, message_class = no_update, no_update
+
+    return get_jobs_layout(jobs), new_signature, message, message_class
 
 
 @callback(
     output=[
         Output("process-span-process-all-message", "children", allow_duplicate=True),
         Output("process-span-process-all-message", "className", allow_duplicate=True),
-        Output("process-button-process-all", "disabled", allow_duplicate=True),
     ],
-    inputs=[Input("process-interval-background-updater", "n_intervals")],
+    inputs=[Input({"type": "process-button-cancel-job", "index": ALL}, "n_clicks")],
     prevent_initial_call=True,
 )
-def update_background_results(_):
-    """Checks whether background tasks have finished and updates GUI accordingly"""
+def cancel_job(n_clicks):
+    """Cancels the queued or running processing job"""
 
-    processing_info = cache.get_campaign_processing_info()
-    if processing_info.status != "NEW_DATA_READY":
+    if ctx.triggered_id is None or not any(n_clicks):
         raise PreventUpdate()
 
-    processing_info.status = "IDLE"
-    cache.set_campaign_processing_info(processing_info)
+    job_id = ctx.triggered_id["index"]
+    if not campaign.cancel_job(job_id):
+        return f"Job #{job_id} has already finished", "text-info"
 
-    return processing_info.message, processing_info.message_class, False
+    return f"Job #{job_id} is being cancelled...", "text-warning"
 
 
 @callback(
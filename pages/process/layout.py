@@ -2,6 +2,7 @@
 
 from dash import html, dcc  # type: ignore
 from typing import Tuple
+import copy
 
 import cache
 
@@ -60,7 +61,7 @@ def get_layout():
 
     current_campaign = cache.get_campaign()
 
-    s = current_campaign.settings
+    s = copy.copy(current_campaign.settings)
 
     # Clip wavelenghts and elution times
     s.min_wavelength = max(s.min_wavelength, round(current_campaign.wavelength_raw()[0]))
@@ -171,10 +172,13 @@ def get_layout():
             html.Span(id="process-span-process-single-message"),
             html.H3("Process Entire Dataset", className="mt-5"),
             html.P(
-                "Once you are happy with the settings, you can process all files. This might take a while."),
+                "Once you are happy with the settings, you can process all files. This might take a while. "
+                "Every click queues new processing job, the jobs run one after another and can be cancelled."),
             html.Button("Process All", id='process-button-process-all',
                         className='btn btn-outline-primary mt-1'),
             html.Span(id="process-span-process-all-message"),
+            html.Div(id="process-div-jobs", style={'align-self':'stretch'}),
+            dcc.Store(id="process-store-jobs-signature"),
             html.Hr(style={'align-self':'stretch'}),
             plot_container
         ],
@@ -0,0 +1,88 @@
+"""Generates the list of processing jobs shown below the `Process All` button"""
+
+from typing import List
+
+from dash import html  # type: ignore
+
+from campaign.jobs import ProcessingJob
+
+STATUS_LABELS = {
+    "QUEUED": ("Queued", "text-info"),
+    "RUNNING": ("Running", "text-warning"),
+    "FINISHED": ("Finished", "text-success"),
+    "FAILED": ("Failed", "text-danger"),
+    "CANCELLED": ("Cancelled", "text-secondary"),
+}
+"""Label and CSS class of each job status"""
+
+
+def format_duration(seconds: float) -> str:
+    """Formats the duration as m:ss"""
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def get_job_signature(jobs: List[ProcessingJob]) -> List:
+    """Returns everything that is shown about the jobs, the list is rendered again only when this changes"""
+    return [
+        [job.job_id, job.status, job.done, job.total, int(job.elapsed())] for job in jobs
+    ]
+
+
+def get_job_description(job: ProcessingJob) -> str:
+    """Returns the progress, elapsed and remaining time of the job"""
+    if job.status == "QUEUED":
+        return "waiting for the previous jobs"
+
+    if job.status != "RUNNING":
+        return f"{job.message} ({format_duration(job.elapsed())})"
+
+    if job.total is None:
+        description = "checking which chromatograms must be processed"
+    elif job.done < job.total:
+        description = f"{job.done} / {job.total} chromatograms processed"
+    else:
+        description = "matching the compounds"
+    description += f", elapsed {format_duration(job.elapsed())}"
+
+    eta = job.eta()
+    if eta is not None and job.total is not None and job.done < job.total:
+        description += f", remaining ~{format_duration(eta)}"
+    return description
+
+
+def get_jobs_layout(jobs: List[ProcessingJob]) -> List:
+    """Creates one row for each job - status, progress bar and button for cancelling the job"""
+    rows = []
+    for job in reversed(jobs):
+        label, label_class = STATUS_LABELS[job.status]
+
+        row = [
+            html.Span(f"Job #{job.job_id}", className="fw-bold me-2"),
+            html.Span(label, className=f"{label_class} me-2"),
+            html.Span(get_job_description(job), className="me-2"),
+        ]
+        if job.status in ["QUEUED", "RUNNING"]:
+            row.append(
+                html.Button(
+                    "Cancel",
+                    id={"type": "process-button-cancel-job", "index": job.job_id},
+                    className="btn btn-outline-danger btn-sm",
+                )
+            )
+        rows.append(html.Div(row, className="mt-2"))
+
+        if job.status == "RUNNING":
+            percent = 100 * job.done / job.total if job.total else 0
+            rows.append(
+                html.Div(
+                    html.Div(
+                        className="progress-bar progress-bar-striped progress-bar-animated",
+                        style={"width": f"{percent:.0f}%"},
+                    ),
+                    className="progress mt-1",
+                    style={"width": "100%"},
+                )
+            )
+
+    return rows
@@ -1,13 +1,21 @@
 from typing import Any
 
+import copy
+
 from dash import dcc  # type: ignore
 
 from mocca2 import MoccaDataset
 from mocca2.dataset.settings import ProcessingSettings
 
+from app import PREVIEW_CACHE_MB
 import cache
+from campaign.processing import get_data_hash, get_settings_hash, process_campaign
+from pages.figures import estimate_figure_size
 from pages.process.layout_chrom_preview import visualize_chromatogram
 
+_previews = cache.LRUCache(PREVIEW_CACHE_MB * 2**20)
+"""Previews of processed samples [(data hash, settings hash) -> dcc.Graph], shared by all sessions"""
+
 
 def process_single(settings: ProcessingSettings, sample_idx: int | None) -> str | Any:
     """Processes single sample. Either returns error message (string), or html elements with visualized data."""
@@ -16,18 +24,27 @@ def process_single(settings: ProcessingSettings, sample_idx: int | None) -> str
         return "Please select which sample should be analysed!"
     sample_idx = int(sample_idx)
 
+    # the preview depends only on the raw data and the settings, e.g. not on the name of the sample
+    raw = cache.get_raw_2d_data(sample_idx)
+    key = (get_data_hash(raw), get_settings_hash(settings))
+    preview = _previews.get(key)
+    if preview is not None:
+        return preview
+
     # create test campaign
+    # processing only replaces the data and peaks of the chromatogram, so the stored one is not modified by it
     test_campaign = MoccaDataset()
-    current_campaign = cache.get_campaign()
-    sample = current_campaign.chromatograms[sample_idx]
+    sample = copy.copy(cache.get_chromatogram(sample_idx))
     test_campaign.chromatograms[0] = sample
-    test_campaign._raw_2d_data[0] = current_campaign._raw_2d_data[sample_idx]
+    test_campaign._raw_2d_data[0] = raw
 
-    # process the test campaign
-    test_campaign.process_all(settings)
+    # process the test campaign, the intermediate results are cached for the next previews
+    process_campaign(test_campaign, settings, workers=1)
 
     # create the plots
-    chromatogram_plot, chromatogram_config = visualize_chromatogram(test_campaign, 0)
-    chromatogram_plot = dcc.Graph(figure=chromatogram_plot, config=chromatogram_config)
+    figure, chromatogram_config = visualize_chromatogram(test_campaign, 0)
+    chromatogram_plot = dcc.Graph(figure=figure, config=chromatogram_config)
+
+    _previews.put(key, chromatogram_plot, estimate_figure_size(figure))
 
     return chromatogram_plot
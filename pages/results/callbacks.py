@@ -15,7 +15,7 @@ import cache
 def render_content(tab):
     """When tab is selected, renders the relevant content"""
 
-    if len(cache.get_campaign().chromatograms) == 0:
+    if len(cache.get_chromatogram_names()) == 0:
         return "There aren't any chromatograms in the current campaign"
 
     if tab == 'chromatograms':
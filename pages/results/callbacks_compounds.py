@@ -28,21 +28,16 @@ def change_compound_callback(compound):
 def rename_compounds(data):
     """Changes the names of the compounds"""
     
-    current_campaign = cache.get_campaign()
-
     for row in data:
-        current_campaign.compounds[int(row['ID'])].name = row['Compound']
-    
-    cache.set_campaign(current_campaign)
+        cache.update_compound_name(int(row['ID']), row['Compound'])
 
-    return {idx: comp.name for idx, comp in current_campaign.compounds.items()}
+    return {idx: comp.name for idx, comp in cache.get_compounds().items()}
 
+@cache.memoize_per_campaign_version
 def create_figure(compound: int) -> Dict:
     """Creates the figure showing absorption spectrum of given compound"""
-    current_campaign = cache.get_campaign()
-
-    wl = np.array(current_campaign.wavelength())
-    absorbance = current_campaign.compounds[compound].spectrum
+    wl = np.array(cache.get_wavelength_axis())
+    absorbance = cache.get_compound(compound).spectrum
 
     fig = go.Figure()
 
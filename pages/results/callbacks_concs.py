@@ -51,6 +51,7 @@ def update_area_percent_table(_, wavelength):
 
     return rows, cols, f"Area % at {wl:0.0f} nm"
 
+@cache.memoize_per_campaign_version
 def get_area_perc_dataframe(wavelength: float) -> Tuple[pd.DataFrame, float]:
     """Returns the area % data to be displayed and the actual wavelength"""
 
@@ -64,6 +65,7 @@ def get_area_perc_dataframe(wavelength: float) -> Tuple[pd.DataFrame, float]:
 
 ### CONCENTRATIONS - ABSOLUTE
 
+@cache.memoize_per_campaign_version
 def get_concs_abs_dataframe() -> pd.DataFrame:
     """Returns the absolute concentration data to be displayed"""
 
@@ -76,6 +78,7 @@ def get_concs_abs_dataframe() -> pd.DataFrame:
 
 ### CONCENTRATIONS - ISTD
 
+@cache.memoize_per_campaign_version
 def get_concs_istd_dataframe() -> pd.DataFrame:
     """Returns the concentrations relative to ISTD to be displayed"""
 
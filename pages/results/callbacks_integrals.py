@@ -34,6 +34,7 @@ def get_columns(df: pd.DataFrame, decimals: int = 1) -> List[Dict[str, Any]]:
 
 ### CONCENTRATIONS - ABSOLUTE
 
+@cache.memoize_per_campaign_version
 def get_integrals_dataframe() -> pd.DataFrame:
     """Returns the absolute concentration data to be displayed"""
 
@@ -46,6 +47,7 @@ def get_integrals_dataframe() -> pd.DataFrame:
 
 ### CONCENTRATIONS - ISTD
 
+@cache.memoize_per_campaign_version
 def get_rel_integrals_dataframe() -> pd.DataFrame:
     """Returns the concentrations relative to ISTD to be displayed"""
 
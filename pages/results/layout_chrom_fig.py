@@ -9,9 +9,11 @@ from plotly.subplots import make_subplots  # type: ignore
 from plotly.express.colors import hex_to_rgb, qualitative as plotly_colors # type: ignore
 
 from mocca2.classes import Peak, DeconvolvedPeak, Compound
-from mocca2 import MoccaDataset
+from mocca2 import Chromatogram
 
+from app import FIGURE_CACHE_MB
 import cache
+from pages.figures import estimate_figure_size
 
 # Indeces of the subplots, this is solely for readability
 subplots = dict(
@@ -26,18 +28,76 @@ subplots = dict(
     vline_chromatogram=3
 )
 
+_figures = cache.LRUCache(FIGURE_CACHE_MB * 2**20)
+"""Figures of the chromatograms [(session ID, campaign version, chromatogram ID) -> figure], shared by all sessions"""
+
 
 def create_figure(only_figure: bool = True) -> html.Div:
     """Creates interactive plotly figure that shows DAD data. Returns a Dash html.Div element"""
 
-    current_campaign = cache.get_campaign()
     chromatogram_id = cache.get_displayed_chromatogram()
+    fig = _get_plotly_figure(chromatogram_id)
+
+    if only_figure:
+        return fig
+
+    data = cache.get_chromatogram(chromatogram_id).data
+    
+    # Create html.Div element
+    chromatogram_div = html.Div([
+        html.Div(
+            children=[
+                html.Label("Contrast:"),
+                dcc.Slider(
+                    np.min(data), np.max(data),
+                    marks=None,
+                    value=np.max(data),
+                    id='slider-chromatogram-limits',
+                    className="py-0 pr-0 pl-2"
+                )
+            ],
+            style={
+                'display': 'grid',
+                'grid-template-columns': 'auto 1fr',
+                'align-items': 'center',
+                'column-gap': '2ch',
+            }
+        ),
+        dcc.Graph(
+            figure=fig,
+            style={'height': '100%', 'width': '100%'},
+            id="results-figure-chromatogram",
+            config={'displayModeBar': False}
+        ),
+
+    ],
+        style={'height': '70vh', 'width': '100%'}
+    )
+
+    return chromatogram_div
+
+
+def _get_plotly_figure(chromatogram_id: int) -> go.Figure:
+    """Returns the plotly figure with DAD data of given chromatogram, the figure is reused until the campaign changes"""
+    key = (cache.get_session_id(), cache.get_campaign_version(), chromatogram_id)
+    fig = _figures.get(key)
+    if fig is None:
+        fig = _create_plotly_figure(chromatogram_id)
+        _figures.put(key, fig, estimate_figure_size(fig))
+    return fig
+
+
+def _create_plotly_figure(chromatogram_id: int) -> go.Figure:
+    """Creates the plotly figure with DAD data of given chromatogram"""
+
+    current_chromatogram = cache.get_chromatogram(chromatogram_id)
+    compounds = cache.get_compounds()
 
-    time = current_campaign.time()
-    wavelength = current_campaign.wavelength()
+    time = cache.get_time_axis()
+    wavelength = cache.get_wavelength_axis()
     assert time is not None and wavelength is not None
-    data = current_campaign.chromatograms[chromatogram_id].data
-    peaks = current_campaign.chromatograms[chromatogram_id].peaks
+    data = current_chromatogram.data
+    peaks = current_chromatogram.peaks
 
     # Find highest peak for initializing corss-section
     max_wl_idx, max_t_idx = np.unravel_index(np.argmax(data), data.shape)
@@ -93,10 +153,10 @@ def create_figure(only_figure: bool = True) -> html.Div:
     fig.add_vline(row=2, col=1, x=max_t, line_color="red", **line_style)
 
     # Add peak annotations
-    fig = add_peak_annotations(fig, peaks, current_campaign.compounds)
+    fig = add_peak_annotations(fig, peaks, compounds)
 
     # Add component traces
-    create_component_traces(fig, current_campaign, max_wl_idx, current_campaign.compounds)
+    create_component_traces(fig, current_chromatogram, max_wl_idx, compounds)
 
     # General layout settings
     fig.update_layout(
@@ -135,49 +195,13 @@ def create_figure(only_figure: bool = True) -> html.Div:
                      title="Wavelength [nm]", side="right", showticklabels=True)
 
 
-    if only_figure:
-        return fig
-    
-    # Create html.Div element
-    chromatogram_div = html.Div([
-        html.Div(
-            children=[
-                html.Label("Contrast:"),
-                dcc.Slider(
-                    np.min(data), np.max(data),
-                    marks=None,
-                    value=np.max(data),
-                    id='slider-chromatogram-limits',
-                    className="py-0 pr-0 pl-2"
-                )
-            ],
-            style={
-                'display': 'grid',
-                'grid-template-columns': 'auto 1fr',
-                'align-items': 'center',
-                'column-gap': '2ch',
-            }
-        ),
-        dcc.Graph(
-            figure=fig,
-            style={'height': '100%', 'width': '100%'},
-            id="results-figure-chromatogram",
-            config={'displayModeBar': False}
-        ),
-
-    ],
-        style={'height': '70vh', 'width': '100%'}
-    )
-
-    return chromatogram_div
+    return fig
 
 
-def update_wl(fig, wl_idx, current_campaign: MoccaDataset):
+def update_wl(fig, wl_idx, chromatogram: Chromatogram):
     """Updates the position of the cross-section line on the wavelenght axis"""
-    chr_id = cache.get_displayed_chromatogram()
-
-    data = current_campaign.chromatograms[chr_id].data
-    wavelength = current_campaign.wavelength()
+    data = chromatogram.data
+    wavelength = cache.get_wavelength_axis()
     assert wavelength is not None
 
     fig['data'][subplots['chromatogram']]['y'] = data[wl_idx]
@@ -186,14 +210,10 @@ def update_wl(fig, wl_idx, current_campaign: MoccaDataset):
     fig['layout']['shapes'][subplots['hline_spectrum']]['y0'] = wavelength[wl_idx]
     fig['layout']['shapes'][subplots['hline_spectrum']]['y1'] = wavelength[wl_idx]
 
-    peaks = current_campaign.chromatograms[chr_id].peaks
-    time = current_campaign.time()
-    assert time is not None
-
     trace_idx = 2
-    for peak in peaks:
+    for peak in chromatogram.peaks:
         for component in peak.components:
-            compound = current_campaign.compounds[component.compound_id]
+            compound = cache.get_compound(component.compound_id)
             if compound.name == '#ignore':
                 continue
             trace_idx += 1
@@ -202,12 +222,10 @@ def update_wl(fig, wl_idx, current_campaign: MoccaDataset):
     return fig
 
 
-def update_time(fig, t_idx, current_campaign: MoccaDataset):
+def update_time(fig, t_idx, chromatogram: Chromatogram):
     """Updates the position of the cross-section line on the wavelenght axis"""
-    chr_id = cache.get_displayed_chromatogram()
-
-    data = current_campaign.chromatograms[chr_id].data
-    time = current_campaign.time()
+    data = chromatogram.data
+    time = cache.get_time_axis()
     assert time is not None
 
     fig['data'][subplots['spectrum']]['x'] = data[:, t_idx]
@@ -220,9 +238,7 @@ def update_time(fig, t_idx, current_campaign: MoccaDataset):
 
 def add_peak_annotations(fig: go.Figure, peaks: List[Peak | DeconvolvedPeak], compounds: Dict[int, Compound], shapes: bool = True) -> go.Figure:
     """Adds rectangles and peaks names to the chromatogram subplot"""
-    current_campaign = cache.get_campaign()
-
-    time = current_campaign.time()
+    time = cache.get_time_axis()
     assert time is not None
 
     for peak in peaks:
@@ -275,22 +291,19 @@ def add_peak_annotations(fig: go.Figure, peaks: List[Peak | DeconvolvedPeak], co
 
     return fig
 
-def create_component_traces(fig: go.Figure, current_campaign: MoccaDataset, wl_idx: int, compounds: Dict[int, Compound]):
+def create_component_traces(fig: go.Figure, chromatogram: Chromatogram, wl_idx: int, compounds: Dict[int, Compound]):
     """Creates traces that show concentrations of individual components"""
 
-    chr_id = cache.get_displayed_chromatogram()
-
-    peaks = current_campaign.chromatograms[chr_id].peaks
-    time = current_campaign.time()
+    time = cache.get_time_axis()
     assert time is not None
 
-    for peak in peaks:
+    for peak in chromatogram.peaks:
         peak_time = peak.time(time)
         for idx, component in enumerate(peak.components):
             if compounds[component.compound_id].name == '#ignore':
                 continue
 
-            compound = current_campaign.compounds[component.compound_id]
+            compound = compounds[component.compound_id]
 
             color = plotly_colors.Alphabet[component.compound_id % len(plotly_colors.Alphabet)]
 
@@ -321,12 +334,12 @@ def click(clickData):
     # Using patch, only relevant data are updated, instead of passing entire figure back and forth
     fig = Patch()
 
-    current_campaign = cache.get_campaign()
+    chromatogram = cache.get_chromatogram(cache.get_displayed_chromatogram())
 
     subplot = clickData['points'][0]['curveNumber']
     t, wl = [clickData["points"][0][k] for k in ["x", "y"]]
-    t_idx, t = current_campaign.closest_time(t)
-    wl_idx, wl = current_campaign.closest_wavelength(wl)
+    t_idx, t = chromatogram.closest_time(t)
+    wl_idx, wl = chromatogram.closest_wavelength(wl)
 
     fig['layout']['annotations'] = [dict(
         font=dict(color='yellow', size=10),
@@ -342,19 +355,18 @@ def click(clickData):
 
     add_peak_annotations(
         fig,
-        current_campaign.chromatograms[cache.get_displayed_chromatogram(
-        )].peaks,
-        current_campaign.compounds,
+        chromatogram.peaks,
+        cache.get_compounds(),
         shapes=False
     )
 
     if subplot == subplots['heatmap']:
-        fig = update_wl(fig, wl_idx, current_campaign)
-        fig = update_time(fig, t_idx, current_campaign)
+        fig = update_wl(fig, wl_idx, chromatogram)
+        fig = update_time(fig, t_idx, chromatogram)
     elif subplot == subplots['chromatogram']:
-        fig = update_time(fig, t_idx, current_campaign)
+        fig = update_time(fig, t_idx, chromatogram)
     elif subplot == subplots['spectrum']:
-        fig = update_wl(fig, wl_idx, current_campaign)
+        fig = update_wl(fig, wl_idx, chromatogram)
 
     return fig
 
@@ -369,9 +381,7 @@ def update_heatmap_limits(limit):
     if limit is None:
         return Patch()
 
-    current_campaign = cache.get_campaign()
-    chr_id = cache.get_displayed_chromatogram()
-    data = current_campaign.chromatograms[chr_id].data
+    data = cache.get_chromatogram(cache.get_displayed_chromatogram()).data
 
     fig = Patch()
     fig['data'][subplots['heatmap']]['z'] = np.clip(data, None, limit)
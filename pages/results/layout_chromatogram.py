@@ -4,8 +4,7 @@ import cache
 from pages.results.layout_chrom_fig import create_figure
 
 def layout():
-    current_campaign = cache.get_campaign()
-    select_options = {idx: ch.name for idx, ch in current_campaign.chromatograms.items()}
+    select_options = cache.get_chromatogram_names()
     default = None if len(select_options) == 0 else list(select_options.keys())[0]
     cache.set_displayed_chromatogram(default)
 
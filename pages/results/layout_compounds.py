@@ -3,19 +3,18 @@ import pandas as pd # type: ignore
 
 import cache
 
+@cache.memoize_per_campaign_version
 def create_table() -> pd.DataFrame:
     """Creates dataframe with summary of all compounds"""
-    current_campaign = cache.get_campaign()
-
-    time = current_campaign.time()
-    wavelength = current_campaign.wavelength()
+    time = cache.get_time_axis()
+    wavelength = cache.get_wavelength_axis()
     assert time is not None and wavelength is not None
     names = []
     elution_time = []
     maxima = []
     ids = []
 
-    for compound_id, compound in current_campaign.compounds.items():
+    for compound_id, compound in cache.get_compounds().items():
         ids += [compound_id]
         names += [compound.name]
         elution_time += [time[compound.elution_time]]
@@ -38,7 +37,7 @@ def create_table() -> pd.DataFrame:
 def layout():
     """Returns layout for the results tab with compounds"""
 
-    compounds = cache.get_campaign().compounds
+    compounds = cache.get_compounds()
     if len(compounds) == 0:
         return "There aren't any compounds data to be shown!"
 
@@ -89,7 +89,7 @@ def layout_conc():
 
 
 def layout_conc_istd():
-    if cache.get_campaign().istd_compound is None:
+    if cache.get_campaign_metadata().istd_compound is None:
         return """The current campaign does not have any internal standard!"""
     df = callbacks_concs.get_concs_istd_dataframe()
     cols = callbacks_concs.get_columns(df, 1)
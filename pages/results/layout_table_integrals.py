@@ -39,7 +39,7 @@ def layout_integrals():
 
 
 def layout_rel_integrals():
-    if cache.get_campaign().istd_compound is None:
+    if cache.get_campaign_metadata().istd_compound is None:
         return """The current campaign does not have any internal standard!"""
     df = callbacks_integrals.get_rel_integrals_dataframe()
     cols = callbacks_integrals.get_columns(df, 1)
@@ -0,0 +1,61 @@
+"""Tests of aligning the time axes of new chromatograms (`campaign.alignment`)"""
+
+import warnings
+
+import numpy as np
+from mocca2.classes import Data2D
+
+import app
+from campaign.alignment import align_time
+
+
+def random_data(time, n_wavelengths: int, seed: int) -> Data2D:
+    rng = np.random.default_rng(seed)
+    wavelength = np.linspace(200, 400, n_wavelengths)
+    return Data2D(time, wavelength, rng.random((n_wavelengths, len(time))))
+
+
+def test_same_as_interpolate_time_of_mocca2():
+    reference = np.linspace(0, 10, 101)
+    # shifted and sparser grids, also with time points outside of the reference
+    grids = [np.linspace(0.05, 10.05, 101), np.linspace(-1, 11, 37), np.linspace(0, 10, 101)]
+    # the wavelength counts differ, so the samples cannot be stacked into one group
+    parsed = [random_data(time, n_wavelengths, seed) for seed, time in enumerate(grids) for n_wavelengths in [5, 8]]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        aligned = align_time(parsed, reference)
+
+    assert len(aligned) == len(parsed)
+    for data, result in zip(parsed, aligned):
+        expected = data.interpolate_time(reference)
+        assert np.array_equal(result.time, reference)
+        assert np.array_equal(result.wavelength, data.wavelength)
+        assert result.data.shape == expected.data.shape
+        assert np.allclose(result.data, expected.data, rtol=0, atol=1e-12)
+
+    # data with the reference sampling are not copied
+    assert aligned[4] is parsed[4] and aligned[5] is parsed[5]
+
+
+def test_first_chromatogram_is_reference():
+    parsed = [random_data(np.linspace(0, 1, 11), 3, 0), random_data(np.linspace(0, 1, 21), 3, 1)]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        aligned = align_time(parsed)
+
+    assert aligned[0] is parsed[0]
+    assert np.allclose(aligned[1].data, parsed[1].interpolate_time(parsed[0].time).data, rtol=0, atol=1e-12)
+
+
+def test_single_time_point_is_repeated():
+    # `interp1d` needs at least two points, the only value is used for all time points
+    reference = np.linspace(0, 1, 4)
+    data = random_data(np.array([0.5]), 3, 0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        [aligned] = align_time([data], reference)
+
+    assert np.array_equal(aligned.data, np.repeat(data.data, 4, axis=1))
@@ -0,0 +1,87 @@
+"""Tests of building the campaign from the upload table on the Data page (`campaign.builder`)"""
+
+import os
+import uuid
+
+import numpy as np
+
+import app
+import cache
+from campaign.builder import campaign_from_table
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example_data")
+CALIBRATION_DIR = os.path.join(EXAMPLE_DIR, "calibration")
+BLANK = "2022-03-24_12-08-57_050_grad.csv"
+SAMPLES = ["2022-03-24_12-25-03_050_ba_100.csv", "2022-03-24_13-40-18_050_ome_100.csv", "2022-03-24_14-55-31_050_nme2_100.csv"]
+
+
+def new_row(sample: str, blank_id: int) -> dict:
+    file_id = cache.register_file(os.path.join(CALIBRATION_DIR, sample))
+    return dict(
+        chromatogram_id=None,
+        sample_id=file_id,
+        blank_id=blank_id,
+        name=os.path.splitext(sample)[0],
+        compound_name="",
+        compound_conc="",
+        istd_conc="",
+    )
+
+
+def current_rows() -> list:
+    """Rows of the table for the chromatograms in the current campaign, without any compounds"""
+    return [
+        dict(chromatogram_id=idx, sample_id=None, blank_id=None, name=name, compound_name="", compound_conc="", istd_conc="")
+        for idx, name in cache.get_chromatogram_names().items()
+    ]
+
+
+def test_changes_of_the_table_are_applied(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache.init()
+
+    with cache.session_scope(uuid.uuid4().hex):
+        blank_id = cache.register_file(os.path.join(CALIBRATION_DIR, BLANK))
+
+        # every sample needs the blank, but it is parsed only once
+        saved = campaign_from_table([new_row(sample, blank_id) for sample in SAMPLES])
+        assert saved == len(SAMPLES) - 1
+        names = cache.get_chromatogram_names()
+        assert names == {i: os.path.splitext(sample)[0] for i, sample in enumerate(SAMPLES)}
+        version = cache.get_campaign_version()
+
+        # nothing changed, the campaign is not stored again
+        assert campaign_from_table(current_rows()) == 0
+        assert cache.get_campaign_version() == version
+
+        # renaming keeps the data of the chromatogram
+        raw = cache.get_raw_2d_data(1)
+        rows = current_rows()
+        rows[1]["name"] = "renamed"
+        campaign_from_table(rows)
+        assert cache.get_chromatogram_names()[1] == "renamed"
+        assert cache.get_raw_2d_data(1) is raw
+        assert cache.get_campaign_version() > version
+
+        # metadata of the chromatograms are taken from the table
+        rows = current_rows()
+        rows[0].update(compound_name="ba", compound_conc="1.5", istd_conc="0.5")
+        campaign_from_table(rows)
+        metadata = cache.get_campaign_metadata()
+        assert metadata.compound_references == {0: ("ba", 1.5)}
+        assert metadata.istd_concentrations == {0: 0.5}
+        assert cache.get_raw_2d_data(0) is not None
+
+        # removed row is removed from the campaign
+        rows = [row for row in current_rows() if row["chromatogram_id"] != 0]
+        campaign_from_table(rows)
+        assert list(cache.get_chromatogram_names()) == [1, 2]
+        assert cache.get_campaign_metadata().compound_references == {}
+
+        # new row gets the freed ID, the parsed data are loaded from the cache folder
+        rows = current_rows() + [new_row(SAMPLES[0], blank_id)]
+        assert campaign_from_table(rows) == 0
+        names = cache.get_chromatogram_names()
+        assert names[0] == os.path.splitext(SAMPLES[0])[0]
+        assert sorted(names) == [0, 1, 2]
+        assert np.array_equal(cache.get_time_axis(), cache.get_chromatogram(1).time)
@@ -0,0 +1,35 @@
+"""Tests of the index of cached files (`cache.files`)"""
+
+import pytest
+
+import app
+import cache
+from cache import files
+
+
+def test_index_survives_restart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache.init()
+
+    first, first_path = cache.add_cached_file("sample.csv", "a" * 64)
+    second, second_path = cache.add_cached_file("sample.csv", "b" * 64)
+    blank, blank_path = cache.add_cached_file("blank.csv")
+    assert len({first, second, blank}) == 3
+    # files with same extension and different content don't share the path
+    assert first_path != second_path
+
+    # the index is opened again, e.g. after restart of the server
+    files.init()
+
+    assert cache.get_cached_file(blank) == cache.CachedFile(blank, "blank.csv", blank_path, None)
+    assert cache.get_cached_files_by_name("sample.csv") == [
+        cache.CachedFile(first, "sample.csv", first_path, "a" * 64),
+        cache.CachedFile(second, "sample.csv", second_path, "b" * 64),
+    ]
+    assert cache.get_cached_files_by_name("missing.csv") == []
+    with pytest.raises(KeyError):
+        cache.get_cached_file(blank + 1)
+
+    # IDs are not reused after restart
+    new, _ = cache.add_cached_file("sample.csv", "a" * 64)
+    assert new > blank
@@ -0,0 +1,101 @@
+"""Tests of saving and loading campaigns as .mocca2 files (`campaign.pickling`)"""
+
+import zipfile
+
+import numpy as np
+from mocca2 import MoccaDataset, Chromatogram
+from mocca2.classes import Data2D
+
+import app
+from campaign import pickling
+
+
+def create_campaign() -> MoccaDataset:
+    rng = np.random.default_rng(0)
+    time = np.linspace(0, 10, 51)
+    wavelength = np.linspace(200, 400, 7)
+
+    camp = MoccaDataset()
+    for name in ["sample 1", "sample 2", "sample 3"]:
+        chromatogram = Chromatogram(Data2D(time, wavelength, rng.random((7, 51))), name=name)
+        camp.add_chromatogram(chromatogram, reference_for_compound="product", compound_concentration=1.5)
+    return camp
+
+
+def assert_same_data(loaded: MoccaDataset, original: MoccaDataset, atol: float, axes_atol: float = 0):
+    assert list(loaded.chromatograms) == list(original.chromatograms)
+    assert loaded.compound_references == original.compound_references
+    for idx, chromatogram in original.chromatograms.items():
+        assert loaded.chromatograms[idx].name == chromatogram.name
+        for result, expected in [
+            (loaded.chromatograms[idx], chromatogram),
+            (loaded._raw_2d_data[idx], original._raw_2d_data[idx]),
+        ]:
+            assert np.allclose(result.time, expected.time, rtol=0, atol=axes_atol)
+            assert np.allclose(result.wavelength, expected.wavelength, rtol=0, atol=axes_atol)
+            assert np.allclose(result.data, expected.data, rtol=0, atol=atol)
+
+
+def test_version_2_round_trip(tmp_path):
+    camp = create_campaign()
+    path = str(tmp_path / "campaign.mocca2")
+    pickling.dump_campaign(camp, path)
+
+    assert zipfile.is_zipfile(path)
+    loaded = pickling.load_campaign(path)
+    # the absorbances are stored as float32
+    assert_same_data(loaded, camp, atol=1e-7)
+
+    # the chromatogram and its raw data share one array, which is stored once
+    assert loaded.chromatograms[0].data is loaded._raw_2d_data[0].data
+
+
+def test_lossless_round_trip(tmp_path):
+    camp = create_campaign()
+    path = str(tmp_path / "campaign.mocca2")
+    pickling.dump_campaign(camp, path, lossless=True)
+
+    loaded = pickling.load_campaign(path)
+    assert_same_data(loaded, camp, atol=0)
+    assert loaded.chromatograms[0].data.dtype == camp.chromatograms[0].data.dtype
+
+
+def test_version_1_is_loaded(tmp_path):
+    camp = create_campaign()
+    path = str(tmp_path / "campaign.mocca2")
+    pickling.dump_campaign_v1(camp, path)
+
+    assert not zipfile.is_zipfile(path)
+    # the floats are rounded to 7 decimal places, also the time
+    assert_same_data(pickling.load_campaign(path), camp, atol=1e-7, axes_atol=1e-7)
+
+
+def test_lazy_campaign_is_loaded_on_access_and_can_be_dumped(tmp_path):
+    camp = create_campaign()
+    path = str(tmp_path / "campaign.mocca2")
+    pickling.dump_campaign(camp, path)
+
+    loaded = pickling.load_campaign(path, lazy=True)
+
+    def is_archived(data: Data2D) -> bool:
+        return isinstance(data.__dict__["data"], pickling.ArchivedArray)
+
+    assert all(isinstance(c, pickling.LazyChromatogram) for c in loaded.chromatograms.values())
+    assert all(isinstance(d, pickling.LazyData2D) for d in loaded._raw_2d_data.values())
+    assert all(is_archived(c) for c in loaded.chromatograms.values())
+    assert all(is_archived(d) for d in loaded._raw_2d_data.values())
+    # the axes and metadata are available without loading the absorbances
+    assert loaded.chromatograms[1].name == "sample 2"
+    assert np.array_equal(loaded.chromatograms[1].time, camp.chromatograms[1].time)
+    assert is_archived(loaded.chromatograms[1])
+
+    assert np.allclose(loaded.chromatograms[1].data, camp.chromatograms[1].data, rtol=0, atol=1e-7)
+    assert not is_archived(loaded.chromatograms[1])
+    # the shared array is read only once
+    assert loaded._raw_2d_data[1].data is loaded.chromatograms[1].data
+    assert is_archived(loaded.chromatograms[0]) and is_archived(loaded.chromatograms[2])
+
+    # the lazy campaign is saved again, e.g. when it is downloaded
+    dumped_path = str(tmp_path / "dumped.mocca2")
+    pickling.dump_campaign(loaded, dumped_path)
+    assert_same_data(pickling.load_campaign(dumped_path), camp, atol=1e-7)
@@ -0,0 +1,61 @@
+"""Tests of evicting idle sessions and restoring them from the snapshots (`cache.sessions`)"""
+
+import os
+
+import numpy as np
+from mocca2 import MoccaDataset, Chromatogram
+from mocca2.dataset.settings import ProcessingSettings
+
+import app
+import cache
+from cache import sessions
+from campaign.processing import process_campaign, get_fingerprint, is_processed
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example_data")
+
+
+def test_restored_session_is_same_as_evicted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sessions, "SESSIONS_DIR", str(tmp_path / "sessions"))
+    cache.init()
+
+    # one chromatogram is enough and is processed quickly
+    path = os.path.join(EXAMPLE_DIR, "calibration", "2022-03-24_12-08-57_050_grad.csv")
+    camp = MoccaDataset()
+    camp.add_chromatogram(Chromatogram(sample=path, name="grad"))
+    settings = ProcessingSettings()
+    process_campaign(camp, settings, workers=1)
+
+    @cache.memoize_per_campaign_version
+    def count_chromatograms() -> int:
+        return len(cache.get_chromatogram_names())
+
+    session_id = "0" * 32
+    with cache.session_scope(session_id):
+        sessions.touch(session_id)
+        cache.set_campaign(camp)
+        version = cache.get_campaign_version()
+        before = cache.get_campaign()
+        assert count_chromatograms() == 1
+
+    assert sessions._evict(session_id) > 0
+    assert sessions._sessions[session_id].snapshot_path is not None
+    # the memoized results of the evicted session are released too
+    assert all(session_id not in memos for memos in cache.memoize._memos)
+
+    with cache.session_scope(session_id):
+        sessions.touch(session_id)
+        after = cache.get_campaign()
+        assert cache.get_campaign_version() == version
+
+    assert sessions._sessions[session_id].snapshot_path is None
+    for idx, chromatogram in before.chromatograms.items():
+        raw = after._raw_2d_data[idx]
+        assert raw.data.dtype == before._raw_2d_data[idx].data.dtype
+        assert np.array_equal(raw.data, before._raw_2d_data[idx].data)
+        assert raw._data_hash == before._raw_2d_data[idx]._data_hash
+        # the restored chromatograms don't have to be processed again
+        assert is_processed(after.chromatograms[idx], get_fingerprint(raw, settings))
+        restored, deconvolution = after.chromatograms[idx]._deconvolution, chromatogram._deconvolution
+        assert restored.fingerprint == deconvolution.fingerprint
+        assert [p.to_dict() for p in restored.peaks] == [p.to_dict() for p in deconvolution.peaks]
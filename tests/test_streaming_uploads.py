@@ -0,0 +1,95 @@
+"""Tests of uploading files in chunks (`cache.streaming_uploads`)"""
+
+import hashlib
+import os
+
+import pytest
+
+import app
+import cache
+from cache import streaming_uploads
+import pages.base_layout
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache.init()
+    # dash checks the layout before the first request
+    app.app.layout = pages.base_layout.get_layout()
+    return app.server.test_client()
+
+
+def start(client, name: str, size: int) -> str:
+    response = client.post("/upload/start", json={"name": name, "size": size})
+    assert response.status_code == 200
+    return response.get_json()["upload_id"]
+
+
+def test_resent_chunk_is_not_appended_twice(client):
+    content = b"time,absorbance\n" * 100
+    upload_id = start(client, "sample.csv", len(content))
+
+    response = client.put(f"/upload/{upload_id}?offset=0", data=content[:1000])
+    assert response.status_code == 200
+    assert response.get_json()["received"] == 1000
+
+    # the response got lost and the browser sends the same chunk again, it continues from the returned offset
+    response = client.put(f"/upload/{upload_id}?offset=0", data=content[:1000])
+    assert response.status_code == 409
+    assert response.get_json()["received"] == 1000
+
+    response = client.put(f"/upload/{upload_id}?offset=1000", data=content[1000:])
+    assert response.status_code == 200
+    assert client.get(f"/upload/{upload_id}").get_json()["received"] == len(content)
+
+    response = client.post(f"/upload/{upload_id}/finish")
+    assert response.status_code == 200
+    file = cache.get_cached_file(response.get_json()["file_id"])
+    assert file.original_name == "sample.csv"
+    assert file.content_hash == hashlib.sha256(content).hexdigest()
+    with open(file.cached_path, "rb") as f:
+        assert f.read() == content
+
+    # the upload is finished only once
+    assert client.post(f"/upload/{upload_id}/finish").status_code == 404
+    assert os.listdir(streaming_uploads.UPLOADS_DIR) == []
+
+
+def test_incomplete_upload_cannot_be_finished(client):
+    upload_id = start(client, "sample.csv", 10)
+    client.put(f"/upload/{upload_id}?offset=0", data=b"12345")
+
+    assert client.post(f"/upload/{upload_id}/finish").status_code == 400
+
+    # the upload can still be completed
+    client.put(f"/upload/{upload_id}?offset=5", data=b"67890")
+    assert client.post(f"/upload/{upload_id}/finish").status_code == 200
+
+
+def test_stale_uploads_are_removed(client, monkeypatch):
+    stale_id = start(client, "stale.csv", 10)
+    client.put(f"/upload/{stale_id}?offset=0", data=b"12345")
+    stale_path = streaming_uploads._uploads[stale_id].path
+    assert os.path.exists(stale_path)
+
+    streaming_uploads._uploads[stale_id].last_activity -= streaming_uploads.UPLOAD_TIMEOUT + 1
+    active_id = start(client, "active.csv", 10)
+
+    assert not os.path.exists(stale_path)
+    assert client.get(f"/upload/{stale_id}").status_code == 404
+    assert client.get(f"/upload/{active_id}").status_code == 200
+
+
+def test_failed_store_removes_the_uploaded_file(client, monkeypatch):
+    upload_id = start(client, "sample.csv", 5)
+    client.put(f"/upload/{upload_id}?offset=0", data=b"12345")
+    path = streaming_uploads._uploads[upload_id].path
+
+    def store_uploaded_file(name, path, content_hash):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(streaming_uploads, "store_uploaded_file", store_uploaded_file)
+    assert client.post(f"/upload/{upload_id}/finish").status_code == 500
+
+    assert not os.path.exists(path)
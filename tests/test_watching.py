@@ -0,0 +1,39 @@
+"""Tests of watching a folder for new chromatograms (`campaign.watching`)"""
+
+import os
+import shutil
+
+import app
+import cache
+from campaign import watching
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example_data")
+
+
+def test_watch_relative_folder_inside_import_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache.init()
+
+    folder = os.path.join(app.IMPORT_ROOT, "run1")
+    os.makedirs(folder)
+    samples = sorted(os.listdir(os.path.join(EXAMPLE_DIR, "calibration")))[:2]
+    for name in samples:
+        shutil.copy(os.path.join(EXAMPLE_DIR, "calibration", name), folder)
+
+    # the folder is checked here instead of the background thread
+    monkeypatch.setattr(watching, "_watch", lambda watcher: None)
+    watching.start_watching("run1", "*.csv", None, False)
+    watcher = watching.get_watcher()
+    assert watcher is not None
+    assert watcher.folder == os.path.realpath(folder)
+
+    try:
+        # the files are added when their size did not change since the previous check
+        watching._check_folder(watcher)
+        watching._check_folder(watcher)
+    finally:
+        watching.stop_watching()
+
+    assert watcher.message_class == "text-success", watcher.message
+    assert len(watching.take_added_chromatograms(watcher)) == len(samples)
+    assert sorted(cache.get_chromatogram_names().values()) == [os.path.splitext(n)[0] for n in samples]
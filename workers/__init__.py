@@ -0,0 +1,28 @@
+"""
+Functions that run in the worker processes of the process pools.
+
+The worker processes import these modules in a fresh interpreter (e.g. on Windows), so they
+must not import `app`, `cache` or `campaign`, which import each other when they are initialized.
+"""
+
+import multiprocessing
+import sys
+import types
+
+MP_CONTEXT = multiprocessing.get_context("spawn")
+"""
+Context of all process pools.
+
+The server has many threads, forked workers would inherit the locks held by the other threads
+at the moment of the fork (e.g. the lock of the global variables) and could wait for them forever.
+"""
+
+
+def detach_main():
+    """
+    Replaces the `__main__` module by an empty one, so that the worker processes don't run the main script.
+
+    The spawned workers run the main script (or module) of the parent again, e.g. `app.py` would build
+    the whole application in every worker. Call it in the main script after its module-level code ran.
+    """
+    sys.modules["__main__"] = types.ModuleType("__main__")
@@ -0,0 +1,53 @@
+"""
+Parsing of the chromatograms, see `cache.parsed_data`.
+
+`parse_in_worker` runs in the worker processes of `cache.parsed_data.load_parsed_data_batch`.
+"""
+
+from typing import Dict, Tuple
+from numpy.typing import NDArray
+
+import os
+import threading
+
+import numpy as np
+
+from mocca2 import Chromatogram
+from mocca2.classes import Data2D
+
+
+def parse(
+    sample_path: str, blank: Data2D | None, interpolate_blank: bool, path: str
+) -> Tuple[NDArray, NDArray, NDArray]:
+    """
+    Parses the sample, subtracts the parsed blank and saves the result to `path`, returns time, wavelength and data.
+
+    Runs also in the worker processes of `cache.parsed_data.load_parsed_data_batch`.
+    """
+    parsed = Chromatogram(sample=sample_path, blank=blank, interpolate_blank=interpolate_blank)
+
+    # write to temporary file first, so that other threads never read incomplete file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, time=parsed.time, wavelength=parsed.wavelength, data=parsed.data)
+    os.replace(tmp_path, path)
+
+    return parsed.time, parsed.wavelength, parsed.data
+
+
+_worker_blanks: Dict[str, Data2D] = dict()
+"""Parsed blanks in the worker process [cached path -> data]"""
+
+
+def init_worker(blanks: Dict[str, Data2D]):
+    """Receives the parsed blanks in the worker process"""
+    global _worker_blanks
+    _worker_blanks = blanks
+
+
+def parse_in_worker(
+    sample_path: str, blank_path: str | None, interpolate_blank: bool, path: str
+) -> Tuple[NDArray, NDArray, NDArray]:
+    """Same as `parse`, the blank is taken from the blanks received by `init_worker`"""
+    blank = _worker_blanks[blank_path] if blank_path is not None else None
+    return parse(sample_path, blank, interpolate_blank, path)
@@ -0,0 +1,114 @@
+"""
+Stages of processing a single chromatogram, see `campaign.processing`.
+
+`run_stages` runs in the worker processes of `campaign.processing.process_campaign`.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import copy
+import threading
+
+import numpy as np
+
+from mocca2 import Chromatogram
+from mocca2.classes import Data2D
+from mocca2.dataset.settings import ProcessingSettings
+
+
+STAGES: Dict[str, List[str]] = {
+    "baseline": [
+        "min_wavelength",
+        "max_wavelength",
+        "baseline_model",
+        "baseline_smoothness",
+    ],
+    "peaks": [
+        "min_rel_prominence",
+        "min_prominence",
+        "border_max_peak_cutoff",
+        "split_threshold",
+        "min_elution_time",
+        "max_elution_time",
+    ],
+    "deconvolution": [
+        "peak_model",
+        "explained_threshold",
+        "relaxe_concs",
+        "max_peak_comps",
+    ],
+}
+"""Stages of `campaign.processing.process_chromatogram` and the settings that each stage adds to the settings of the previous stages"""
+
+
+_random_state_lock = threading.Lock()
+"""The deconvolution seeds the global random state of numpy, so only one thread can deconvolve at a time"""
+
+
+def run_stages(
+    raw: Data2D | None, settings: ProcessingSettings, cached: Dict[str, Any]
+) -> Tuple[Chromatogram, Dict[str, Any]]:
+    """
+    Runs the stages of `campaign.processing.process_chromatogram` that are not in `cached`.
+
+    Returns the processed chromatogram and the results of the stages that were run.
+    `raw` is needed only if the baseline is not cached. Runs also in the worker processes of
+    `campaign.processing.process_campaign`.
+    """
+    results: Dict[str, Any] = {}
+
+    if "baseline" in cached:
+        baseline = cached["baseline"]
+        chromatogram = Chromatogram(Data2D(baseline.time, baseline.wavelength, baseline.data))
+    else:
+        assert raw is not None
+        cropped = raw.extract_wavelength(settings.min_wavelength, settings.max_wavelength)
+
+        # the baseline is corrected in place, so the cropped data must not be a view of the raw data
+        chromatogram = Chromatogram(
+            Data2D(cropped.time, cropped.wavelength, np.array(cropped.data, dtype=np.float64, order="C"))
+        )
+
+        n_wavelengths = len(chromatogram.wavelength)
+        chromatogram.correct_baseline(
+            method=settings.baseline_model,
+            smoothness=settings.baseline_smoothness,
+            smooth_wl=max(n_wavelengths // 20, 4) if n_wavelengths >= 4 else None,
+        )
+        results["baseline"] = Data2D(chromatogram.time, chromatogram.wavelength, chromatogram.data)
+
+    if "deconvolution" in cached:
+        chromatogram.peaks = cached["deconvolution"]
+        return chromatogram, results
+
+    if "peaks" in cached:
+        chromatogram.peaks = cached["peaks"]
+    else:
+        chromatogram.find_peaks(
+            min_rel_height=settings.min_rel_prominence,
+            min_height=settings.min_prominence,
+            width_at=settings.border_max_peak_cutoff,
+            split_threshold=settings.split_threshold,
+            min_elution_time=settings.min_elution_time,
+            max_elution_time=settings.max_elution_time,
+        )
+        results["peaks"] = copy.deepcopy(chromatogram.peaks)
+
+    # the initial spectra are guessed by spectral clustering, which uses the global random state,
+    # fixed seed makes the result independent of the chromatograms processed before (and of the process),
+    # the lock keeps other threads (jobs, previews, folder watchers) from seeding it in the meantime
+    with _random_state_lock:
+        random_state = np.random.get_state()
+        np.random.seed(0)
+        try:
+            chromatogram.deconvolve_peaks(
+                model=settings.peak_model,
+                min_r2=settings.explained_threshold,
+                relaxe_concs=settings.relaxe_concs,
+                max_comps=settings.max_peak_comps,
+            )
+        finally:
+            np.random.set_state(random_state)
+    results["deconvolution"] = chromatogram.peaks
+
+    return chromatogram, results